@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 from django.contrib import admin
-from django.db.models import Prefetch
 from django.urls import reverse
 from django.utils.html import format_html, format_html_join
 
 from apps.catalog.models import AccessRequest, AccessRequestItem
+from apps.catalog.models.requests import RequestStatus
+from apps.catalog.services.request_snapshots import FROZEN_STATUSES, snapshot_request
+from apps.catalog.services.request_stats import request_company_ids, track_request_companies_changed
+from apps.catalog.services.request_summary import refresh_request_summary
 
 
 class AccessRequestItemInline(admin.TabularInline):
@@ -123,22 +126,18 @@ class AccessRequestAdmin(admin.ModelAdmin):
             readonly.append("owner")
         return tuple(readonly)
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.select_related(
-            "person_data",
-            "owner",
-            "selection_set__company",
-            "selection_set__branch",
-        ).prefetch_related(
-            Prefetch(
-                "items",
-                queryset=AccessRequestItem.objects.select_related(
-                    "selection_set__company",
-                    "selection_set__branch",
-                ).order_by("order", "id"),
-            )
-        )
+    def save_related(self, request, form, formsets, change):
+        obj = form.instance
+        # Empresas antes de los inlines: los contadores por empresa del dashboard
+        # solo se mueven por post_save de la solicitud, no por sus items
+        old_company_ids = request_company_ids(obj) if obj.status != RequestStatus.DRAFT else ()
+        super().save_related(request, form, formsets, change)
+        # Los inlines pueden cambiar items: recalcular el resumen del listado,
+        # el documento congelado de una solicitud enviada y las estadísticas
+        refresh_request_summary(obj)
+        if obj.status in FROZEN_STATUSES:
+            snapshot_request(obj)
+        track_request_companies_changed(obj, old_company_ids)
 
     @admin.display(description="Cargado por")
     def owner_display(self, obj: AccessRequest) -> str:
@@ -150,38 +149,21 @@ class AccessRequestAdmin(admin.ModelAdmin):
             return full_name
         return getattr(obj.owner, "username", None) or str(obj.owner)
 
+    # Columnas del listado: resumen guardado en la solicitud (services/request_summary.py)
     @admin.display(description="Empresas")
     def companies(self, obj: AccessRequest) -> str:
-        if obj.selection_set_id:
-            return str(obj.selection_set.company)
-
-        # multiempresa
-        qs = obj.items.select_related("selection_set__company").all()
-        if not qs.exists():
-            return "-"
-
-        names = [str(it.selection_set.company) for it in qs]
-        unique = list(dict.fromkeys(names))
-        return ", ".join(unique[:3]) + (" ..." if len(unique) > 3 else "")
-
-    @admin.display(description="Sucursales")
-    def branches(self, obj: AccessRequest) -> str:
-        if obj.selection_set_id:
-            return str(obj.selection_set.branch)
-
-        qs = obj.items.select_related("selection_set__branch", "selection_set__company").all()
-        if not qs.exists():
+        names = obj.summary_companies or []
+        if not names:
             return "-"
+        return ", ".join(names[:3]) + (" ..." if len(names) > 3 else "")
 
-        names = [str(it.selection_set.branch) for it in qs if it.selection_set.branch]
-        unique = list(dict.fromkeys(names))
-        return ", ".join(unique[:3]) + (" ..." if len(unique) > 3 else "") if unique else "-"
+    @admin.display(description="Sucursales", ordering="summary_branch_count")
+    def branches(self, obj: AccessRequest) -> int:
+        return obj.summary_branch_count
 
-    @admin.display(description="Items")
+    @admin.display(description="Items", ordering="summary_item_count")
     def items_count(self, obj: AccessRequest) -> int:
-        if obj.selection_set_id:
-            return 1
-        return obj.items.count()
+        return obj.summary_item_count
 
     @admin.display(description="Detalle completo")
     def items_overview(self, obj: AccessRequest) -> str:
@@ -194,7 +176,7 @@ class AccessRequestAdmin(admin.ModelAdmin):
                 s.id,
             )
 
-        items = list(obj.items.all())
+        items = list(obj.items.select_related("selection_set__company", "selection_set__branch"))
         if not items:
             return "-"
 
@@ -6,3 +6,11 @@ class CatalogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.catalog"
     verbose_name = "Catálogo"
+
+    def ready(self):
+        # Invalidación del cache de catálogo (save/delete de módulos) y
+        # contadores del dashboard (services/request_stats.py).
+        from apps.catalog import signals  # noqa: F401
+        from apps.catalog.services.wizard_state import check_wizard_store_settings
+
+        check_wizard_store_settings()
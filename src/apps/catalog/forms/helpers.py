@@ -1,10 +1,11 @@
 from __future__ import annotations
+from collections import defaultdict
+
 from django.db import transaction
 
 from apps.catalog.models.selections import (
     PermissionSelectionSet,
     SelectionSetModule,
-    SelectionSetLevel,
     SelectionSetWarehouse,
     SelectionSetCashRegister,
     SelectionSetControlPanel,
@@ -15,7 +16,9 @@ from apps.catalog.models.selections import (
 )
 
 
-from apps.catalog.models.modules import ErpModule, ErpModuleSubLevel
+from apps.catalog.services.catalog_cache import get_module_catalog
+from apps.catalog.services.fingerprints import refresh_global_fingerprints
+from apps.catalog.services.selection_merge import merge_into_selection_set
 from apps.catalog.models.selections import (
     PermissionSelectionSet,
     SelectionSetModule,
@@ -37,7 +40,7 @@ def clone_selection_set(base: PermissionSelectionSet, *, company, branch=None) -
         notes=base.notes,
     )
 
-    # Modules
+    # Modules (sin include_all: este clon no copia subniveles)
     SelectionSetModule.objects.bulk_create(
         [
             SelectionSetModule(selection_set=new_set, module=m.module)
@@ -126,33 +129,10 @@ def clone_selection_set(base: PermissionSelectionSet, *, company, branch=None) -
         ]
     )
 
+    refresh_global_fingerprints([new_set])
     return new_set
 
 
-def _merge_bool(current, incoming) -> bool | None:
-    if current is None and incoming is None:
-        return None
-    return bool(current) or bool(incoming)
-
-
-def _merge_number(current, incoming):
-    if current is None:
-        return incoming
-    if incoming is None:
-        return current
-    return incoming if incoming > current else current
-
-
-def _merge_text(current, incoming) -> str | None:
-    current = (current or "").strip()
-    incoming = (incoming or "").strip()
-    if current:
-        return current
-    if incoming:
-        return incoming
-    return None
-
-
 @transaction.atomic
 def merge_selection_sets(
     bases: list[PermissionSelectionSet], *, company, branch=None
@@ -164,232 +144,138 @@ def merge_selection_sets(
     - acciones BOOL: OR
     - acciones INT/DECIMAL/PERCENT: maximo
     - acciones TEXT: primer valor no vacio
+    La fusión se resuelve en la base (INSERT … SELECT … GROUP BY, ver
+    services/selection_merge.py): cantidad de queries fija sin importar cuántas bases.
     """
     if not bases:
         return PermissionSelectionSet.objects.create(company=company, branch=branch)
 
     notes_parts: list[str] = []
-    module_ids: set[int] = set()
-    level_ids: set[int] = set()
-    sublevel_ids: set[int] = set()
-    warehouse_ids: set[int] = set()
-    cash_register_ids: set[int] = set()
-    control_panel_ids: set[int] = set()
-    seller_ids: set[int] = set()
-    matrix_by_permission: dict[int, dict] = {}
-    payments_by_method: dict[int, dict] = {}
-    actions_by_permission: dict[int, dict] = {}
-
     for base in bases:
         note = (base.notes or "").strip()
         if note and note not in notes_parts:
             notes_parts.append(note)
 
-        module_ids.update(
-            base.selected_modules.values_list("module_id", flat=True)
-        )
-        level_ids.update(
-            base.selected_levels.values_list("level_id", flat=True)
-        )
-        sublevel_ids.update(
-            base.sublevels.values_list("sublevel_id", flat=True)
-        )
-
-        if branch is not None:
-            warehouse_ids.update(
-                base.warehouses.filter(warehouse__branch_id=branch.id)
-                .values_list("warehouse_id", flat=True)
-            )
-            cash_register_ids.update(
-                base.cash_registers.filter(cash_register__branch_id=branch.id)
-                .values_list("cash_register_id", flat=True)
-            )
-
-        control_panel_ids.update(
-            base.control_panels.filter(control_panel__company_id=company.id)
-            .values_list("control_panel_id", flat=True)
-        )
-        seller_ids.update(
-            base.sellers.filter(seller__company_id=company.id)
-            .values_list("seller_id", flat=True)
-        )
-
-        for row in base.action_values.select_related("action_permission").all():
-            action_permission = row.action_permission
-            current = actions_by_permission.get(action_permission.id)
-            if current is None:
-                actions_by_permission[action_permission.id] = {
-                    "action_permission": action_permission,
-                    "value_bool": row.value_bool,
-                    "value_int": row.value_int,
-                    "value_decimal": row.value_decimal,
-                    "value_text": row.value_text,
-                    "is_active": row.is_active,
-                }
-                continue
-
-            current["is_active"] = bool(current["is_active"]) or bool(row.is_active)
-            if action_permission.value_type == "BOOL":
-                current["value_bool"] = _merge_bool(current["value_bool"], row.value_bool)
-            elif action_permission.value_type in ("INT", "DECIMAL", "PERCENT"):
-                key = "value_int" if action_permission.value_type == "INT" else "value_decimal"
-                current[key] = _merge_number(current[key], getattr(row, key))
-            else:
-                current["value_text"] = _merge_text(current["value_text"], row.value_text)
-
-        for row in base.matrix_permissions.select_related("permission").all():
-            current = matrix_by_permission.get(row.permission_id)
-            if current is None:
-                matrix_by_permission[row.permission_id] = {
-                    "permission": row.permission,
-                    "can_create": row.can_create,
-                    "can_update": row.can_update,
-                    "can_authorize": row.can_authorize,
-                    "can_close": row.can_close,
-                    "can_cancel": row.can_cancel,
-                    "can_update_validity": row.can_update_validity,
-                }
-                continue
-            current["can_create"] = current["can_create"] or row.can_create
-            current["can_update"] = current["can_update"] or row.can_update
-            current["can_authorize"] = current["can_authorize"] or row.can_authorize
-            current["can_close"] = current["can_close"] or row.can_close
-            current["can_cancel"] = current["can_cancel"] or row.can_cancel
-            current["can_update_validity"] = current["can_update_validity"] or row.can_update_validity
-
-        for row in base.payment_methods.select_related("payment_method").all():
-            current = payments_by_method.get(row.payment_method_id)
-            if current is None:
-                payments_by_method[row.payment_method_id] = {
-                    "payment_method": row.payment_method,
-                    "enabled": row.enabled,
-                    "is_active": row.is_active,
-                }
-                continue
-            current["enabled"] = current["enabled"] or row.enabled
-            current["is_active"] = current["is_active"] or row.is_active
-
     new_set = PermissionSelectionSet.objects.create(
         company=company,
         branch=branch,
         notes="\n\n".join(notes_parts),
     )
+    merge_into_selection_set(new_set, bases, company=company, branch=branch)
 
-    SelectionSetModule.objects.bulk_create(
-        [SelectionSetModule(selection_set=new_set, module_id=module_id) for module_id in sorted(module_ids)],
-        ignore_conflicts=True,
-    )
-    SelectionSetLevel.objects.bulk_create(
-        [SelectionSetLevel(selection_set=new_set, level_id=level_id) for level_id in sorted(level_ids)],
-        ignore_conflicts=True,
-    )
-    SelectionSetSubLevel.objects.bulk_create(
-        [SelectionSetSubLevel(selection_set=new_set, sublevel_id=sublevel_id) for sublevel_id in sorted(sublevel_ids)],
-        ignore_conflicts=True,
-    )
-    if branch is not None:
-        SelectionSetWarehouse.objects.bulk_create(
-            [SelectionSetWarehouse(selection_set=new_set, warehouse_id=warehouse_id) for warehouse_id in sorted(warehouse_ids)],
-            ignore_conflicts=True,
-        )
-        SelectionSetCashRegister.objects.bulk_create(
-            [SelectionSetCashRegister(selection_set=new_set, cash_register_id=cash_register_id) for cash_register_id in sorted(cash_register_ids)],
-            ignore_conflicts=True,
-        )
-    SelectionSetControlPanel.objects.bulk_create(
-        [SelectionSetControlPanel(selection_set=new_set, control_panel_id=control_panel_id) for control_panel_id in sorted(control_panel_ids)],
-        ignore_conflicts=True,
-    )
-    SelectionSetSeller.objects.bulk_create(
-        [SelectionSetSeller(selection_set=new_set, seller_id=seller_id) for seller_id in sorted(seller_ids)],
-        ignore_conflicts=True,
-    )
-    SelectionSetActionValue.objects.bulk_create(
-        [
-            SelectionSetActionValue(
-                selection_set=new_set,
-                action_permission=row["action_permission"],
-                value_bool=row["value_bool"],
-                value_int=row["value_int"],
-                value_decimal=row["value_decimal"],
-                value_text=row["value_text"],
-                is_active=row["is_active"],
-            )
-            for row in actions_by_permission.values()
-        ],
-        ignore_conflicts=True,
-    )
-    SelectionSetMatrixPermission.objects.bulk_create(
-        [
-            SelectionSetMatrixPermission(
-                selection_set=new_set,
-                permission=row["permission"],
-                can_create=row["can_create"],
-                can_update=row["can_update"],
-                can_authorize=row["can_authorize"],
-                can_close=row["can_close"],
-                can_cancel=row["can_cancel"],
-                can_update_validity=row["can_update_validity"],
-            )
-            for row in matrix_by_permission.values()
-        ],
-        ignore_conflicts=True,
-    )
-    SelectionSetPaymentMethod.objects.bulk_create(
-        [
-            SelectionSetPaymentMethod(
-                selection_set=new_set,
-                payment_method=row["payment_method"],
-                enabled=row["enabled"],
-                is_active=row["is_active"],
-            )
-            for row in payments_by_method.values()
-        ],
-        ignore_conflicts=True,
-    )
-
+    refresh_global_fingerprints([new_set])
     return new_set
 
 
 @transaction.atomic
-def set_selection_set_modules(selection_set: PermissionSelectionSet, modules: list[ErpModule]) -> None:
+def set_modules_and_sublevels_bulk(assignments) -> None:
     """
-    Reemplaza módulos seleccionados (nivel rápido).
-    No toca subniveles (eso lo decide la estrategia).
+    Reemplaza módulos y subniveles de varios selection_sets a la vez.
+    `assignments`: iterable de (selection_set, modules, sublevels); modules y
+    sublevels aceptan instancias o ids.
+    Un delete y un bulk_create por tabla, sin importar cuántos selection_sets.
+
+    Se guarda compacto: un módulo (o nivel) con todos sus subniveles activos
+    elegidos queda como include_all=True, sin una fila por subnivel. Solo el
+    refinamiento se guarda como SelectionSetSubLevel.
     """
-    SelectionSetModule.objects.filter(selection_set=selection_set).delete()
-    SelectionSetModule.objects.bulk_create(
-        [SelectionSetModule(selection_set=selection_set, module=m)
-         for m in modules]
+    assignments = list(assignments)
+    if not assignments:
+        return
+
+    catalog = get_module_catalog()
+    selection_sets = [ss for ss, _, _ in assignments]
+    ss_ids = [ss.pk for ss in selection_sets]
+    # Niveles con fila explícita: no se pisan con include_all=True (el próximo
+    # guardado la borraría junto con las "todo adentro"); sus subniveles van
+    # como filas de SelectionSetSubLevel.
+    explicit_levels = set(
+        SelectionSetLevel.objects.filter(selection_set_id__in=ss_ids, include_all=False)
+        .values_list("selection_set_id", "level_id")
     )
 
+    module_rows: list[SelectionSetModule] = []
+    level_rows: list[SelectionSetLevel] = []
+    sublevel_rows: list[SelectionSetSubLevel] = []
+    for ss, modules, sublevels in assignments:
+        module_ids = list(dict.fromkeys(getattr(m, "pk", m) for m in modules))
+        compact = catalog.compact_selection(module_ids, (getattr(s, "pk", s) for s in sublevels))
+        full_modules = set(compact.full_module_ids)
+        for module_id in module_ids:
+            module_rows.append(SelectionSetModule(
+                selection_set=ss, module_id=module_id, include_all=module_id in full_modules))
+        for level_id in compact.full_level_ids:
+            if (ss.pk, level_id) in explicit_levels:
+                sublevel_rows.extend(
+                    SelectionSetSubLevel(selection_set=ss, sublevel_id=sublevel_id)
+                    for sublevel_id in catalog.sublevel_ids_by_level[level_id]
+                )
+            else:
+                level_rows.append(SelectionSetLevel(selection_set=ss, level_id=level_id, include_all=True))
+        for sublevel_id in compact.sublevel_ids:
+            sublevel_rows.append(SelectionSetSubLevel(selection_set=ss, sublevel_id=sublevel_id))
 
-@transaction.atomic
-def set_selection_set_sublevels(selection_set: PermissionSelectionSet, sublevels: list[ErpModuleSubLevel]) -> None:
+    SelectionSetModule.objects.filter(selection_set_id__in=ss_ids).delete()
+    # Solo los niveles "todo adentro": los niveles explícitos (import de Excel) se conservan
+    SelectionSetLevel.objects.filter(selection_set_id__in=ss_ids, include_all=True).delete()
+    SelectionSetSubLevel.objects.filter(selection_set_id__in=ss_ids).delete()
+    SelectionSetModule.objects.bulk_create(module_rows, batch_size=500)
+    SelectionSetLevel.objects.bulk_create(level_rows, batch_size=500, ignore_conflicts=True)
+    SelectionSetSubLevel.objects.bulk_create(sublevel_rows, batch_size=500)
+    refresh_global_fingerprints(selection_sets)
+
+
+def selected_sublevel_ids_by_set(selection_sets) -> dict[int, list[int]]:
     """
-    Reemplaza subniveles seleccionados (refinamiento).
+    Subniveles efectivos de cada selection_set: filas explícitas más los
+    implícitos de módulos/niveles include_all (expandidos con el catálogo en memoria).
+    Acepta instancias o ids. 3 queries para todos.
     """
-    SelectionSetSubLevel.objects.filter(selection_set=selection_set).delete()
-    SelectionSetSubLevel.objects.bulk_create(
-        [SelectionSetSubLevel(selection_set=selection_set, sublevel=s)
-         for s in sublevels]
-    )
+    ids = [getattr(s, "pk", s) for s in selection_sets]
+    if not ids:
+        return {}
+
+    full_modules: dict[int, list[int]] = defaultdict(list)
+    for ss_id, module_id in SelectionSetModule.objects.filter(
+        selection_set_id__in=ids, include_all=True
+    ).values_list("selection_set_id", "module_id"):
+        full_modules[ss_id].append(module_id)
+
+    full_levels: dict[int, list[int]] = defaultdict(list)
+    for ss_id, level_id in SelectionSetLevel.objects.filter(
+        selection_set_id__in=ids, include_all=True
+    ).values_list("selection_set_id", "level_id"):
+        full_levels[ss_id].append(level_id)
+
+    explicit: dict[int, list[int]] = defaultdict(list)
+    for ss_id, sublevel_id in SelectionSetSubLevel.objects.filter(
+        selection_set_id__in=ids
+    ).values_list("selection_set_id", "sublevel_id"):
+        explicit[ss_id].append(sublevel_id)
+
+    catalog = get_module_catalog()
+    out: dict[int, list[int]] = {}
+    for ss_id in ids:
+        implicit = catalog.expand_sublevel_ids(
+            module_ids=full_modules.get(ss_id, ()), level_ids=full_levels.get(ss_id, ())
+        )
+        out[ss_id] = list(dict.fromkeys(implicit + explicit.get(ss_id, [])))
+    return out
 
 
-def active_sublevels_for_modules(modules: list[ErpModule]) -> list[ErpModuleSubLevel]:
+def active_sublevel_ids_for_modules(modules) -> list[int]:
     """
-    Devuelve todos los subniveles activos pertenecientes a módulos activos seleccionados.
+    Devuelve los ids de subniveles activos pertenecientes a módulos activos seleccionados.
     (default: módulo marcado => todo adentro marcado)
+    Acepta instancias de ErpModule o ids. Se resuelve con el índice en memoria del catálogo.
     """
     if not modules:
         return []
-    return list(
-        ErpModuleSubLevel.objects.filter(
-            is_active=True,
-            level__is_active=True,
-            level__module__in=modules,
-            level__module__is_active=True,
-        )
-        .select_related("level", "level__module")
-        .order_by("level__module__name", "level__name", "name")
-    )
+    return get_module_catalog().sublevel_ids_for_modules(getattr(m, "pk", m) for m in modules)
+
+
+def filter_active_sublevel_ids(sublevel_ids) -> list[int]:
+    """
+    Normaliza ids posteados (str/int) dejando solo subniveles activos del árbol.
+    """
+    return get_module_catalog().active_sublevel_ids(sublevel_ids)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import logging
+from dataclasses import dataclass
 from decimal import Decimal
-from typing import Iterable
+from typing import Iterable, Optional, Set
 
 from django.db import transaction
 
@@ -17,20 +19,23 @@ from apps.catalog.models.selections import (
     SelectionSetMatrixPermission,
     SelectionSetPaymentMethod,
 )
+from apps.catalog.services.fingerprints import refresh_global_fingerprints
+
+logger = logging.getLogger("apps.catalog")
+
+
+_MATRIX_FLAGS = (
+    "can_create",
+    "can_update",
+    "can_authorize",
+    "can_close",
+    "can_cancel",
+    "can_update_validity",
+)
 
 
 def _has_any_matrix_flag(d: dict) -> bool:
-    return any(
-        d.get(k)
-        for k in (
-            "can_create",
-            "can_update",
-            "can_authorize",
-            "can_close",
-            "can_cancel",
-            "can_update_validity",
-        )
-    )
+    return any(d.get(k) for k in _MATRIX_FLAGS)
 
 
 def _action_has_value(value_type: str, cleaned: dict) -> bool:
@@ -58,6 +63,90 @@ def _action_has_value(value_type: str, cleaned: dict) -> bool:
     return False
 
 
+def _as_scope(ids: Optional[Iterable[int]]) -> Optional[Set[int]]:
+    return None if ids is None else {int(x) for x in ids}
+
+
+@dataclass(frozen=True)
+class TableDelta:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+    @property
+    def changed(self) -> int:
+        return self.inserted + self.updated + self.deleted
+
+
+@dataclass(frozen=True)
+class GlobalsSaveResult:
+    actions: TableDelta
+    matrix: TableDelta
+    payments: TableDelta
+
+    @property
+    def changed(self) -> int:
+        return self.actions.changed + self.matrix.changed + self.payments.changed
+
+
+def _apply_delta(
+    model,
+    selection_set: PermissionSelectionSet,
+    *,
+    key: str,
+    fields: tuple[str, ...],
+    desired: dict[int, dict],
+    scope_ids: Optional[Set[int]] = None,
+) -> TableDelta:
+    """
+    Sincroniza las filas de `model` del selection_set con `desired`
+    ({id de catálogo: valores}) escribiendo solo lo que cambió:
+      - altas: bulk_create(update_conflicts=True) (tolera un doble submit)
+      - cambios: bulk_update de las filas con algún valor distinto
+      - bajas: un único delete filtrado
+
+    `scope_ids` limita la sincronización a esos ids de catálogo (los visibles en
+    el form); las filas fuera del scope quedan intactas. None = todo el catálogo.
+    """
+    key_attr = f"{key}_id"
+    if scope_ids is not None:
+        desired = {k: v for k, v in desired.items() if k in scope_ids}
+        if not scope_ids:
+            return TableDelta()
+
+    qs = model.objects.filter(selection_set=selection_set)
+    if scope_ids is not None:
+        qs = qs.filter(**{f"{key_attr}__in": list(scope_ids)})
+    current = {row[key_attr]: row for row in qs.values("id", key_attr, *fields)}
+
+    to_create = []
+    to_update = []
+    for key_id, values in desired.items():
+        row = current.get(key_id)
+        if row is None:
+            to_create.append(model(selection_set=selection_set, **{key_attr: key_id}, **values))
+        elif any(row[f] != values[f] for f in fields):
+            to_update.append(model(pk=row["id"], **values))
+
+    stale = [key_id for key_id in current if key_id not in desired]
+
+    if to_create:
+        model.objects.bulk_create(
+            to_create,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["selection_set", key],
+            update_fields=list(fields),
+        )
+    if to_update:
+        model.objects.bulk_update(to_update, list(fields), batch_size=500)
+    if stale:
+        model.objects.filter(
+            selection_set=selection_set, **{f"{key}_id__in": stale}).delete()
+
+    return TableDelta(inserted=len(to_create), updated=len(to_update), deleted=len(stale))
+
+
 @transaction.atomic
 def save_globals_for_selection_set(
     selection_set: PermissionSelectionSet,
@@ -65,84 +154,86 @@ def save_globals_for_selection_set(
     action_items: list[dict],
     matrix_items: list[dict],
     payment_items: list[dict],
-) -> None:
+    action_ids: Optional[Iterable[int]] = None,
+    matrix_ids: Optional[Iterable[int]] = None,
+    payment_ids: Optional[Iterable[int]] = None,
+) -> GlobalsSaveResult:
     """
     Reemplaza globales del selection_set con los payloads ya validados.
     Payload esperado:
       - action_items: [{action_permission, value_bool/value_int/value_decimal/value_text}]
       - matrix_items: [{permission, can_create, ...}]
       - payment_items: [{payment_method, enabled}]
+
+    Solo escribe las filas que cambiaron respecto de lo guardado (altas, cambios
+    y bajas) y devuelve cuántas fueron. La huella global se recalcula solo si
+    hubo algún cambio.
+
+    action_ids / matrix_ids / payment_ids: ids de catálogo que el form mostró
+    (ver forms/visibility.GlobalsScope). Las filas guardadas de ids ocultos no se
+    tocan. None = se sincroniza el catálogo completo.
     """
     # --------- ACTIONS ----------
-    SelectionSetActionValue.objects.filter(
-        selection_set=selection_set).delete()
-
-    action_rows: list[SelectionSetActionValue] = []
+    desired_actions: dict[int, dict] = {}
     for it in action_items:
         ap: ActionPermission = it["action_permission"]
-        vt = ap.value_type
-
-        if not _action_has_value(vt, it):
+        if not _action_has_value(ap.value_type, it):
             continue
-
-        row = SelectionSetActionValue(
-            selection_set=selection_set,
-            action_permission=ap,
-            is_active=True,
-            value_bool=it.get("value_bool"),
-            value_int=it.get("value_int"),
-            value_decimal=it.get("value_decimal"),
-            value_text=it.get("value_text"),
-        )
-        action_rows.append(row)
-
-    if action_rows:
-        SelectionSetActionValue.objects.bulk_create(
-            action_rows, batch_size=500)
+        desired_actions[ap.id] = {
+            "value_bool": it.get("value_bool"),
+            "value_int": it.get("value_int"),
+            "value_decimal": it.get("value_decimal"),
+            "value_text": it.get("value_text"),
+            "is_active": True,
+        }
 
     # --------- MATRIX ----------
-    SelectionSetMatrixPermission.objects.filter(
-        selection_set=selection_set).delete()
-
-    matrix_rows: list[SelectionSetMatrixPermission] = []
+    desired_matrix: dict[int, dict] = {}
     for it in matrix_items:
         if not _has_any_matrix_flag(it):
             continue
         mp: MatrixPermission = it["permission"]
-        matrix_rows.append(
-            SelectionSetMatrixPermission(
-                selection_set=selection_set,
-                permission=mp,
-                can_create=bool(it.get("can_create")),
-                can_update=bool(it.get("can_update")),
-                can_authorize=bool(it.get("can_authorize")),
-                can_close=bool(it.get("can_close")),
-                can_cancel=bool(it.get("can_cancel")),
-                can_update_validity=bool(it.get("can_update_validity")),
-            )
-        )
-
-    if matrix_rows:
-        SelectionSetMatrixPermission.objects.bulk_create(
-            matrix_rows, batch_size=500)
+        desired_matrix[mp.id] = {flag: bool(it.get(flag)) for flag in _MATRIX_FLAGS}
 
     # --------- PAYMENT METHODS ----------
-    SelectionSetPaymentMethod.objects.filter(
-        selection_set=selection_set).delete()
-
-    pay_rows: list[SelectionSetPaymentMethod] = []
+    desired_payments: dict[int, dict] = {}
     for it in payment_items:
         if not it.get("enabled"):
             continue
         pm: PaymentMethodPermission = it["payment_method"]
-        pay_rows.append(
-            SelectionSetPaymentMethod(
-                selection_set=selection_set,
-                payment_method=pm,
-                enabled=True,
-                is_active=True,
-            )
-        )
+        desired_payments[pm.id] = {"enabled": True, "is_active": True}
+
+    result = GlobalsSaveResult(
+        actions=_apply_delta(
+            SelectionSetActionValue,
+            selection_set,
+            key="action_permission",
+            fields=("value_bool", "value_int", "value_decimal", "value_text", "is_active"),
+            desired=desired_actions,
+            scope_ids=_as_scope(action_ids),
+        ),
+        matrix=_apply_delta(
+            SelectionSetMatrixPermission,
+            selection_set,
+            key="permission",
+            fields=_MATRIX_FLAGS,
+            desired=desired_matrix,
+            scope_ids=_as_scope(matrix_ids),
+        ),
+        payments=_apply_delta(
+            SelectionSetPaymentMethod,
+            selection_set,
+            key="payment_method",
+            fields=("enabled", "is_active"),
+            desired=desired_payments,
+            scope_ids=_as_scope(payment_ids),
+        ),
+    )
 
-    if pay_rows:
-        SelectionSetPaymentMethod.objects.bulk_create(pay_rows, batch_size=500)
+    if result.changed:
+        refresh_global_fingerprints([selection_set])
+    logger.debug(
+        "Globals saved selection_set=%s actions=%s matrix=%s payments=%s",
+        selection_set.pk, result.actions, result.matrix, result.payments,
+    )
+    return result
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import json
+from dataclasses import dataclass
 from decimal import Decimal
 
 from django import forms
@@ -9,6 +11,24 @@ from apps.catalog.forms.bootstrap_mixins import BootstrapFormMixin
 from apps.catalog.models.permissions.global_ops import (
     ActionPermission,
     ActionValueType,
+    MatrixPermission,
+    PaymentMethodPermission,
+)
+
+
+# Secciones del Step 4 (también son los "section" del envío por delta)
+SECTION_ACTIONS = "actions"
+SECTION_MATRIX = "matrix"
+SECTION_PAYMENTS = "payments"
+SECTIONS = (SECTION_ACTIONS, SECTION_MATRIX, SECTION_PAYMENTS)
+
+MATRIX_FLAGS = (
+    "can_create",
+    "can_update",
+    "can_authorize",
+    "can_close",
+    "can_cancel",
+    "can_update_validity",
 )
 
 
@@ -79,14 +99,49 @@ class ActionValueRowForm(BootstrapFormMixin, forms.Form):
         return cleaned
 
 
-class BaseActionRowFormSet(forms.BaseFormSet):
+STALE_SECTION_ERROR = (
+    "La sección cambió desde que se abrió la página (se agregaron o quitaron permisos). "
+    "Revisala y volvé a guardar."
+)
+
+
+class BaseCatalogRowFormSet(forms.BaseFormSet):
+    """
+    Formset de una sección del Step 4: cada fila trae en `id_field` el id de
+    catálogo. Con `catalog_ids`, la sección entera se rechaza (stale=True) si
+    algún id posteado no es de la sección: el catálogo visible cambió entre el
+    render y el POST y guardarla borraría valores de otra sección.
+    """
+    id_field = ""
+
+    def __init__(self, *args, catalog_ids=None, **kwargs):
+        self.catalog_ids = set(catalog_ids) if catalog_ids is not None else None
+        self.stale = False
+        super().__init__(*args, **kwargs)
+
+    def posted_ids(self) -> list[int]:
+        """ids de las filas posteadas (el scope del guardado de la sección)."""
+        return [f.cleaned_data[self.id_field] for f in self.forms if f.cleaned_data.get(self.id_field)]
+
+    def clean(self):
+        super().clean()
+        if self.catalog_ids is None:
+            return
+        if any(f.cleaned_data.get(self.id_field) not in self.catalog_ids for f in self.forms):
+            self.stale = True
+            raise ValidationError(STALE_SECTION_ERROR)
+
+
+class BaseActionRowFormSet(BaseCatalogRowFormSet):
     """
     Inyecta un mapa {id: ActionPermission} en cada form (sin queries).
     """
+    id_field = "action_permission_id"
 
     def __init__(self, *args, action_permissions: list[ActionPermission] | None = None, **kwargs):
         self._aps = action_permissions or []
         self._ap_map = {ap.id: ap for ap in self._aps}
+        kwargs.setdefault("catalog_ids", self._ap_map.keys())
         super().__init__(*args, **kwargs)
 
     def get_form_kwargs(self, index):
@@ -117,8 +172,13 @@ class MatrixRowForm(BootstrapFormMixin, forms.Form):
     can_update_validity = forms.BooleanField(required=False)
 
 
+class BaseMatrixRowFormSet(BaseCatalogRowFormSet):
+    id_field = "permission_id"
+
+
 MatrixFormSet = forms.formset_factory(
     MatrixRowForm,
+    formset=BaseMatrixRowFormSet,
     extra=0,
     can_delete=False,
 )
@@ -132,8 +192,163 @@ class PaymentRowForm(BootstrapFormMixin, forms.Form):
     enabled = forms.BooleanField(required=False)
 
 
+class BasePaymentRowFormSet(BaseCatalogRowFormSet):
+    id_field = "payment_method_id"
+
+
 PaymentFormSet = forms.formset_factory(
     PaymentRowForm,
+    formset=BasePaymentRowFormSet,
     extra=0,
     can_delete=False,
 )
+
+
+# -----------------------------
+# DELTA (envío compacto del Step 4)
+# -----------------------------
+DELTA_FIELD = "globals_delta"
+DELTA_MAX_ROWS = 5000
+
+
+@dataclass(frozen=True)
+class DeltaCatalog:
+    """Catálogo visible de un bloque del Step 4 (ids -> objeto)."""
+    actions: dict[int, ActionPermission]
+    matrix: dict[int, MatrixPermission]
+    payments: dict[int, PaymentMethodPermission]
+
+
+def formset_data(prefix: str, rows: list[dict]) -> dict[str, str]:
+    """
+    POST equivalente a un formset con `rows` (mismo formato que el initial):
+    permite re-mostrar una sección con valores que no llegaron como formset.
+    """
+    data = {f"{prefix}-TOTAL_FORMS": str(len(rows)), f"{prefix}-INITIAL_FORMS": str(len(rows))}
+    for i, row in enumerate(rows):
+        for name, value in row.items():
+            if value is None or value is False:
+                continue
+            data[f"{prefix}-{i}-{name}"] = "on" if value is True else str(value)
+    return data
+
+
+def delta_row_values(section: str, obj, value) -> dict:
+    """
+    Valor crudo de una fila del delta en formato initial del formset (sin
+    validar: es para re-mostrar lo que mandó el usuario).
+    """
+    if section == SECTION_ACTIONS:
+        if obj.value_type == ActionValueType.BOOL:
+            return {"value_bool": value is True}
+        if obj.value_type == ActionValueType.INT:
+            return {"value_int": value}
+        if obj.value_type in (ActionValueType.DECIMAL, ActionValueType.PERCENT):
+            return {"value_decimal": value}
+        return {"value_text": value}
+    if section == SECTION_MATRIX:
+        value = value if isinstance(value, dict) else {}
+        return {flag: value.get(flag) is True for flag in MATRIX_FLAGS}
+    return {"enabled": value is True}
+
+
+def _action_row_data(ap: ActionPermission, value) -> dict:
+    """Arma el data de ActionValueRowForm para el valor crudo del JSON."""
+    data = {"action_permission_id": ap.id}
+    if value is None:
+        return data
+    if ap.value_type == ActionValueType.BOOL:
+        if value is True:
+            data["value_bool"] = "on"
+        elif value is not False:
+            raise ValidationError("valor no booleano")
+    elif ap.value_type == ActionValueType.INT:
+        data["value_int"] = str(value)
+    elif ap.value_type in (ActionValueType.DECIMAL, ActionValueType.PERCENT):
+        data["value_decimal"] = str(value)
+    elif ap.value_type == ActionValueType.TEXT:
+        data["value_text"] = str(value)
+    return data
+
+
+class GlobalsDeltaForm(forms.Form):
+    """
+    Envío compacto del Step 4: solo las filas que el usuario cambió.
+
+    JSON: [{"block": "GLOBAL" | "<item_id>", "section": "actions" | "matrix" | "payments",
+            "id": <id de catálogo>, "value": ...}]
+      - actions: valor según ActionPermission.value_type (bool, int, decimal, texto; null = vacío)
+      - matrix: {"can_create": bool, ...}
+      - payments: bool
+
+    Cada acción se valida con ActionValueRowForm (mismas reglas que el formset) y
+    solo se aceptan ids del catálogo visible del bloque.
+
+    cleaned_data["globals_delta"]: {block: {section: {id: valores}}}, con valores
+    listos para save_globals_for_selection_set (sin la instancia de catálogo).
+    """
+    globals_delta = forms.CharField(widget=forms.HiddenInput)
+
+    def __init__(self, *args, catalogs: dict[str, DeltaCatalog], **kwargs):
+        self.catalogs = catalogs
+        super().__init__(*args, **kwargs)
+
+    def clean_globals_delta(self) -> dict[str, dict[str, dict[int, dict]]]:
+        try:
+            rows = json.loads(self.cleaned_data["globals_delta"])
+        except ValueError:
+            raise ValidationError("Envío inválido.")
+        if not isinstance(rows, list):
+            raise ValidationError("Envío inválido.")
+        if len(rows) > DELTA_MAX_ROWS:
+            raise ValidationError("Demasiados cambios en un solo envío.")
+
+        out: dict[str, dict[str, dict[int, dict]]] = {}
+        errors: list[str] = []
+        for row in rows:
+            try:
+                block = str(row["block"])
+                section = row["section"]
+                obj_id = int(row["id"])
+                value = row.get("value")
+            except (TypeError, KeyError, ValueError):
+                raise ValidationError("Envío inválido.")
+
+            catalog = self.catalogs.get(block)
+            if catalog is None or section not in SECTIONS:
+                raise ValidationError("Envío inválido.")
+
+            if section == SECTION_ACTIONS:
+                ap = catalog.actions.get(obj_id)
+                if ap is None:
+                    raise ValidationError("Acción inválida.")
+                try:
+                    data = _action_row_data(ap, value)
+                except ValidationError:
+                    errors.append(f"{ap.group} / {ap.action}: valor inválido.")
+                    continue
+                form = ActionValueRowForm(data=data, action_permissions_map=catalog.actions)
+                if not form.is_valid():
+                    msgs = [m for field_errors in form.errors.values() for m in field_errors]
+                    errors.append(f"{ap.group} / {ap.action}: {' '.join(msgs)}")
+                    continue
+                values = {
+                    k: form.cleaned_data.get(k)
+                    for k in ("value_bool", "value_int", "value_decimal", "value_text")
+                }
+
+            elif section == SECTION_MATRIX:
+                if obj_id not in catalog.matrix or not isinstance(value, dict):
+                    raise ValidationError("Permiso de matriz inválido.")
+                values = {flag: value.get(flag) is True for flag in MATRIX_FLAGS}
+
+            else:
+                if obj_id not in catalog.payments or not isinstance(value, bool):
+                    raise ValidationError("Medio de pago inválido.")
+                values = {"enabled": value}
+
+            out.setdefault(block, {}).setdefault(section, {})[obj_id] = values
+
+        if errors:
+            raise ValidationError(errors)
+        return out
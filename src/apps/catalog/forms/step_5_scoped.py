@@ -2,16 +2,12 @@
 from __future__ import annotations
 
 from django import forms
+from django.utils.functional import cached_property
 
 from apps.catalog.forms.bootstrap_mixins import BootstrapFormMixin
-from apps.catalog.models.permissions.scoped import (
-    Company,
-    Branch,
-    Warehouse,
-    CashRegister,
-    ControlPanel,
-    Seller,
-)
+from apps.catalog.models.permissions.scoped import Company, Branch
+from apps.catalog.services.instrumentation import trace
+from apps.catalog.services.scoped_options import SCOPED_SOURCES
 
 
 class NoValidationMultipleChoiceField(forms.MultipleChoiceField):
@@ -21,7 +17,145 @@ class NoValidationMultipleChoiceField(forms.MultipleChoiceField):
         return True
 
 
-class CompanyScopedForm(BootstrapFormMixin, forms.Form):
+# campo -> mensaje si algún id no corresponde a la empresa/sucursal del form
+SCOPED_MESSAGES = {
+    "control_panels": "Uno o más paneles seleccionados no son válidos.",
+    "sellers": "Uno o más vendedores seleccionados no son válidos.",
+    "warehouses": "Uno o más depósitos seleccionados no son válidos.",
+    "cash_registers": "Uno o más cajas seleccionadas no son válidas.",
+}
+
+
+def _as_ids(raw) -> list[int]:
+    ids = []
+    for x in raw or []:
+        try:
+            ids.append(int(x))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def _selected_ids(form: forms.Form, field_name: str) -> list[int]:
+    """
+    Ids marcados del campo (sin validar; ignora valores no numéricos):
+    los posteados si el form está bound, si no los de `initial`.
+    """
+    if form.is_bound:
+        field = form.fields[field_name]
+        return _as_ids(field.widget.value_from_datadict(form.data, form.files, form.add_prefix(field_name)))
+    return _as_ids(form.initial.get(field_name))
+
+
+class ScopedIdValidator:
+    """
+    Resuelve en lote los ids marcados de todos los forms scoped del Step 5
+    (empresas y sucursales): una query por entidad para todos los forms.
+
+    - POST: valida pertenencia (empresa/sucursal) + is_active en memoria.
+    - GET / re-render: da los nombres de los ids marcados (las demás opciones
+      las pide el widget al endpoint wizard_step_5_options).
+
+    Uso:
+        validator = ScopedIdValidator(forms)
+        ok = validator.is_valid()
+    """
+
+    def __init__(self, scoped_forms):
+        self.forms = list(scoped_forms)
+        self._rows: dict[str, dict[int, tuple[int, str]]] | None = None
+        for form in self.forms:
+            form.id_validator = self
+
+    def rows(self, field_name: str) -> dict[int, tuple[int, str]]:
+        """{id: (owner_id, nombre)} de los ids activos marcados para el campo en cualquier form."""
+        if self._rows is None:
+            wanted: dict[str, set[int]] = {name: set() for name in SCOPED_SOURCES}
+            for form in self.forms:
+                for name in SCOPED_SOURCES:
+                    if name in form.fields:
+                        wanted[name].update(_selected_ids(form, name))
+            self._rows = {}
+            for name, ids in wanted.items():
+                self._rows[name] = _load_rows(name, ids) if ids else {}
+        return self._rows[field_name]
+
+    def is_valid(self) -> bool:
+        # Sin cortocircuito: todos los forms quedan validados (errores para el re-render)
+        results = [form.is_valid() for form in self.forms]
+        return all(results)
+
+
+def _load_rows(field_name: str, ids) -> dict[int, tuple[int, str]]:
+    source = SCOPED_SOURCES[field_name]
+    return {
+        pk: (owner_id, name)
+        for pk, owner_id, name in source.model.objects.filter(id__in=ids, is_active=True)
+        .values_list("id", source.owner_attr, "name")
+    }
+
+
+class ScopedIdsMixin:
+    """
+    Los campos de SCOPED_SOURCES no arman choices: el template muestra solo las
+    opciones marcadas (`selected_options`) y el resto se pide por JSON.
+
+    clean_<campo> devuelve la lista de ids (sin duplicados, en el orden
+    posteado). Con un ScopedIdValidator compartido resuelve todo en lote; sin
+    él, una query por campo.
+    """
+    id_validator: ScopedIdValidator | None = None
+
+    def _apply_invalid_classes(self) -> None:
+        # BootstrapFormMixin lee self.errors en __init__ (validaría antes de tener el
+        # validator). Acá todos los campos son grupos de checkboxes: no hay clases que agregar.
+        return
+
+    def _scope_owner_id(self) -> int:
+        raise NotImplementedError
+
+    def _rows_for(self, field_name: str, ids) -> dict[int, tuple[int, str]]:
+        if self.id_validator is not None:
+            return self.id_validator.rows(field_name)
+        return _load_rows(field_name, ids)
+
+    @cached_property
+    def selected_options(self) -> dict[str, list[tuple[int, str]]]:
+        """{campo: [(id, nombre)]} de las opciones marcadas que pertenecen al dueño del form."""
+        owner_id = self._scope_owner_id()
+        out: dict[str, list[tuple[int, str]]] = {}
+        for name in self.fields:
+            if name not in SCOPED_SOURCES:
+                continue
+            ids = list(dict.fromkeys(_selected_ids(self, name)))
+            rows = self._rows_for(name, ids) if ids else {}
+            out[name] = sorted(
+                ((i, rows[i][1]) for i in ids if i in rows and rows[i][0] == owner_id),
+                key=lambda opt: (opt[1].lower(), opt[0]),
+            )
+        return out
+
+    def _clean_scoped_ids(self, field_name: str) -> list[int]:
+        raw_ids = self.cleaned_data.get(field_name, [])
+        try:
+            ids = list(dict.fromkeys(int(x) for x in raw_ids if x))
+        except (ValueError, TypeError):
+            raise forms.ValidationError("IDs inválidos.")
+        if not ids:
+            return []
+
+        rows = self._rows_for(field_name, ids)
+        owner_id = self._scope_owner_id()
+        invalid = [i for i in ids if i not in rows or rows[i][0] != owner_id]
+        if invalid:
+            trace("step5.clean.invalid_ids", lambda: {
+                "field": field_name, "prefix": self.prefix, "owner": owner_id, "ids": invalid,
+            })
+            raise forms.ValidationError(SCOPED_MESSAGES[field_name])
+        return ids
+
+
+class CompanyScopedForm(ScopedIdsMixin, BootstrapFormMixin, forms.Form):
     """
     Scoped por EMPRESA:
     - control_panels: depende de Company
@@ -43,105 +177,19 @@ class CompanyScopedForm(BootstrapFormMixin, forms.Form):
         self.company = company
         super().__init__(*args, **kwargs)
 
-        # Querysets filtrados por empresa + activos
-        cp_qs = ControlPanel.objects.filter(
-            company=company, is_active=True).order_by("name")
-        s_qs = Seller.objects.filter(
-            company=company, is_active=True).order_by("name")
-
-        # Construir choices dinámicamente
-        self.fields["control_panels"].choices = [(p.id, str(p)) for p in cp_qs]
-        self.fields["sellers"].choices = [(s.id, str(s)) for s in s_qs]
-
-        import logging
-        logger = logging.getLogger("apps.catalog")
-        logger.debug(
-            "[FORM][INIT] CompanyScopedForm | prefix=%s company=%s cp_choices=%s s_choices=%s",
-            self.prefix, company.id,
-            [c[0] for c in self.fields["control_panels"].choices],
-            [c[0] for c in self.fields["sellers"].choices]
-        )
-
-    def clean_control_panels(self):
-        """Valida y retorna QuerySet de paneles seleccionados."""
-        import logging
-        logger = logging.getLogger("apps.catalog")
-
-        raw_ids = self.cleaned_data.get("control_panels", [])
-        # Convertir strings a ints
-        try:
-            ids = [int(x) for x in raw_ids if x]
-        except (ValueError, TypeError):
-            raise forms.ValidationError("IDs inválidos.")
-
-        logger.debug(
-            "[FORM][CLEAN] control_panels | prefix=%s company=%s ids_from_cleaned=%s",
-            self.prefix, self.company.id, ids
-        )
-
-        if not ids:
-            return ControlPanel.objects.none()
-
-        # Log de choices disponibles
-        available_ids = [c[0] for c in self.fields["control_panels"].choices]
-        logger.debug(
-            "[FORM][CLEAN] control_panels | available_choice_ids=%s",
-            available_ids
-        )
-
-        qs = ControlPanel.objects.filter(
-            id__in=ids, company=self.company, is_active=True
-        )
-        logger.debug(
-            "[FORM][CLEAN] control_panels | qs_count=%s expected_count=%s qs_ids=%s",
-            qs.count(), len(ids), list(qs.values_list("id", flat=True))
-        )
-
-        if qs.count() != len(ids):
-            raise forms.ValidationError(
-                "Uno o más paneles seleccionados no son válidos.")
-        return qs
-
-    def clean_sellers(self):
-        """Valida y retorna QuerySet de vendedores seleccionados."""
-        import logging
-        logger = logging.getLogger("apps.catalog")
-
-        raw_ids = self.cleaned_data.get("sellers", [])
-        try:
-            ids = [int(x) for x in raw_ids if x]
-        except (ValueError, TypeError):
-            raise forms.ValidationError("IDs inválidos.")
-
-        logger.debug(
-            "[FORM][CLEAN] sellers | prefix=%s company=%s ids_from_cleaned=%s",
-            self.prefix, self.company.id, ids
-        )
-
-        if not ids:
-            return Seller.objects.none()
+    def _scope_owner_id(self) -> int:
+        return self.company.id
 
-        available_ids = [c[0] for c in self.fields["sellers"].choices]
-        logger.debug(
-            "[FORM][CLEAN] sellers | available_choice_ids=%s",
-            available_ids
-        )
+    def clean_control_panels(self) -> list[int]:
+        """Ids de paneles seleccionados (de la empresa y activos)."""
+        return self._clean_scoped_ids("control_panels")
 
-        qs = Seller.objects.filter(
-            id__in=ids, company=self.company, is_active=True
-        )
-        logger.debug(
-            "[FORM][CLEAN] sellers | qs_count=%s expected_count=%s qs_ids=%s",
-            qs.count(), len(ids), list(qs.values_list("id", flat=True))
-        )
+    def clean_sellers(self) -> list[int]:
+        """Ids de vendedores seleccionados (de la empresa y activos)."""
+        return self._clean_scoped_ids("sellers")
 
-        if qs.count() != len(ids):
-            raise forms.ValidationError(
-                "Uno o más vendedores seleccionados no son válidos.")
-        return qs
 
-
-class BranchScopedForm(BootstrapFormMixin, forms.Form):
+class BranchScopedForm(ScopedIdsMixin, BootstrapFormMixin, forms.Form):
     """
     Scoped por SUCURSAL:
     - warehouses: depende de Branch
@@ -163,96 +211,13 @@ class BranchScopedForm(BootstrapFormMixin, forms.Form):
         self.branch = branch
         super().__init__(*args, **kwargs)
 
-        wh_qs = Warehouse.objects.filter(
-            branch=branch, is_active=True).order_by("name")
-        cr_qs = CashRegister.objects.filter(
-            branch=branch, is_active=True).order_by("name")
-
-        # Construir choices dinámicamente
-        self.fields["warehouses"].choices = [(w.id, str(w)) for w in wh_qs]
-        self.fields["cash_registers"].choices = [(c.id, str(c)) for c in cr_qs]
-
-        import logging
-        logger = logging.getLogger("apps.catalog")
-        logger.debug(
-            "[FORM][INIT] BranchScopedForm | prefix=%s branch=%s wh_choices=%s cr_choices=%s",
-            self.prefix, branch.id,
-            [c[0] for c in self.fields["warehouses"].choices],
-            [c[0] for c in self.fields["cash_registers"].choices]
-        )
-
-    def clean_warehouses(self):
-        """Valida y retorna QuerySet de depósitos seleccionados."""
-        import logging
-        logger = logging.getLogger("apps.catalog")
-
-        raw_ids = self.cleaned_data.get("warehouses", [])
-        try:
-            ids = [int(x) for x in raw_ids if x]
-        except (ValueError, TypeError):
-            raise forms.ValidationError("IDs inválidos.")
+    def _scope_owner_id(self) -> int:
+        return self.branch.id
 
-        logger.debug(
-            "[FORM][CLEAN] warehouses | prefix=%s branch=%s ids_from_cleaned=%s",
-            self.prefix, self.branch.id, ids
-        )
+    def clean_warehouses(self) -> list[int]:
+        """Ids de depósitos seleccionados (de la sucursal y activos)."""
+        return self._clean_scoped_ids("warehouses")
 
-        if not ids:
-            return Warehouse.objects.none()
-
-        available_ids = [c[0] for c in self.fields["warehouses"].choices]
-        logger.debug(
-            "[FORM][CLEAN] warehouses | available_choice_ids=%s",
-            available_ids
-        )
-
-        qs = Warehouse.objects.filter(
-            id__in=ids, branch=self.branch, is_active=True
-        )
-        logger.debug(
-            "[FORM][CLEAN] warehouses | qs_count=%s expected_count=%s qs_ids=%s",
-            qs.count(), len(ids), list(qs.values_list("id", flat=True))
-        )
-
-        if qs.count() != len(ids):
-            raise forms.ValidationError(
-                "Uno o más depósitos seleccionados no son válidos.")
-        return qs
-
-    def clean_cash_registers(self):
-        """Valida y retorna QuerySet de cajas seleccionadas."""
-        import logging
-        logger = logging.getLogger("apps.catalog")
-
-        raw_ids = self.cleaned_data.get("cash_registers", [])
-        try:
-            ids = [int(x) for x in raw_ids if x]
-        except (ValueError, TypeError):
-            raise forms.ValidationError("IDs inválidos.")
-
-        logger.debug(
-            "[FORM][CLEAN] cash_registers | prefix=%s branch=%s ids_from_cleaned=%s",
-            self.prefix, self.branch.id, ids
-        )
-
-        if not ids:
-            return CashRegister.objects.none()
-
-        available_ids = [c[0] for c in self.fields["cash_registers"].choices]
-        logger.debug(
-            "[FORM][CLEAN] cash_registers | available_choice_ids=%s",
-            available_ids
-        )
-
-        qs = CashRegister.objects.filter(
-            id__in=ids, branch=self.branch, is_active=True
-        )
-        logger.debug(
-            "[FORM][CLEAN] cash_registers | qs_count=%s expected_count=%s qs_ids=%s",
-            qs.count(), len(ids), list(qs.values_list("id", flat=True))
-        )
-
-        if qs.count() != len(ids):
-            raise forms.ValidationError(
-                "Uno o más cajas seleccionadas no son válidas.")
-        return qs
+    def clean_cash_registers(self) -> list[int]:
+        """Ids de cajas seleccionadas (de la sucursal y activas)."""
+        return self._clean_scoped_ids("cash_registers")
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Iterable, Optional, Set
+from dataclasses import dataclass, field
+from typing import Optional, Set
 
 from apps.catalog.models.rules import (
     BlockKind,
     GlobalEntity,
-    PermissionBlock,
 )
 
 from apps.catalog.models.selections import PermissionSelectionSet
+from apps.catalog.services.visibility_rules import (
+    BlockInfo,
+    CompiledVisibilityRules,
+    get_compiled_rules,
+    selection_keys_by_set,
+)
 
 
 @dataclass(frozen=True)
@@ -17,11 +22,15 @@ class VisibleBlocks:
     """
     Resultado mínimo para que la UI (y luego los forms) decidan qué mostrar.
 
-    En esta fase:
-    - devolvemos "todo visible" (modo incremental)
-    - dejamos la estructura lista para integrar reglas reales
+    Se resuelve con el índice compilado de reglas (services/visibility_rules.py):
+    reglas activas cuyos triggers (módulo/nivel/subnivel) matchean la selección,
+    más las reglas sin triggers ("siempre matchean").
     """
     block_codes: Set[str]
+    # Bloques visibles, en orden (order, name)
+    blocks: tuple[BlockInfo, ...] = field(default=())
+    # False si no hay ninguna regla activa: la UI no filtra nada (instalación nueva)
+    configured: bool = True
 
     def has(self, code: str) -> bool:
         return code in self.block_codes
@@ -29,10 +38,26 @@ class VisibleBlocks:
     def allow_global_entity(self, entity: str) -> bool:
         """
         Helper para UI: ej entity = GlobalEntity.ACTION, MATRIX, PAYMENT_METHOD.
+        Permitido si hay algún bloque visible para esa entity.
         """
-        # Esta implementación es deliberadamente simple: si existe algún bloque
-        # para esa entity dentro de los visibles -> permitido.
-        return True
+        return any(
+            b.kind == BlockKind.GLOBAL and b.global_entity == entity for b in self.blocks
+        )
+
+    def allow_scoped_entity(self, entity: str) -> bool:
+        """Ídem para scoped: ej entity = ScopedEntity.WAREHOUSE, SELLER, ..."""
+        return any(
+            b.kind == BlockKind.SCOPED and b.scoped_entity == entity for b in self.blocks
+        )
+
+
+def _visible_blocks_for_keys(selection_keys, compiled: CompiledVisibilityRules) -> VisibleBlocks:
+    codes = compiled.visible_block_codes(selection_keys)
+    return VisibleBlocks(
+        block_codes=set(codes),
+        blocks=tuple(compiled.blocks[code] for code in codes),
+        configured=bool(compiled.rules),
+    )
 
 
 def resolve_visible_blocks(
@@ -41,28 +66,79 @@ def resolve_visible_blocks(
 ) -> VisibleBlocks:
     """
     Resolver bloques visibles según selection_set.
+    3 queries para leer la selección; las reglas salen del índice en memoria.
+    """
+    keys = selection_keys_by_set([selection_set.pk])[selection_set.pk]
+    return _visible_blocks_for_keys(keys, get_compiled_rules())
 
-    Fase actual (modo incremental):
-    - Devuelve TODOS los bloques activos.
 
-    Fase futura:
-    - evaluar PermissionVisibilityRule + triggers (module/level/sublevel)
-    - mapear a PermissionVisibilityRuleBlock (SHOW)
-    - contemplar prioridad y match_mode
+def resolve_visible_blocks_for_sets(selection_sets) -> dict[int, VisibleBlocks]:
     """
-    codes = set(
-        PermissionBlock.objects.filter(is_active=True)
-        .values_list("code", flat=True)
-    )
-    return VisibleBlocks(block_codes=codes)
+    Igual que resolve_visible_blocks para varios selection_sets (instancias o ids),
+    con la misma cantidad de queries. Devuelve {selection_set_id: VisibleBlocks}.
+    """
+    ids = [getattr(s, "pk", s) for s in selection_sets]
+    compiled = get_compiled_rules()
+    return {
+        ss_id: _visible_blocks_for_keys(keys, compiled)
+        for ss_id, keys in selection_keys_by_set(ids).items()
+    }
 
 
 def filter_action_groups_for_visible_blocks(*, blocks: VisibleBlocks) -> Optional[Set[str]]:
     """
-    Para GLOBAL/ACTION: si en el futuro activamos reglas por action_group,
-    este helper devolverá el conjunto permitido.
+    Para GLOBAL/ACTION: conjunto de ActionPermission.group permitidos.
 
-    En fase actual:
-    - None significa "no filtrar"
+    - None significa "no filtrar" (hay un bloque de acciones visible sin action_group)
+    - set() significa "ningún grupo"
     """
-    return None
+    groups: Set[str] = set()
+    for b in blocks.blocks:
+        if b.kind != BlockKind.GLOBAL or b.global_entity != GlobalEntity.ACTION:
+            continue
+        if not b.action_group:
+            return None
+        groups.add(b.action_group)
+    return groups
+
+
+@dataclass(frozen=True)
+class GlobalsScope:
+    """
+    Parte del catálogo global (Step 4 / template step 3) que se muestra y se valida
+    para un selection_set. Las filas fuera del scope no se renderizan ni se tocan
+    al guardar: conservan lo que tenían.
+    """
+    # None = todos los grupos de acciones
+    action_groups: Optional[Set[str]]
+    matrix: bool
+    payments: bool
+
+    def actions(self, actions: list) -> list:
+        if self.action_groups is None:
+            return list(actions)
+        return [a for a in actions if a.group in self.action_groups]
+
+    def matrix_perms(self, matrix: list) -> list:
+        return list(matrix) if self.matrix else []
+
+    def payment_methods(self, payments: list) -> list:
+        return list(payments) if self.payments else []
+
+
+def globals_scope_for_blocks(blocks: VisibleBlocks) -> GlobalsScope:
+    if not blocks.configured:
+        return GlobalsScope(action_groups=None, matrix=True, payments=True)
+    return GlobalsScope(
+        action_groups=filter_action_groups_for_visible_blocks(blocks=blocks),
+        matrix=blocks.allow_global_entity(GlobalEntity.MATRIX),
+        payments=blocks.allow_global_entity(GlobalEntity.PAYMENT_METHOD),
+    )
+
+
+def resolve_globals_scopes(selection_sets) -> dict[int, GlobalsScope]:
+    """{selection_set_id: GlobalsScope}, con las mismas queries que resolve_visible_blocks_for_sets."""
+    return {
+        ss_id: globals_scope_for_blocks(blocks)
+        for ss_id, blocks in resolve_visible_blocks_for_sets(selection_sets).items()
+    }
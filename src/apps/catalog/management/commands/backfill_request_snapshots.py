@@ -0,0 +1,53 @@
+# src/apps/catalog/management/commands/backfill_request_snapshots.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from apps.catalog.models.requests import AccessRequest
+from apps.catalog.services.request_snapshots import (
+    FROZEN_STATUSES,
+    SNAPSHOT_VERSION,
+    snapshot_request,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera el snapshot (documento congelado) de las solicitudes enviadas, "
+        "aprobadas y rechazadas que todavía no lo tienen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenera también los snapshots existentes.",
+        )
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Solo informa cuántas solicitudes se procesarían.")
+
+    def handle(self, *args, **options):
+        force: bool = options["force"]
+        dry_run: bool = options["dry_run"]
+
+        qs = AccessRequest.objects.filter(status__in=FROZEN_STATUSES).order_by("id")
+        if not force:
+            # Sin snapshot o con snapshot de una versión anterior
+            qs = qs.filter(
+                Q(snapshot__isnull=True) | ~Q(snapshot__version=SNAPSHOT_VERSION)
+            )
+
+        ids = list(qs.values_list("id", flat=True))
+        self.stdout.write(f"Solicitudes a procesar: {len(ids)}")
+        if dry_run:
+            return
+
+        done = 0
+        for req in AccessRequest.objects.filter(pk__in=ids).prefetch_related("items").order_by("id"):
+            with transaction.atomic():
+                snapshot_request(req)
+            done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"OK. Snapshots generados: {done}"))
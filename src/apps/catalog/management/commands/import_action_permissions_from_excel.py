@@ -3,45 +3,16 @@ from __future__ import annotations
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 
-import openpyxl
-
-from apps.catalog.models.permissions.global_ops import (
-    ActionPermission,
-    ActionValueType,
-    MatrixPermission,
-    PaymentMethodPermission,
+from apps.catalog.services.action_permissions_import import (
+    ActionImportError,
+    apply_global_diff,
+    diff_global_records,
+    parse_action_workbook,
+    sync_action_workbook,
 )
 
 
-def _norm(s: object) -> str:
-    return " ".join(str(s or "").strip().split())
-
-
-def _h(s: object) -> str:
-    return _norm(s).lower().replace(" ", "")
-
-
-TYPE_MAP = {
-    "bool": ActionValueType.BOOL,
-    "booleano": ActionValueType.BOOL,
-
-    "entero": ActionValueType.INT,
-    "int": ActionValueType.INT,
-
-    "decimal": ActionValueType.DECIMAL,
-    "número": ActionValueType.DECIMAL,
-    "numero": ActionValueType.DECIMAL,
-
-    "porcentaje": ActionValueType.PERCENT,
-    "%": ActionValueType.PERCENT,
-
-    "texto": ActionValueType.TEXT,
-    "text": ActionValueType.TEXT,
-}
-
-
 class Command(BaseCommand):
     help = "Importa permisos globales desde Configuraciones.xlsx (acciones, matriz y medios de pago)."
 
@@ -56,8 +27,15 @@ class Command(BaseCommand):
             action="store_true",
             help="Simula sin escribir en DB.",
         )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help=(
+                "Incremental: saltea hojas sin cambios desde el último --sync, aplica altas/cambios "
+                "y desactiva (is_active=False) las filas que ya no están."
+            ),
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         dry_run: bool = options["dry_run"]
 
@@ -69,138 +47,42 @@ class Command(BaseCommand):
         if not xlsx_path.exists():
             raise CommandError(f"No existe el archivo: {xlsx_path}")
 
-        wb = openpyxl.load_workbook(xlsx_path)
-
-        # ---------------------------------------------------------
-        # 1) Permisos de Acciones
-        # ---------------------------------------------------------
-        sheet = "Permisos de Acciones"
-        if sheet not in wb.sheetnames:
-            raise CommandError(f"No existe la hoja '{sheet}'.")
-
-        ws = wb[sheet]
-        rows = ws.iter_rows(values_only=True)
-        header = next(rows, None)
-
-        hm = {_h(h): i for i, h in enumerate(header or [])}
-        for col in ("tipo", "acciones", "permiso"):
-            if col not in hm:
-                raise CommandError(f"Falta columna '{col}' en hoja '{sheet}'.")
-
-        created = updated = skipped = processed = 0
-
-        for row in rows:
-            processed += 1
-
-            group = _norm(row[hm["tipo"]])
-            action = _norm(row[hm["acciones"]])
-            vt_raw = _norm(row[hm["permiso"]])
-
-            if not group or not action or not vt_raw:
-                skipped += 1
-                continue
-
-            value_type = TYPE_MAP.get(vt_raw.lower())
-            if not value_type:
-                raise CommandError(f"Tipo de permiso desconocido: '{vt_raw}'")
-
-            obj, was_created = ActionPermission.objects.get_or_create(
-                group=group,
-                action=action,
-                defaults={"value_type": value_type},
-            )
-            if was_created:
-                created += 1
-            elif obj.value_type != value_type:
-                obj.value_type = value_type
-                obj.save(update_fields=["value_type"])
-                updated += 1
-
-        # ---------------------------------------------------------
-        # 2) Permisos (matriz simplificada)
-        # ---------------------------------------------------------
-        sheet_perm = "Permisos"
-        created_matrix = updated_matrix = skipped_matrix = 0
-
-        if sheet_perm in wb.sheetnames:
-            ws = wb[sheet_perm]
-            rows = ws.iter_rows(values_only=True)
-            header = next(rows, None)
-
-            hm = {_h(h): i for i, h in enumerate(header or [])}
-            if "permisos" not in hm:
-                raise CommandError(
-                    "La hoja 'Permisos' debe tener columna 'Permisos'.")
-
-            COLS = {
-                "crear": "can_create",
-                "modificar": "can_update",
-                "autorizar": "can_authorize",
-                "cerrar": "can_close",
-                "anular": "can_cancel",
-                "actualizavigencia": "can_update_validity",
-            }
-
-            for row in rows:
-                name = _norm(row[hm["permisos"]])
-                if not name:
-                    skipped_matrix += 1
-                    continue
-
-                values = {}
-                for col_key, field in COLS.items():
-                    if col_key in hm:
-                        cell = _norm(row[hm[col_key]])
-                        values[field] = bool(cell)
-
-                perm, created_p = MatrixPermission.objects.get_or_create(
-                    name=name, defaults=values
-                )
-
-                if created_p:
-                    created_matrix += 1
+        try:
+            parsed = parse_action_workbook(xlsx_path)
+        except ActionImportError as exc:
+            raise CommandError(str(exc)) from exc
+
+        if options["sync"]:
+            result = sync_action_workbook(parsed, dry_run=dry_run)
+            diff = result.diff
+            for delta in result.deltas:
+                if delta.unchanged:
+                    self.stdout.write(f"{delta.sheet}: sin cambios")
                 else:
-                    for k, v in values.items():
-                        setattr(perm, k, v)
-                    perm.save()
-                    updated_matrix += 1
-
-        # ---------------------------------------------------------
-        # 3) Medios de Pago
-        # ---------------------------------------------------------
-        sheet_mp = "Medios de Pago"
-        created_mp = skipped_mp = 0
-
-        if sheet_mp in wb.sheetnames:
-            ws = wb[sheet_mp]
-            rows = ws.iter_rows(values_only=True)
-            header = next(rows, None)
-
-            hm = {_h(h): i for i, h in enumerate(header or [])}
-            if "mediosdepago" not in hm:
-                raise CommandError(
-                    "La hoja 'Medios de Pago' debe tener columna 'Medios de Pago'.")
-
-            for row in rows:
-                name = _norm(row[hm["mediosdepago"]])
-                if not name:
-                    skipped_mp += 1
-                    continue
-                _, c = PaymentMethodPermission.objects.get_or_create(name=name)
-                created_mp += int(c)
+                    self.stdout.write(
+                        f"{delta.sheet}: altas {delta.count('added')} | cambios {delta.count('changed')} | "
+                        f"bajas {delta.count('removed')}"
+                    )
+        else:
+            result = None
+            diff = diff_global_records(parsed.records)
+            if not dry_run and diff.has_changes:
+                apply_global_diff(diff)
 
         if dry_run:
-            transaction.set_rollback(True)
             self.stdout.write(self.style.WARNING(
                 "DRY-RUN: no se guardó nada en la DB."))
 
-        self.stdout.write(
-            self.style.SUCCESS(
-                "OK. "
-                f"Acciones -> Procesadas: {processed} | Saltadas: {skipped} | "
-                f"Creadas: {created} | Actualizadas: {updated} || "
-                f"Matriz -> Saltadas: {skipped_matrix} | "
-                f"Creadas: {created_matrix} | Actualizadas: {updated_matrix} || "
-                f"Medios de Pago -> Saltadas: {skipped_mp} | Creadas: {created_mp}"
-            )
+        skipped = parsed.skipped
+        summary = (
+            "OK. "
+            f"Acciones -> Procesadas: {parsed.processed} | Saltadas: {skipped['actions']} | "
+            f"Creadas: {diff.created('actions')} | Actualizadas: {diff.changed('actions')} || "
+            f"Matriz -> Saltadas: {skipped['matrix']} | "
+            f"Creadas: {diff.created('matrix')} | Actualizadas: {diff.changed('matrix')} || "
+            f"Medios de Pago -> Saltadas: {skipped['payment_methods']} | "
+            f"Creadas: {diff.created('payment_methods')}"
         )
+        if result is not None:
+            summary += f" || Desactivadas: {result.deactivated}"
+        self.stdout.write(self.style.SUCCESS(summary))
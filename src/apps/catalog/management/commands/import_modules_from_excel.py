@@ -4,23 +4,15 @@ from __future__ import annotations
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 
-try:
-    import openpyxl
-except ImportError as exc:  # pragma: no cover
-    raise ImportError(
-        "Falta 'openpyxl'. Instalalo con: pip install openpyxl") from exc
-
-from apps.catalog.models.modules import ErpModule, ErpModuleLevel, ErpModuleSubLevel
-
-
-def _norm(s: object) -> str:
-    return str(s or "").strip()
-
-
-def _norm_header(s: object) -> str:
-    return _norm(s).lower().replace(" ", "")
+from apps.catalog.services.catalog_cache import bump_catalog_version
+from apps.catalog.services.modules_excel_import import (
+    ModulesExcelImportError,
+    apply_module_diff,
+    diff_module_tree,
+    parse_modules_workbook,
+    sync_module_workbook,
+)
 
 
 class Command(BaseCommand):
@@ -42,8 +34,20 @@ class Command(BaseCommand):
             action="store_true",
             help="Simula la importación sin escribir en la base.",
         )
+        parser.add_argument(
+            "--reactivate",
+            action="store_true",
+            help="Reactiva (is_active=True) módulos/niveles/subniveles inactivos que están en el Excel.",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help=(
+                "Incremental: saltea hojas sin cambios desde el último --sync, aplica altas "
+                "y desactiva (is_active=False) las filas que ya no están."
+            ),
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         file_opt = options["file"]
         sheet_name = options["sheet"]
@@ -59,75 +63,37 @@ class Command(BaseCommand):
         if not xlsx_path.exists():
             raise CommandError(f"No existe el archivo: {xlsx_path}")
 
-        wb = openpyxl.load_workbook(xlsx_path)
-        ws = wb[sheet_name] if sheet_name else wb.active
-
-        rows = ws.iter_rows(values_only=True)
         try:
-            header = next(rows)
-        except StopIteration:
-            raise CommandError("La hoja está vacía.")
-
-        # Detectar columnas
-        header_map = {_norm_header(h): idx for idx, h in enumerate(header)}
-        required = ["modulo", "nivel", "subnivel"]
-        missing = [k for k in required if k not in header_map]
-        if missing:
-            raise CommandError(
-                "Encabezados inválidos. Deben existir columnas: Modulo, Nivel, Subnivel. "
-                f"Faltan: {', '.join(missing)}"
-            )
-
-        i_mod = header_map["modulo"]
-        i_lvl = header_map["nivel"]
-        i_sub = header_map["subnivel"]
-
-        created_modules = 0
-        created_levels = 0
-        created_sublevels = 0
-        processed = 0
-        skipped = 0
-
-        for row in rows:
-            processed += 1
-            mod_name = _norm(row[i_mod] if i_mod < len(row) else "")
-            lvl_name = _norm(row[i_lvl] if i_lvl < len(row) else "")
-            sub_name = _norm(row[i_sub] if i_sub < len(row) else "")
-
-            if not mod_name:
-                skipped += 1
-                continue
-
-            module, mod_created = ErpModule.objects.get_or_create(
-                name=mod_name)
-            if mod_created:
-                created_modules += 1
-
-            level = None
-            if lvl_name:
-                level, lvl_created = ErpModuleLevel.objects.get_or_create(
-                    module=module,
-                    name=lvl_name,
-                )
-                if lvl_created:
-                    created_levels += 1
-
-            if level and sub_name:
-                sub, sub_created = ErpModuleSubLevel.objects.get_or_create(
-                    level=level,
-                    name=sub_name,
-                )
-                if sub_created:
-                    created_sublevels += 1
+            parsed = parse_modules_workbook(xlsx_path, sheet_name=sheet_name)
+        except ModulesExcelImportError as exc:
+            raise CommandError(str(exc)) from exc
+
+        deactivated = None
+        if options["sync"]:
+            result = sync_module_workbook(parsed, dry_run=dry_run)
+            diff, deactivated = result.diff, result.deactivated
+            if result.delta.unchanged:
+                self.stdout.write(f"{parsed.sheet}: sin cambios desde el último --sync")
+            changed = not result.delta.unchanged and (diff.has_changes or deactivated)
+        else:
+            # Reporte y escritura salen del mismo diff
+            diff = diff_module_tree(parsed, reactivate=options["reactivate"])
+            changed = diff.has_changes
+            if changed and not dry_run:
+                apply_module_diff(diff)
 
         if dry_run:
-            transaction.set_rollback(True)
             self.stdout.write(self.style.WARNING(
                 "DRY-RUN: no se guardó nada en la DB."))
+        elif changed:
+            # Invalida el árbol de módulos cacheado en todos los workers.
+            bump_catalog_version()
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"OK. Procesadas: {processed} | Saltadas: {skipped} | "
-                f"Creado módulos: {created_modules} | Niveles: {created_levels} | Subniveles: {created_sublevels}"
+                f"OK. Procesadas: {parsed.processed} | Saltadas: {parsed.skipped} | "
+                f"Creado módulos: {len(diff.new_modules)} | Niveles: {len(diff.new_levels)} | "
+                f"Subniveles: {len(diff.new_sublevels)} | Reactivados: {diff.reactivated}"
+                + (f" | Desactivados: {deactivated}" if deactivated is not None else "")
             )
         )
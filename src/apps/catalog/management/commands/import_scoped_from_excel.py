@@ -4,21 +4,16 @@ from __future__ import annotations
 from pathlib import Path
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 
-import openpyxl
-
-from apps.catalog.models.permissions.scoped import (
-    Company, Branch, Warehouse, CashRegister, ControlPanel, Seller
+from apps.catalog.services.catalog_cache import bump_catalog_version
+from apps.catalog.services.scoped_excel_import import (
+    ScopedExcelImportError,
+    apply_scoped_diff,
+    diff_scoped_catalog,
+    parse_scoped_workbook,
+    sync_scoped_workbook,
 )
-
-
-def _norm(s: object) -> str:
-    return " ".join(str(s or "").strip().split())
-
-
-def _h(s: object) -> str:
-    return _norm(s).lower().replace(" ", "")
+from apps.catalog.services.scoped_options import SCOPED_SCOPE
 
 
 class Command(BaseCommand):
@@ -32,8 +27,20 @@ class Command(BaseCommand):
         )
         parser.add_argument("--dry-run", action="store_true",
                             help="Simula sin escribir en DB.")
+        parser.add_argument(
+            "--reactivate",
+            action="store_true",
+            help="Reactiva (is_active=True) las filas inactivas que están en el Excel.",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help=(
+                "Incremental: saltea hojas sin cambios desde el último --sync, aplica altas "
+                "y desactiva (is_active=False) las filas que ya no están."
+            ),
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         dry_run: bool = options["dry_run"]
 
@@ -46,239 +53,47 @@ class Command(BaseCommand):
         if not xlsx_path.exists():
             raise CommandError(f"No existe el archivo: {xlsx_path}")
 
-        wb = openpyxl.load_workbook(xlsx_path)
-
-        created_company = 0
-        created_branch = 0
-        created_wh = 0
-        created_cash = 0
-        created_panel = 0
-        created_seller = 0
-
-        # -------------------------
-        # 1) Empresas (hoja Empresa)
-        # -------------------------
-        if "Empresa" not in wb.sheetnames:
-            raise CommandError("No existe la hoja 'Empresa'.")
-
-        ws = wb["Empresa"]
-        rows = ws.iter_rows(values_only=True)
-        header = next(rows, None)
-        if not header:
-            raise CommandError("La hoja 'Empresa' está vacía.")
-
-        hm = {_h(h): idx for idx, h in enumerate(header)}
-        if "empresa" not in hm:
-            raise CommandError(
-                "La hoja 'Empresa' debe tener columna 'Empresa'.")
-
-        for row in rows:
-            name = _norm(row[hm["empresa"]] if hm["empresa"]
-                         < len(row) else "")
-            if not name:
-                continue
-            _, created = Company.objects.get_or_create(name=name)
-            created_company += int(created)
-
-        # --------------------------------
-        # 2) Sucursales (hoja Sucursales)
-        # --------------------------------
-        if "Sucursales" not in wb.sheetnames:
-            raise CommandError("No existe la hoja 'Sucursales'.")
-
-        ws = wb["Sucursales"]
-        rows = ws.iter_rows(values_only=True)
-        header = next(rows, None)
-        if not header:
-            raise CommandError("La hoja 'Sucursales' está vacía.")
-
-        hm = {_h(h): i for i, h in enumerate(header)}
-        if "empresa" not in hm or "sucursal" not in hm:
-            raise CommandError(
-                "La hoja 'Sucursales' debe tener columnas: Empresa, Sucursal.")
-
-        for row in rows:
-            company_name = _norm(
-                row[hm["empresa"]] if hm["empresa"] < len(row) else "")
-            branch_name = _norm(row[hm["sucursal"]]
-                                if hm["sucursal"] < len(row) else "")
-            if not company_name or not branch_name:
-                continue
-
-            company, c_created = Company.objects.get_or_create(
-                name=company_name)
-            created_company += int(c_created)
-
-            _, b_created = Branch.objects.get_or_create(
-                company=company, name=branch_name)
-            created_branch += int(b_created)
-
-        # ------------------------------------------------
-        # 3) Depósitos (hoja Depositos Hablitados)
-        # ------------------------------------------------
-        sheet_deps = "Depositos Habilitados"
-        if sheet_deps not in wb.sheetnames:
-            raise CommandError(f"No existe la hoja '{sheet_deps}'.")
-
-        ws = wb[sheet_deps]
-        rows = ws.iter_rows(values_only=True)
-        header = next(rows, None)
-        if not header:
-            raise CommandError(f"La hoja '{sheet_deps}' está vacía.")
-
-        hm = {_h(h): i for i, h in enumerate(header)}
-        if "empresa" not in hm or "sucursal" not in hm or "nombre" not in hm:
-            raise CommandError(
-                f"La hoja '{sheet_deps}' debe tener columnas: Empresa, Sucursal, Nombre.")
-
-        for row in rows:
-            company_name = _norm(
-                row[hm["empresa"]] if hm["empresa"] < len(row) else "")
-            branch_name = _norm(row[hm["sucursal"]]
-                                if hm["sucursal"] < len(row) else "")
-            wh_name = _norm(row[hm["nombre"]]
-                            if hm["nombre"] < len(row) else "")
-
-            if not company_name or not branch_name or not wh_name:
-                continue
-
-            company, c_created = Company.objects.get_or_create(
-                name=company_name)
-            created_company += int(c_created)
-
-            branch, b_created = Branch.objects.get_or_create(
-                company=company, name=branch_name)
-            created_branch += int(b_created)
-
-            _, w_created = Warehouse.objects.get_or_create(
-                branch=branch, name=wh_name)
-            created_wh += int(w_created)
-
-        # -------------------------
-        # 4) Cajas (hoja Cajas)
-        # -------------------------
-        sheet_cajas = "Cajas"
-        if sheet_cajas not in wb.sheetnames:
-            raise CommandError(f"No existe la hoja '{sheet_cajas}'.")
-
-        ws = wb[sheet_cajas]
-        rows = ws.iter_rows(values_only=True)
-        header = next(rows, None)
-        if not header:
-            raise CommandError(f"La hoja '{sheet_cajas}' está vacía.")
-
-        hm = {_h(h): i for i, h in enumerate(header)}
-        # columnas esperadas: Empresa, Nombre, Sucursal
-        if "empresa" not in hm or "nombre" not in hm or "sucursal" not in hm:
-            raise CommandError(
-                f"La hoja '{sheet_cajas}' debe tener columnas: Empresa, Nombre, Sucursal.")
-
-        for row in rows:
-            company_name = _norm(
-                row[hm["empresa"]] if hm["empresa"] < len(row) else "")
-            cash_name = _norm(row[hm["nombre"]]
-                              if hm["nombre"] < len(row) else "")
-            branch_name = _norm(row[hm["sucursal"]]
-                                if hm["sucursal"] < len(row) else "")
-
-            if not company_name or not branch_name or not cash_name:
-                continue
-
-            company, c_created = Company.objects.get_or_create(
-                name=company_name)
-            created_company += int(c_created)
-
-            branch, b_created = Branch.objects.get_or_create(
-                company=company, name=branch_name)
-            created_branch += int(b_created)
-
-            _, cr_created = CashRegister.objects.get_or_create(
-                branch=branch, name=cash_name)
-            created_cash += int(cr_created)
-
-        # ------------------------------
-        # 5) Paneles (hoja Paneles Control)
-        # ------------------------------
-        sheet_panels = "Paneles Control"
-        if sheet_panels not in wb.sheetnames:
-            raise CommandError(f"No existe la hoja '{sheet_panels}'.")
-
-        ws = wb[sheet_panels]
-        rows = ws.iter_rows(values_only=True)
-        header = next(rows, None)
-        if not header:
-            raise CommandError(f"La hoja '{sheet_panels}' está vacía.")
-
-        hm = {_h(h): i for i, h in enumerate(header)}
-        # columnas esperadas: Empresa, Paneles
-        if "empresa" not in hm or "paneles" not in hm:
-            raise CommandError(
-                f"La hoja '{sheet_panels}' debe tener columnas: Empresa, Paneles.")
-
-        for row in rows:
-            company_name = _norm(
-                row[hm["empresa"]] if hm["empresa"] < len(row) else "")
-            panel_name = _norm(row[hm["paneles"]]
-                               if hm["paneles"] < len(row) else "")
-            if not company_name or not panel_name:
-                continue
-
-            company, c_created = Company.objects.get_or_create(
-                name=company_name)
-            created_company += int(c_created)
-
-            _, p_created = ControlPanel.objects.get_or_create(
-                company=company, name=panel_name)
-            created_panel += int(p_created)
-
-        # -------------------------
-        # 6) Vendedores (hoja Vendedores)
-        # -------------------------
-        sheet_sellers = "Vendedores"
-        if sheet_sellers not in wb.sheetnames:
-            raise CommandError(f"No existe la hoja '{sheet_sellers}'.")
-
-        ws = wb[sheet_sellers]
-        rows = ws.iter_rows(values_only=True)
-        header = next(rows, None)
-        if not header:
-            raise CommandError(f"La hoja '{sheet_sellers}' está vacía.")
-
-        hm = {_h(h): i for i, h in enumerate(header)}
-        # columnas esperadas: Empresa, Vendedor
-        if "empresa" not in hm or "vendedor" not in hm:
-            raise CommandError(
-                f"La hoja '{sheet_sellers}' debe tener columnas: Empresa, Vendedor.")
-
-        for row in rows:
-            company_name = _norm(
-                row[hm["empresa"]] if hm["empresa"] < len(row) else "")
-            seller_name = _norm(row[hm["vendedor"]]
-                                if hm["vendedor"] < len(row) else "")
-            if not company_name or not seller_name:
-                continue
-
-            company, c_created = Company.objects.get_or_create(
-                name=company_name)
-            created_company += int(c_created)
-
-            _, s_created = Seller.objects.get_or_create(
-                company=company, name=seller_name)
-            created_seller += int(s_created)
+        # Todas las hojas se validan y leen antes de escribir nada
+        try:
+            parsed = parse_scoped_workbook(xlsx_path)
+        except ScopedExcelImportError as exc:
+            raise CommandError(str(exc)) from exc
+
+        deactivated = None
+        if options["sync"]:
+            result = sync_scoped_workbook(parsed, dry_run=dry_run)
+            diff, deactivated = result.diff, result.deactivated
+            for delta in result.deltas:
+                if delta.unchanged:
+                    self.stdout.write(f"{delta.sheet}: sin cambios")
+                else:
+                    self.stdout.write(
+                        f"{delta.sheet}: altas {delta.count('added')} | bajas {delta.count('removed')}"
+                    )
+            changed = bool(result.changed_sheets) and (diff.has_changes or deactivated)
+        else:
+            diff = diff_scoped_catalog(parsed, reactivate=options["reactivate"])
+            changed = diff.has_changes
+            if changed and not dry_run:
+                apply_scoped_diff(diff)
 
         if dry_run:
-            transaction.set_rollback(True)
             self.stdout.write(self.style.WARNING(
                 "DRY-RUN: no se guardó nada en la DB."))
+        elif changed:
+            # bulk_create / update no disparan los signals que invalidan las opciones scoped
+            bump_catalog_version(SCOPED_SCOPE)
 
         self.stdout.write(
             self.style.SUCCESS(
                 "OK. "
-                f"Empresas: {created_company} | "
-                f"Sucursales: {created_branch} | "
-                f"Depósitos: {created_wh} | "
-                f"Cajas: {created_cash} | "
-                f"Paneles: {created_panel} | "
-                f"Vendedores: {created_seller}"
+                f"Empresas: {diff.created('companies')} | "
+                f"Sucursales: {diff.created('branches')} | "
+                f"Depósitos: {diff.created('warehouses')} | "
+                f"Cajas: {diff.created('cash_registers')} | "
+                f"Paneles: {diff.created('control_panels')} | "
+                f"Vendedores: {diff.created('sellers')} | "
+                f"Reactivados: {diff.reactivated}"
+                + (f" | Desactivados: {deactivated}" if deactivated is not None else "")
             )
         )
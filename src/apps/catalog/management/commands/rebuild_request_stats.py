@@ -0,0 +1,18 @@
+# src/apps/catalog/management/commands/rebuild_request_stats.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from apps.catalog.services.request_stats import rebuild_request_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenera AccessRequestDailyStat (contadores del dashboard) desde las "
+        "solicitudes existentes (la migración 0005 ya la carga). Correr después "
+        "de cambios masivos de estado por fuera del ORM."
+    )
+
+    def handle(self, *args, **options):
+        rows = rebuild_request_stats()
+        self.stdout.write(self.style.SUCCESS(f"OK. Filas de estadísticas: {rows}"))
@@ -0,0 +1,33 @@
+# src/apps/catalog/management/commands/refresh_request_summaries.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.catalog.models.requests import AccessRequest
+from apps.catalog.services.request_summary import refresh_request_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las columnas de resumen de AccessRequest (empresas, sucursales, "
+        "template de origen, usuario modelo) que usan el listado y el admin "
+        "(la migración 0008 ya las carga). Correr después de cambios de items "
+        "por fuera del wizard."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Solicitudes por lote (default: 500).")
+
+    def handle(self, *args, **options):
+        batch_size: int = max(1, options["batch_size"])
+
+        ids = list(AccessRequest.objects.order_by("id").values_list("id", flat=True))
+        done = 0
+        for start in range(0, len(ids), batch_size):
+            batch = AccessRequest.objects.filter(pk__in=ids[start:start + batch_size])
+            with transaction.atomic():
+                done += refresh_request_summaries(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"OK. Solicitudes actualizadas: {done}"))
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from apps.catalog.services.instrumentation import (
+    bind_trace_id,
+    clean_trace_id,
+    new_trace_id,
+    reset_trace_id,
+)
+
+
+class TraceIdMiddleware:
+    """
+    Asigna un trace id a cada request (el X-Request-ID entrante si es válido,
+    si no uno nuevo) para los eventos de services/instrumentation.py.
+    Queda en `request.trace_id` y vuelve en el header X-Request-ID.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace_id = clean_trace_id(request.META.get("HTTP_X_REQUEST_ID")) or new_trace_id()
+        request.trace_id = trace_id
+        token = bind_trace_id(trace_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_trace_id(token)
+        response.setdefault("X-Request-ID", trace_id)
+        return response
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-16 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_selectionset_globals_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='selectionsetmodule',
+            name='include_all',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='selectionsetlevel',
+            name='include_all',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_selection_include_all'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessrequest',
+            name='snapshot',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='accessrequest',
+            name='snapshot_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
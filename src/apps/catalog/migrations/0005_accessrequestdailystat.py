@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-17 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_request_stats(apps, schema_editor):
+    """Misma agregación que services/request_stats.rebuild_request_stats, con los modelos históricos."""
+    AccessRequest = apps.get_model("catalog", "AccessRequest")
+    AccessRequestItem = apps.get_model("catalog", "AccessRequestItem")
+    AccessRequestDailyStat = apps.get_model("catalog", "AccessRequestDailyStat")
+
+    totals = (
+        AccessRequest.objects
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "status", "owner_id")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    by_company = (
+        AccessRequestItem.objects
+        .exclude(request__status="DRAFT")
+        .annotate(day=TruncDate("request__created_at"))
+        .values("day", "request__status", "selection_set__company_id", "request__owner_id")
+        .annotate(n=Count("request_id", distinct=True))
+        .order_by()
+    )
+
+    rows = [
+        AccessRequestDailyStat(day=r["day"], status=r["status"], owner_id=r["owner_id"], count=r["n"])
+        for r in totals
+    ]
+    rows.extend(
+        AccessRequestDailyStat(
+            day=r["day"],
+            status=r["request__status"],
+            company_id=r["selection_set__company_id"],
+            owner_id=r["request__owner_id"],
+            count=r["n"],
+        )
+        for r in by_company
+    )
+    AccessRequestDailyStat.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_accessrequest_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessRequestDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('DRAFT', 'Borrador'), ('SUBMITTED', 'Enviada'), ('APPROVED', 'Aprobada'), ('REJECTED', 'Rechazada')], max_length=16)),
+                ('count', models.IntegerField(default=0)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='request_stats', to='catalog.company')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_request_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Estadística diaria de solicitudes',
+                'verbose_name_plural': 'Estadísticas diarias de solicitudes',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('company__isnull', True)), fields=('owner', 'status', 'day'), name='uniq_request_stat_total'), models.UniqueConstraint(condition=models.Q(('company__isnull', False)), fields=('company', 'status', 'day', 'owner'), name='uniq_request_stat_company')],
+            },
+        ),
+        migrations.RunPython(backfill_request_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,99 @@
+# Índices de búsqueda de services/search.py: pg_trgm en PostgreSQL, FTS5 en SQLite.
+
+from django.db import migrations
+
+
+# tabla -> (tabla FTS5, columnas)
+SEARCH_TABLES = {
+    "catalog_requestpersondata": (
+        "catalog_requestpersondata_fts",
+        ("first_name", "last_name", "dni", "email"),
+    ),
+    "catalog_accesstemplate": (
+        "catalog_accesstemplate_fts",
+        ("name", "role_name", "department"),
+    ),
+}
+
+
+def _postgres_forward(cursor):
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, (_, columns) in SEARCH_TABLES.items():
+        for column in columns:
+            # Misma expresión que genera icontains (UPPER(col::text) LIKE UPPER(...))
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{table}_{column}_trgm" '
+                f'ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+            )
+
+
+def _postgres_backward(cursor):
+    for table, (_, columns) in SEARCH_TABLES.items():
+        for column in columns:
+            cursor.execute(f'DROP INDEX IF EXISTS "{table}_{column}_trgm"')
+
+
+def _sqlite_forward(cursor):
+    cursor.execute("PRAGMA compile_options")
+    if "ENABLE_FTS5" not in {row[0] for row in cursor.fetchall()}:
+        # services/search.py vuelve a icontains si la tabla no existe
+        return
+    for table, (fts, columns) in SEARCH_TABLES.items():
+        cols = ", ".join(columns)
+        new_cols = ", ".join(f"new.{c}" for c in columns)
+        old_cols = ", ".join(f"old.{c}" for c in columns)
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _sqlite_backward(cursor):
+    for _, (fts, _) in SEARCH_TABLES.items():
+        for suffix in ("ai", "ad", "au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def forward(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            _postgres_forward(cursor)
+        elif vendor == "sqlite":
+            _sqlite_forward(cursor)
+
+
+def backward(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            _postgres_backward(cursor)
+        elif vendor == "sqlite":
+            _sqlite_backward(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_accessrequestdailystat'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-17 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accessrequest',
+            index=models.Index(fields=['owner', '-created_at', '-id'], name='catalog_req_owner_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accessrequest',
+            index=models.Index(fields=['-created_at', '-id'], name='catalog_req_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accesstemplate',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='catalog_tpl_cursor_idx'),
+        ),
+    ]
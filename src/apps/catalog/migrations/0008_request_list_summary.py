@@ -0,0 +1,107 @@
+# Generated by Django 6.0 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+# Copias de services/request_snapshots.py y services/request_summary.py al momento
+# de la migración (no importar código de la app desde migraciones).
+MODEL_USER_NOTE_PREFIX = "Usuario modelo ERP (texto libre):"
+TEMPLATE_NOTE_PREFIX = "Templates usados:"
+SUMMARY_FIELDS = (
+    "summary_companies",
+    "summary_branch_count",
+    "summary_item_count",
+    "summary_template_source",
+    "summary_copy",
+)
+
+
+def _template_source(raw_notes):
+    for line in (raw_notes or "").splitlines():
+        note = line.strip()
+        if note.startswith(TEMPLATE_NOTE_PREFIX):
+            return note[len(TEMPLATE_NOTE_PREFIX):].strip()
+    return ""
+
+
+def backfill_request_summaries(apps, schema_editor):
+    """Misma lógica que services/request_summary.refresh_request_summaries, con los modelos históricos."""
+    AccessRequest = apps.get_model("catalog", "AccessRequest")
+    AccessRequestItem = apps.get_model("catalog", "AccessRequestItem")
+    PermissionSelectionSet = apps.get_model("catalog", "PermissionSelectionSet")
+
+    by_request = {}
+    rows = (
+        AccessRequestItem.objects
+        .order_by("request_id", "order", "id")
+        .values_list("request_id", "selection_set__company__name", "selection_set__branch_id", "selection_set__notes")
+    )
+    for request_id, *selection in rows:
+        by_request.setdefault(request_id, []).append(selection)
+
+    reqs = list(AccessRequest.objects.only("id", "notes", "selection_set_id"))
+    # Legado: solicitud con selection_set directo y sin items
+    legacy_ids = {r.selection_set_id for r in reqs if r.selection_set_id and r.pk not in by_request}
+    legacy = {
+        pk: [name, branch_id, notes]
+        for pk, name, branch_id, notes in PermissionSelectionSet.objects.filter(pk__in=legacy_ids)
+        .values_list("id", "company__name", "branch_id", "notes")
+    }
+
+    for req in reqs:
+        selections = by_request.get(req.pk, [])
+        if not selections and req.selection_set_id in legacy:
+            selections = [legacy[req.selection_set_id]]
+        companies, copy_summary, branch_ids = [], [], set()
+        for name, branch_id, notes in selections:
+            if name not in companies:
+                companies.append(name)
+            if branch_id:
+                branch_ids.add(branch_id)
+            note = (notes or "").strip()
+            model_ref = note[len(MODEL_USER_NOTE_PREFIX):].strip() if note.startswith(MODEL_USER_NOTE_PREFIX) else ""
+            label = f"{name}: {model_ref}"
+            if model_ref and label not in copy_summary:
+                copy_summary.append(label)
+        req.summary_companies = companies
+        req.summary_branch_count = len(branch_ids)
+        req.summary_item_count = len(selections)
+        req.summary_template_source = _template_source(req.notes)
+        req.summary_copy = copy_summary
+
+    AccessRequest.objects.bulk_update(reqs, SUMMARY_FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_list_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accessrequest',
+            name='summary_branch_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='accessrequest',
+            name='summary_companies',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='accessrequest',
+            name='summary_copy',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='accessrequest',
+            name='summary_item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='accessrequest',
+            name='summary_template_source',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_request_summaries, migrations.RunPython.noop),
+    ]
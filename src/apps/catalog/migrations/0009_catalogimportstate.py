@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_request_list_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImportState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('importer', models.CharField(max_length=40)),
+                ('sheet', models.CharField(max_length=120)),
+                ('sheet_hash', models.CharField(max_length=64)),
+                ('row_hashes', models.JSONField(default=dict)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estado de importación de catálogo',
+                'verbose_name_plural': 'Estados de importación de catálogo',
+                'constraints': [models.UniqueConstraint(fields=('importer', 'sheet'), name='uniq_catalog_import_sheet')],
+            },
+        ),
+    ]
@@ -41,6 +41,12 @@ from .selections import (
 
 from .requests import AccessRequest, AccessRequestItem
 
+from .stats import AccessRequestDailyStat
+
+from .imports import CatalogImportState
+
+from .versions import CatalogVersion
+
 from .templates import AccessTemplate, AccessTemplateItem
 
 
@@ -85,6 +91,9 @@ __all__ = [
     # business objects
     "AccessRequest",
     "AccessRequestItem",
+    "AccessRequestDailyStat",
+    "CatalogImportState",
+    "CatalogVersion",
     "AccessTemplate",
     "AccessTemplateItem",
 ]
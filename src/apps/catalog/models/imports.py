@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from django.db import models
+
+
+class CatalogImportState(models.Model):
+    """
+    Última importación incremental (--sync) de una hoja de Excel.
+
+    - sheet_hash: hash del contenido completo; si no cambió, la hoja se saltea.
+    - row_hashes: {clave de fila: hash}; contra esto se calculan altas,
+      cambios y bajas (las bajas pasan a is_active=False).
+
+    Lo mantiene services/catalog_sync.py.
+    """
+
+    importer = models.CharField(max_length=40)
+    sheet = models.CharField(max_length=120)
+    sheet_hash = models.CharField(max_length=64)
+    row_hashes = models.JSONField(default=dict)
+    rows = models.PositiveIntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Estado de importación de catálogo"
+        verbose_name_plural = "Estados de importación de catálogo"
+        constraints = [
+            models.UniqueConstraint(fields=["importer", "sheet"], name="uniq_catalog_import_sheet"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.importer} / {self.sheet} ({self.rows} filas)"
@@ -69,6 +69,19 @@ class AccessRequest(models.Model):
     # Flag para decidir si los módulos se comparten entre todas las empresas
     same_modules_for_all = models.BooleanField(default=True)
 
+    # Documento resuelto (empresas, niveles, globales, scoped) congelado al enviar.
+    # Ver services/request_snapshots.py.
+    snapshot = models.JSONField(null=True, blank=True, editable=False)
+    snapshot_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Resumen para listados y admin, recalculado al escribir items/notas.
+    # Ver services/request_summary.py.
+    summary_companies = models.JSONField(default=list, blank=True, editable=False)
+    summary_branch_count = models.PositiveIntegerField(default=0, editable=False)
+    summary_item_count = models.PositiveIntegerField(default=0, editable=False)
+    summary_template_source = models.TextField(blank=True, default="", editable=False)
+    summary_copy = models.JSONField(default=list, blank=True, editable=False)
+
     created_at = models.DateTimeField("Creado", auto_now_add=True)
     updated_at = models.DateTimeField("Actualizado", auto_now=True)
 
@@ -79,8 +92,18 @@ class AccessRequest(models.Model):
         indexes = [
             models.Index(fields=["status", "created_at"]),
             models.Index(fields=["kind", "created_at"]),
+            # Paginación por cursor de los listados (services/keyset_pagination.py)
+            models.Index(fields=["owner", "-created_at", "-id"], name="catalog_req_owner_cursor_idx"),
+            models.Index(fields=["-created_at", "-id"], name="catalog_req_cursor_idx"),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado leído: al guardar, services/request_stats.py registra la transición
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
     def clean(self):
         super().clean()
         # Regla de transición: si existen items, no debería usarse selection_set directo.
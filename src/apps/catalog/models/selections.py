@@ -51,6 +51,13 @@ class PermissionSelectionSet(models.Model):
     notes = models.TextField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Huella (sha256) de la parte global: módulos/niveles/subniveles, paneles,
+    # vendedores, acciones, matriz y medios de pago. La recalculan los helpers
+    # que escriben esas tablas (services/fingerprints.py). Vacía = sin calcular.
+    globals_fingerprint = models.CharField(
+        max_length=64, blank=True, default="", editable=False
+    )
+
     class Meta:
         verbose_name = "Selección de permisos"
         verbose_name_plural = "Selecciones de permisos"
@@ -73,6 +80,8 @@ class SelectionSetModule(models.Model):
         PermissionSelectionSet, on_delete=models.CASCADE, related_name="selected_modules"
     )
     module = models.ForeignKey(ErpModule, on_delete=models.PROTECT)
+    # True = todos los subniveles activos del módulo, sin filas de SelectionSetSubLevel
+    include_all = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -94,6 +103,8 @@ class SelectionSetLevel(models.Model):
     )
     level = models.ForeignKey("catalog.ErpModuleLevel",
                               on_delete=models.PROTECT)
+    # True = todos los subniveles activos del nivel, sin filas de SelectionSetSubLevel
+    include_all = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+
+from .permissions.scoped import Company
+from .requests import RequestStatus
+
+
+class AccessRequestDailyStat(models.Model):
+    """
+    Contador de solicitudes por (día de creación, estado, empresa, dueño).
+
+    - company NULL: fila total (cada solicitud cuenta una vez).
+    - company con valor: solicitudes en ese estado que incluyen la empresa.
+      Solo fuera de DRAFT: en borrador las empresas todavía cambian.
+
+    Lo mantiene services/request_stats.py (signals de AccessRequest, en la
+    misma transacción) y se regenera con `rebuild_request_stats`.
+    """
+
+    day = models.DateField()
+    status = models.CharField(max_length=16, choices=RequestStatus.choices)
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name="request_stats",
+        null=True,
+        blank=True,
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="access_request_stats",
+    )
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Estadística diaria de solicitudes"
+        verbose_name_plural = "Estadísticas diarias de solicitudes"
+        constraints = [
+            # NULL no es igual a NULL en un UNIQUE: una constraint parcial por tipo de fila
+            models.UniqueConstraint(
+                fields=["owner", "status", "day"],
+                condition=Q(company__isnull=True),
+                name="uniq_request_stat_total",
+            ),
+            models.UniqueConstraint(
+                fields=["company", "status", "day", "owner"],
+                condition=Q(company__isnull=False),
+                name="uniq_request_stat_company",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.day} {self.status} company={self.company_id or '-'} owner={self.owner_id}: {self.count}"
@@ -53,6 +53,10 @@ class AccessTemplate(models.Model):
             models.UniqueConstraint(
                 fields=["name"], name="uniq_access_template_name"),
         ]
+        indexes = [
+            # Paginación por cursor del listado (services/keyset_pagination.py)
+            models.Index(fields=["is_active", "-created_at", "-id"], name="catalog_tpl_cursor_idx"),
+        ]
 
     def __str__(self) -> str:
         base = self.name
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from django.db import models
+
+
+class CatalogVersion(models.Model):
+    """
+    Contador de versión por scope de catálogo ("modules", "scoped",
+    "visibility_rules"…). Lo leen todos los workers y los comandos de
+    importación: cuando cambia, cada proceso reconstruye su snapshot.
+
+    Lo mantiene services/catalog_cache.py (get_catalog_version / bump_catalog_version).
+    """
+
+    scope = models.CharField(max_length=40, unique=True)
+    version = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Versión de catálogo"
+        verbose_name_plural = "Versiones de catálogo"
+
+    def __str__(self) -> str:
+        return f"{self.scope}: v{self.version}"
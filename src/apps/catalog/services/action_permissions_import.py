@@ -0,0 +1,337 @@
+"""
+Importación de permisos globales desde Configuraciones.xlsx (hojas
+"Permisos de Acciones", "Permisos" y "Medios de Pago").
+
+    parsed = parse_action_workbook(path)
+    diff = diff_global_records(parsed.records)
+    apply_global_diff(diff)   # no llamar en dry-run: el reporte sale del diff
+
+    sync_action_workbook(parsed)  # --sync: solo hojas/filas cambiadas (services/catalog_sync.py)
+
+Cada hoja se reduce a {entidad: {clave: payload}} (payload = campos no
+clave); el diff usa una lectura por tabla y se escribe con bulk_create /
+bulk_update.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.db import transaction
+from openpyxl import load_workbook
+
+from apps.catalog.models.permissions.global_ops import (
+    ActionPermission,
+    ActionValueType,
+    MatrixPermission,
+    PaymentMethodPermission,
+)
+from apps.catalog.services.catalog_sync import (
+    RowKey,
+    SheetDelta,
+    SheetRecords,
+    deactivate_keys,
+    save_sheet_state,
+    sheet_delta,
+)
+
+logger = logging.getLogger("apps.catalog")
+
+
+BULK_BATCH_SIZE = 1000
+# CatalogImportState.importer
+SYNC_IMPORTER = "global_permissions"
+
+TYPE_MAP = {
+    "bool": ActionValueType.BOOL,
+    "booleano": ActionValueType.BOOL,
+
+    "entero": ActionValueType.INT,
+    "int": ActionValueType.INT,
+
+    "decimal": ActionValueType.DECIMAL,
+    "número": ActionValueType.DECIMAL,
+    "numero": ActionValueType.DECIMAL,
+
+    "porcentaje": ActionValueType.PERCENT,
+    "%": ActionValueType.PERCENT,
+
+    "texto": ActionValueType.TEXT,
+    "text": ActionValueType.TEXT,
+}
+
+# Columnas de la hoja "Permisos" (normalizadas) -> campo de MatrixPermission
+MATRIX_COLUMNS = {
+    "crear": "can_create",
+    "modificar": "can_update",
+    "autorizar": "can_authorize",
+    "cerrar": "can_close",
+    "anular": "can_cancel",
+    "actualizavigencia": "can_update_validity",
+}
+
+
+class ActionImportError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class GlobalEntity:
+    name: str
+    model: type
+    key_fields: tuple[str, ...]
+    # Campos que puede traer el payload (los que actualiza bulk_update)
+    value_fields: tuple[str, ...]
+    sheet: str
+    # Hoja obligatoria (las otras se saltean si no están)
+    required: bool = False
+
+
+GLOBAL_ENTITIES: tuple[GlobalEntity, ...] = (
+    GlobalEntity(
+        "actions", ActionPermission, ("group", "action"), ("value_type",), "Permisos de Acciones", required=True
+    ),
+    GlobalEntity("matrix", MatrixPermission, ("name",), tuple(MATRIX_COLUMNS.values()), "Permisos"),
+    GlobalEntity("payment_methods", PaymentMethodPermission, ("name",), (), "Medios de Pago"),
+)
+
+
+@dataclass(frozen=True)
+class ParsedActionWorkbook:
+    # {entidad: {clave: payload}}; solo las entidades cuya hoja existe
+    records: SheetRecords
+    processed: int
+    # {entidad: filas salteadas por vacías}
+    skipped: dict[str, int]
+
+
+@dataclass(frozen=True)
+class GlobalImportDiff:
+    # {entidad: [(clave, payload)]}
+    new: dict[str, list[tuple[RowKey, dict]]] = field(default_factory=dict)
+    # {entidad: [instancias con los campos ya modificados]}
+    updated: dict[str, list] = field(default_factory=dict)
+
+    def created(self, entity: str) -> int:
+        return len(self.new.get(entity, ()))
+
+    def changed(self, entity: str) -> int:
+        return len(self.updated.get(entity, ()))
+
+    @property
+    def has_changes(self) -> bool:
+        return any(self.new.values()) or any(self.updated.values())
+
+
+def _norm(s: object) -> str:
+    return " ".join(str(s or "").strip().split())
+
+
+def _h(s: object) -> str:
+    return _norm(s).lower().replace(" ", "")
+
+
+def _cell(row: tuple, idx: int) -> str:
+    return _norm(row[idx] if idx < len(row) else "")
+
+
+def _sheet_rows(wb, title: str):
+    rows = wb[title].iter_rows(values_only=True)
+    header = next(rows, None)
+    return {_h(h): i for i, h in enumerate(header or [])}, rows
+
+
+def _parse_actions(wb, title: str, skipped: dict[str, int]) -> tuple[dict, int]:
+    hm, rows = _sheet_rows(wb, title)
+    for col in ("tipo", "acciones", "permiso"):
+        if col not in hm:
+            raise ActionImportError(f"Falta columna '{col}' en hoja '{title}'.")
+
+    records: dict[RowKey, dict] = {}
+    processed = 0
+    for row in rows:
+        processed += 1
+        group = _cell(row, hm["tipo"])
+        action = _cell(row, hm["acciones"])
+        vt_raw = _cell(row, hm["permiso"])
+        if not group or not action or not vt_raw:
+            skipped["actions"] += 1
+            continue
+
+        value_type = TYPE_MAP.get(vt_raw.lower())
+        if not value_type:
+            raise ActionImportError(f"Tipo de permiso desconocido: '{vt_raw}'")
+        records[(group, action)] = {"value_type": str(value_type)}
+    return records, processed
+
+
+def _parse_matrix(wb, title: str, skipped: dict[str, int]) -> dict:
+    hm, rows = _sheet_rows(wb, title)
+    if "permisos" not in hm:
+        raise ActionImportError("La hoja 'Permisos' debe tener columna 'Permisos'.")
+
+    records: dict[RowKey, dict] = {}
+    for row in rows:
+        name = _cell(row, hm["permisos"])
+        if not name:
+            skipped["matrix"] += 1
+            continue
+        # Solo las columnas presentes en la hoja
+        records[(name,)] = {
+            field_name: bool(_cell(row, hm[col]))
+            for col, field_name in MATRIX_COLUMNS.items() if col in hm
+        }
+    return records
+
+
+def _parse_payment_methods(wb, title: str, skipped: dict[str, int]) -> dict:
+    hm, rows = _sheet_rows(wb, title)
+    if "mediosdepago" not in hm:
+        raise ActionImportError("La hoja 'Medios de Pago' debe tener columna 'Medios de Pago'.")
+
+    records: dict[RowKey, dict] = {}
+    for row in rows:
+        name = _cell(row, hm["mediosdepago"])
+        if not name:
+            skipped["payment_methods"] += 1
+            continue
+        records[(name,)] = {}
+    return records
+
+
+def parse_action_workbook(path: Path) -> ParsedActionWorkbook:
+    """Lee las tres hojas en modo read_only; no toca la DB."""
+    skipped = {e.name: 0 for e in GLOBAL_ENTITIES}
+    records: SheetRecords = {}
+    processed = 0
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for entity in GLOBAL_ENTITIES:
+            if entity.sheet not in wb.sheetnames:
+                if entity.required:
+                    raise ActionImportError(f"No existe la hoja '{entity.sheet}'.")
+                continue
+            if entity.name == "actions":
+                records["actions"], processed = _parse_actions(wb, entity.sheet, skipped)
+            elif entity.name == "matrix":
+                records["matrix"] = _parse_matrix(wb, entity.sheet, skipped)
+            else:
+                records["payment_methods"] = _parse_payment_methods(wb, entity.sheet, skipped)
+    finally:
+        wb.close()
+
+    return ParsedActionWorkbook(records=records, processed=processed, skipped=skipped)
+
+
+def diff_global_records(records: SheetRecords, *, reactivate: bool = False) -> GlobalImportDiff:
+    """
+    Compara los registros con la DB (una query por tabla): altas, y cambios
+    de los campos del payload (más is_active si reactivate=True).
+    """
+    diff = GlobalImportDiff()
+    for entity in GLOBAL_ENTITIES:
+        rows = records.get(entity.name)
+        if not rows:
+            continue
+        existing = {
+            tuple(getattr(obj, f) for f in entity.key_fields): obj
+            for obj in entity.model.objects.all()
+        }
+        new = diff.new.setdefault(entity.name, [])
+        updated = diff.updated.setdefault(entity.name, [])
+        for key, payload in rows.items():
+            obj = existing.get(key)
+            if obj is None:
+                new.append((key, payload))
+                continue
+            changed = False
+            for field_name, value in payload.items():
+                if getattr(obj, field_name) != value:
+                    setattr(obj, field_name, value)
+                    changed = True
+            if reactivate and not obj.is_active:
+                obj.is_active = True
+                changed = True
+            if changed:
+                updated.append(obj)
+    return diff
+
+
+@transaction.atomic
+def apply_global_diff(diff: GlobalImportDiff) -> None:
+    """Un bulk_create(ignore_conflicts) y un bulk_update por entidad."""
+    for entity in GLOBAL_ENTITIES:
+        new = diff.new.get(entity.name) or []
+        if new:
+            entity.model.objects.bulk_create(
+                [entity.model(**dict(zip(entity.key_fields, key)), **payload) for key, payload in new],
+                batch_size=BULK_BATCH_SIZE, ignore_conflicts=True,
+            )
+        updated = diff.updated.get(entity.name) or []
+        if updated:
+            entity.model.objects.bulk_update(
+                updated, [*entity.value_fields, "is_active"], batch_size=BULK_BATCH_SIZE
+            )
+
+    logger.info(
+        "global_import: %s",
+        " ".join(f"{e.name}=+{diff.created(e.name)}/~{diff.changed(e.name)}" for e in GLOBAL_ENTITIES),
+    )
+
+
+# =========================
+# Sync incremental (--sync)
+# =========================
+
+@dataclass(frozen=True)
+class GlobalSyncResult:
+    deltas: list[SheetDelta]
+    diff: GlobalImportDiff
+    # Filas pasadas a is_active=False (en dry-run: las que se desactivarían)
+    deactivated: int
+
+    @property
+    def changed_sheets(self) -> list[SheetDelta]:
+        return [d for d in self.deltas if not d.unchanged]
+
+
+def sync_action_workbook(parsed: ParsedActionWorkbook, *, dry_run: bool = False) -> GlobalSyncResult:
+    """
+    Aplica solo lo que cambió desde el último --sync: hojas con el mismo
+    hash se saltean; de las demás se crean/actualizan/reactivan las filas
+    nuevas o cambiadas y las que ya no están pasan a is_active=False.
+    Una hoja ausente del libro no se sincroniza (no desactiva nada).
+    """
+    deltas: list[SheetDelta] = []
+    upserts: SheetRecords = {}
+    removed: dict[str, list[RowKey]] = {}
+    for entity in GLOBAL_ENTITIES:
+        rows = parsed.records.get(entity.name)
+        if rows is None:
+            continue
+        delta = sheet_delta(SYNC_IMPORTER, entity.sheet, {entity.name: rows})
+        deltas.append(delta)
+        if delta.unchanged:
+            continue
+        upserts[entity.name] = {key: rows[key] for key in delta.upserts(entity.name)}
+        removed[entity.name] = delta.removed.get(entity.name, [])
+
+    diff = diff_global_records(upserts, reactivate=True)
+    if dry_run:
+        return GlobalSyncResult(deltas, diff, sum(len(keys) for keys in removed.values()))
+
+    deactivated = 0
+    with transaction.atomic():
+        if diff.has_changes:
+            apply_global_diff(diff)
+        for entity in GLOBAL_ENTITIES:
+            keys = removed.get(entity.name)
+            if keys:
+                deactivated += deactivate_keys(entity.model, entity.key_fields, keys)
+        for delta in deltas:
+            if not delta.unchanged:
+                save_sheet_state(delta)
+    return GlobalSyncResult(deltas, diff, deactivated)
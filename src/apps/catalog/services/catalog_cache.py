@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from apps.catalog.models.modules import ErpModule, ErpModuleLevel, ErpModuleSubLevel
+from apps.catalog.models.versions import CatalogVersion
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Scope del catálogo de módulos (ErpModule / Level / SubLevel).
+MODULES_SCOPE = "modules"
+
+# Snapshot en memoria del proceso: {scope: (version, snapshot)}.
+# Cada worker mantiene el suyo; la versión compartida (tabla CatalogVersion)
+# es la que indica cuándo hay que reconstruirlo.
+_snapshots: dict[str, tuple[int, object]] = {}
+_lock = threading.Lock()
+
+# Última versión leída de la DB por el proceso: {scope: (vence (monotonic), versión)}
+_versions: dict[str, tuple[float, int]] = {}
+
+
+def _version_ttl() -> float:
+    return float(getattr(settings, "CATALOG_VERSION_TTL", 2.0))
+
+
+def get_catalog_version(scope: str = MODULES_SCOPE) -> int:
+    """
+    Devuelve la versión actual del catálogo para el scope (tabla CatalogVersion,
+    compartida por todos los workers y procesos). Cada proceso reusa la lectura
+    durante CATALOG_VERSION_TTL segundos: un cambio hecho en otro worker o por
+    un comando se ve a lo sumo con ese atraso.
+    """
+    now = time.monotonic()
+    cached = _versions.get(scope)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    version = CatalogVersion.objects.filter(scope=scope).values_list("version", flat=True).first()
+    if version is None:
+        version = CatalogVersion.objects.get_or_create(scope=scope)[0].version
+    _versions[scope] = (now + _version_ttl(), version)
+    return version
+
+
+def _forget_version(scope: str) -> None:
+    _versions.pop(scope, None)
+
+
+def bump_catalog_version(scope: str = MODULES_SCOPE) -> None:
+    """
+    Invalida el snapshot del scope en todos los workers: +1 a la versión en la
+    DB dentro de la transacción actual (los demás procesos la ven al commit, a
+    más tardar CATALOG_VERSION_TTL después). El proceso que la sube la relee ya.
+    """
+    rows = CatalogVersion.objects.filter(scope=scope)
+    if not rows.update(version=F("version") + 1):
+        try:
+            with transaction.atomic():
+                CatalogVersion.objects.create(scope=scope, version=2)
+        except IntegrityError:
+            # Otro proceso creó la fila entre el update y el insert
+            rows.update(version=F("version") + 1)
+    _forget_version(scope)
+    transaction.on_commit(lambda: _forget_version(scope))
+    logger.debug("Catalog version bumped scope=%s", scope)
+
+
+def get_snapshot(scope: str, builder):
+    """
+    Devuelve el snapshot del scope construido con `builder(version)`,
+    reconstruyéndolo solo si la versión compartida cambió.
+    """
+    version = get_catalog_version(scope)
+    cached = _snapshots.get(scope)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _snapshots.get(scope)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        snapshot = builder(version)
+        _snapshots[scope] = (version, snapshot)
+        return snapshot
+
+
+# =========================
+# Catálogo de módulos
+# =========================
+
+@dataclass(frozen=True)
+class CatalogNode:
+    id: int
+    name: str
+    parent_id: int | None
+    # Nombres desde la raíz: (módulo,), (módulo, nivel) o (módulo, nivel, subnivel)
+    path: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class CompactSelection:
+    # Módulos / niveles que se guardan con include_all=True
+    full_module_ids: tuple[int, ...]
+    full_level_ids: tuple[int, ...]
+    # Subniveles que quedan como filas explícitas (refinamiento)
+    sublevel_ids: tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class ModuleCatalogSnapshot:
+    version: int
+    # Estructura lista para template (solo lectura, compartida entre requests):
+    # [{id, name, levels:[{id, name, sublevels:[{id, name}]}]}]
+    tree: tuple[dict, ...]
+    # Nodos activos por id (orden de inserción = orden del árbol)
+    modules: dict[int, CatalogNode]
+    levels: dict[int, CatalogNode]
+    sublevels: dict[int, CatalogNode]
+    # Clausura: módulo -> subniveles activos / nivel -> subniveles activos
+    sublevel_ids_by_module: dict[int, tuple[int, ...]]
+    sublevel_ids_by_level: dict[int, tuple[int, ...]]
+
+    def sublevel_ids_for_modules(self, module_ids) -> list[int]:
+        """
+        Default "módulo marcado => todo adentro marcado".
+        Ignora módulos inactivos/inexistentes. Orden: módulo, nivel, subnivel.
+        """
+        wanted = {int(x) for x in module_ids}
+        out: list[int] = []
+        for module_id in self.modules:
+            if module_id in wanted:
+                out.extend(self.sublevel_ids_by_module.get(module_id, ()))
+        return out
+
+    def expand_sublevel_ids(self, *, module_ids=(), level_ids=()) -> list[int]:
+        """
+        Subniveles activos implícitos en módulos/niveles marcados "todo adentro"
+        (include_all). Orden del árbol, sin repetidos.
+        """
+        out = list(self.sublevel_ids_for_modules(module_ids))
+        for level_id in level_ids:
+            out.extend(self.sublevel_ids_by_level.get(int(level_id), ()))
+        return list(dict.fromkeys(out))
+
+    def compact_selection(self, module_ids, sublevel_ids) -> CompactSelection:
+        """
+        Inverso de expand_sublevel_ids: detecta módulos seleccionados (y niveles)
+        cuyos subniveles activos están todos elegidos, para guardarlos como
+        include_all en lugar de una fila por subnivel.
+        """
+        selected_modules = {int(x) for x in module_ids}
+        chosen = list(dict.fromkeys(int(x) for x in sublevel_ids))
+        chosen_set = set(chosen)
+
+        full_modules: list[int] = []
+        covered: set[int] = set()
+        for module_id in self.modules:
+            subs = self.sublevel_ids_by_module.get(module_id, ())
+            if module_id in selected_modules and subs and chosen_set.issuperset(subs):
+                full_modules.append(module_id)
+                covered.update(subs)
+
+        full_levels: list[int] = []
+        for level_id, subs in self.sublevel_ids_by_level.items():
+            if subs and not covered.issuperset(subs) and chosen_set.issuperset(subs):
+                full_levels.append(level_id)
+                covered.update(subs)
+
+        return CompactSelection(
+            full_module_ids=tuple(full_modules),
+            full_level_ids=tuple(full_levels),
+            sublevel_ids=tuple(s for s in chosen if s not in covered),
+        )
+
+    def active_sublevel_ids(self, sublevel_ids) -> list[int]:
+        """Filtra ids (int o str) dejando solo subniveles activos del árbol."""
+        out: list[int] = []
+        seen: set[int] = set()
+        for raw in sublevel_ids:
+            try:
+                sid = int(raw)
+            except (TypeError, ValueError):
+                continue
+            if sid in self.sublevels and sid not in seen:
+                seen.add(sid)
+                out.append(sid)
+        return out
+
+
+def _build_module_catalog(version: int) -> ModuleCatalogSnapshot:
+    modules = list(
+        ErpModule.objects.filter(is_active=True)
+        .order_by("name")
+        .values("id", "name")
+    )
+    levels = list(
+        ErpModuleLevel.objects.filter(is_active=True, module__is_active=True)
+        .order_by("module__name", "name")
+        .values("id", "name", "module_id")
+    )
+    sublevels = list(
+        ErpModuleSubLevel.objects.filter(
+            is_active=True, level__is_active=True, level__module__is_active=True
+        )
+        .order_by("level__module__name", "level__name", "name")
+        .values("id", "name", "level_id")
+    )
+
+    levels_by_module: dict[int, list[dict]] = {}
+    for lvl in levels:
+        levels_by_module.setdefault(lvl["module_id"], []).append(lvl)
+
+    subs_by_level: dict[int, list[dict]] = {}
+    for s in sublevels:
+        subs_by_level.setdefault(s["level_id"], []).append(s)
+
+    tree: list[dict] = []
+    module_nodes: dict[int, CatalogNode] = {}
+    level_nodes: dict[int, CatalogNode] = {}
+    sublevel_nodes: dict[int, CatalogNode] = {}
+    sublevel_ids_by_module: dict[int, tuple[int, ...]] = {}
+    sublevel_ids_by_level: dict[int, tuple[int, ...]] = {}
+
+    for m in modules:
+        m_node = CatalogNode(id=m["id"], name=m["name"], parent_id=None, path=(m["name"],))
+        module_nodes[m["id"]] = m_node
+        m_levels = []
+        m_sub_ids: list[int] = []
+        for lvl in levels_by_module.get(m["id"], []):
+            l_node = CatalogNode(
+                id=lvl["id"], name=lvl["name"], parent_id=m["id"], path=m_node.path + (lvl["name"],)
+            )
+            level_nodes[lvl["id"]] = l_node
+            l_subs = subs_by_level.get(lvl["id"], [])
+            for s in l_subs:
+                sublevel_nodes[s["id"]] = CatalogNode(
+                    id=s["id"], name=s["name"], parent_id=lvl["id"], path=l_node.path + (s["name"],)
+                )
+            l_sub_ids = tuple(s["id"] for s in l_subs)
+            sublevel_ids_by_level[lvl["id"]] = l_sub_ids
+            m_sub_ids.extend(l_sub_ids)
+            m_levels.append(
+                {
+                    "id": lvl["id"],
+                    "name": lvl["name"],
+                    "sublevels": [{"id": s["id"], "name": s["name"]} for s in l_subs],
+                }
+            )
+        sublevel_ids_by_module[m["id"]] = tuple(m_sub_ids)
+        tree.append({"id": m["id"], "name": m["name"], "levels": m_levels})
+
+    logger.debug(
+        "Module catalog snapshot rebuilt version=%s modules=%s levels=%s sublevels=%s",
+        version, len(modules), len(levels), len(sublevels),
+    )
+    return ModuleCatalogSnapshot(
+        version=version,
+        tree=tuple(tree),
+        modules=module_nodes,
+        levels=level_nodes,
+        sublevels=sublevel_nodes,
+        sublevel_ids_by_module=sublevel_ids_by_module,
+        sublevel_ids_by_level=sublevel_ids_by_level,
+    )
+
+
+def get_module_catalog() -> ModuleCatalogSnapshot:
+    return get_snapshot(MODULES_SCOPE, _build_module_catalog)
@@ -0,0 +1,135 @@
+"""
+Sync incremental de los imports de catálogo (opción --sync de los comandos
+import_modules_from_excel, import_scoped_from_excel e
+import_action_permissions_from_excel).
+
+    records = {"modules": {("Ventas",): {}}, "levels": {...}}   # {entidad: {clave: payload}}
+    delta = sheet_delta("modules", "Hoja1", records)
+    if not delta.unchanged:
+        ... crear/actualizar delta.added + delta.changed, desactivar delta.removed ...
+        save_sheet_state(delta)
+
+El estado de la última importación (hash de la hoja y de cada fila) vive en
+CatalogImportState. La primera corrida con --sync toma todo como alta y no
+desactiva nada: solo se desactiva lo que estaba en un import anterior.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+
+from apps.catalog.models.imports import CatalogImportState
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Clave de fila por nombres, p.ej. ("Gestión Comercial", "Ventas")
+RowKey = tuple[str, ...]
+# {entidad: {clave: payload}}; el payload son los campos no clave (JSON)
+SheetRecords = dict[str, dict[RowKey, dict]]
+
+
+def _hash(value) -> str:
+    raw = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _row_id(entity: str, key: RowKey) -> str:
+    return json.dumps([entity, *key], ensure_ascii=False)
+
+
+def _split_row_id(row_id: str) -> tuple[str, RowKey]:
+    entity, *key = json.loads(row_id)
+    return entity, tuple(key)
+
+
+@dataclass(frozen=True)
+class SheetDelta:
+    importer: str
+    sheet: str
+    sheet_hash: str
+    row_hashes: dict[str, str]
+    # True: mismo hash que la última importación (no hay nada que aplicar)
+    unchanged: bool
+    added: dict[str, list[RowKey]] = field(default_factory=dict)
+    changed: dict[str, list[RowKey]] = field(default_factory=dict)
+    removed: dict[str, list[RowKey]] = field(default_factory=dict)
+
+    def count(self, kind: str) -> int:
+        return sum(len(keys) for keys in getattr(self, kind).values())
+
+    def upserts(self, entity: str) -> list[RowKey]:
+        """Altas y cambios de `entity` (lo que hay que crear o actualizar)."""
+        return self.added.get(entity, []) + self.changed.get(entity, [])
+
+
+def sheet_delta(importer: str, sheet: str, records: SheetRecords) -> SheetDelta:
+    """Compara las filas leídas con las de la última importación de la hoja."""
+    row_hashes = {
+        _row_id(entity, key): _hash(payload)
+        for entity, rows in records.items()
+        for key, payload in rows.items()
+    }
+    sheet_hash = _hash(sorted(row_hashes.items()))
+
+    state = CatalogImportState.objects.filter(importer=importer, sheet=sheet).first()
+    if state is not None and state.sheet_hash == sheet_hash:
+        return SheetDelta(importer, sheet, sheet_hash, row_hashes, unchanged=True)
+
+    previous = state.row_hashes if state is not None else {}
+    delta = SheetDelta(importer, sheet, sheet_hash, row_hashes, unchanged=False)
+    for row_id, row_hash in row_hashes.items():
+        old = previous.get(row_id)
+        if old == row_hash:
+            continue
+        entity, key = _split_row_id(row_id)
+        target = delta.added if old is None else delta.changed
+        target.setdefault(entity, []).append(key)
+    for row_id in previous.keys() - row_hashes.keys():
+        entity, key = _split_row_id(row_id)
+        delta.removed.setdefault(entity, []).append(key)
+    return delta
+
+
+def save_sheet_state(delta: SheetDelta) -> None:
+    CatalogImportState.objects.update_or_create(
+        importer=delta.importer,
+        sheet=delta.sheet,
+        defaults={
+            "sheet_hash": delta.sheet_hash,
+            "row_hashes": delta.row_hashes,
+            "rows": len(delta.row_hashes),
+        },
+    )
+    logger.info(
+        "catalog_sync: %s/%s altas=%s cambios=%s bajas=%s",
+        delta.importer, delta.sheet, delta.count("added"), delta.count("changed"), delta.count("removed"),
+    )
+
+
+def resolve_key_ids(model, key_lookups: tuple[str, ...], keys) -> dict[RowKey, int]:
+    """
+    ids de las filas de `model` cuyas `key_lookups` valen `keys`. Una query,
+    filtrando por el primer lookup; el resto se compara en memoria.
+    """
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = (
+        model.objects
+        .filter(**{f"{key_lookups[0]}__in": {k[0] for k in keys}})
+        .order_by()
+        .values_list("id", *key_lookups)
+    )
+    return {key: row[0] for row in rows if (key := tuple(row[1:])) in keys}
+
+
+def deactivate_keys(model, key_lookups: tuple[str, ...], keys) -> int:
+    """Pasa a is_active=False las filas de `keys` en un update. Devuelve las afectadas."""
+    ids = resolve_key_ids(model, key_lookups, keys)
+    if not ids:
+        return 0
+    return model.objects.filter(pk__in=ids.values(), is_active=True).update(is_active=False)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict
+from decimal import Decimal
+
+from apps.catalog.models.selections import (
+    PermissionSelectionSet,
+    SelectionSetModule,
+    SelectionSetLevel,
+    SelectionSetSubLevel,
+    SelectionSetControlPanel,
+    SelectionSetSeller,
+    SelectionSetActionValue,
+    SelectionSetMatrixPermission,
+    SelectionSetPaymentMethod,
+)
+
+
+# Partes que componen la huella "global" de un selection_set.
+# Depósitos y cajas quedan afuera: son propios de cada sucursal.
+_PARTS = (
+    "modules",
+    "levels",
+    "sublevels",
+    "control_panels",
+    "sellers",
+    "actions",
+    "matrix",
+    "payments",
+)
+
+
+def _canon(value):
+    if isinstance(value, Decimal):
+        # 1.500000 y 1.5 deben producir la misma huella
+        return format(value.normalize(), "f")
+    return value
+
+
+def _rows_by_selection_set(qs, fields: tuple[str, ...], ids: list[int]) -> dict[int, list[tuple]]:
+    out: dict[int, list[tuple]] = defaultdict(list)
+    rows = (
+        qs.filter(selection_set_id__in=ids)
+        .order_by("selection_set_id", fields[0])
+        .values_list("selection_set_id", *fields)
+    )
+    for row in rows:
+        out[row[0]].append(tuple(_canon(v) for v in row[1:]))
+    return out
+
+
+def _with_include_all(rows_by_ss: dict[int, list[tuple]]) -> dict[int, list[tuple]]:
+    # (id, include_all) -> (id,) o (id, "*"): las filas sin el flag hashean igual que antes
+    return {
+        ss_id: [(row[0], "*") if row[1] else (row[0],) for row in rows]
+        for ss_id, rows in rows_by_ss.items()
+    }
+
+
+def compute_global_fingerprints(selection_set_ids) -> dict[int, str]:
+    """
+    Calcula la huella de la parte global (módulos, niveles, subniveles, paneles,
+    vendedores, acciones, matriz y medios de pago) de varios selection_sets.
+    Cantidad de queries fija (una por tabla), sin importar cuántos ids.
+    """
+    ids = sorted({int(x) for x in selection_set_ids})
+    if not ids:
+        return {}
+
+    parts = {
+        "modules": _with_include_all(
+            _rows_by_selection_set(SelectionSetModule.objects, ("module_id", "include_all"), ids)
+        ),
+        "levels": _with_include_all(
+            _rows_by_selection_set(SelectionSetLevel.objects, ("level_id", "include_all"), ids)
+        ),
+        "sublevels": _rows_by_selection_set(SelectionSetSubLevel.objects, ("sublevel_id",), ids),
+        "control_panels": _rows_by_selection_set(
+            SelectionSetControlPanel.objects, ("control_panel_id",), ids
+        ),
+        "sellers": _rows_by_selection_set(SelectionSetSeller.objects, ("seller_id",), ids),
+        "actions": _rows_by_selection_set(
+            SelectionSetActionValue.objects.filter(is_active=True),
+            ("action_permission_id", "value_bool", "value_int", "value_decimal", "value_text"),
+            ids,
+        ),
+        "matrix": _rows_by_selection_set(
+            SelectionSetMatrixPermission.objects,
+            (
+                "permission_id",
+                "can_create",
+                "can_update",
+                "can_authorize",
+                "can_close",
+                "can_cancel",
+                "can_update_validity",
+            ),
+            ids,
+        ),
+        "payments": _rows_by_selection_set(
+            SelectionSetPaymentMethod.objects.filter(is_active=True),
+            ("payment_method_id", "enabled"),
+            ids,
+        ),
+    }
+
+    out: dict[int, str] = {}
+    for ss_id in ids:
+        payload = repr(tuple((name, tuple(parts[name].get(ss_id, ()))) for name in _PARTS))
+        out[ss_id] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return out
+
+
+def refresh_global_fingerprints(selection_sets) -> dict[int, str]:
+    """
+    Recalcula y persiste `globals_fingerprint` para los selection_sets dados
+    (instancias, read models con `id` o ids). Actualiza también las instancias recibidas.
+    """
+    selection_sets = list(selection_sets)
+    instances = [s for s in selection_sets if isinstance(s, PermissionSelectionSet)]
+    ids = [s if isinstance(s, int) else s.id for s in selection_sets]
+    fingerprints = compute_global_fingerprints(ids)
+    if not fingerprints:
+        return fingerprints
+
+    to_update = [
+        PermissionSelectionSet(pk=ss_id, globals_fingerprint=fp)
+        for ss_id, fp in fingerprints.items()
+    ]
+    PermissionSelectionSet.objects.bulk_update(to_update, ["globals_fingerprint"])
+
+    for inst in instances:
+        inst.globals_fingerprint = fingerprints.get(inst.pk, inst.globals_fingerprint)
+    return fingerprints
+
+
+def ensure_global_fingerprints(selection_sets) -> dict[int, str]:
+    """
+    Devuelve {id: huella} usando la columna persistida; las vacías (datos previos
+    a la columna) se calculan y guardan en el momento.
+    Acepta instancias o read models con `id` y `globals_fingerprint`.
+    """
+    out: dict[int, str] = {}
+    missing = []
+    for ss in selection_sets:
+        if ss.globals_fingerprint:
+            out[ss.id] = ss.globals_fingerprint
+        else:
+            missing.append(ss)
+    if missing:
+        out.update(refresh_global_fingerprints(missing))
+    return out
@@ -0,0 +1,159 @@
+"""
+Instrumentación estructurada del catálogo (eventos con payload perezoso).
+
+    from apps.catalog.services.instrumentation import trace, span
+
+    trace("step5.invalid", lambda: {"errors": form.errors.get_json_data()})
+
+    with span("step5.validate", lambda: {"forms": len(forms)}):
+        ok = validator.is_valid()
+
+- Costo cero deshabilitado: si el logger `apps.catalog.trace` no emite el
+  nivel pedido, trace()/span() vuelven sin evaluar el payload (es un callable).
+- Muestreo: CATALOG_TRACE_SAMPLE_RATE (0..1, default 1.0) o `sample=` por
+  evento. La decisión sale del trace id: una request se loguea entera o nada.
+- Trace id por request (TraceIdMiddleware): viaja en cada evento (`extra`) y
+  en el header X-Request-ID de la respuesta.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import re
+import time
+import uuid
+import zlib
+from contextlib import nullcontext
+from contextvars import ContextVar, Token
+from typing import Callable, Optional
+
+from django.conf import settings
+
+
+TRACE_LOGGER = "apps.catalog.trace"
+logger = logging.getLogger(TRACE_LOGGER)
+
+NO_TRACE_ID = "-"
+
+_trace_id: ContextVar[str] = ContextVar("catalog_trace_id", default=NO_TRACE_ID)
+_VALID_TRACE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+Payload = Optional[Callable[[], dict]]
+
+
+# =========================
+# Trace id
+# =========================
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def clean_trace_id(value: str | None) -> str | None:
+    """Trace id recibido (p.ej. X-Request-ID de un proxy) si es seguro para loguear."""
+    value = (value or "").strip()
+    return value if _VALID_TRACE_ID.match(value) else None
+
+
+def get_trace_id() -> str:
+    return _trace_id.get()
+
+
+def bind_trace_id(trace_id: str) -> Token:
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token: Token) -> None:
+    _trace_id.reset(token)
+
+
+# =========================
+# Muestreo
+# =========================
+
+def _sample_rate(sample: float | None) -> float:
+    if sample is not None:
+        return sample
+    return float(getattr(settings, "CATALOG_TRACE_SAMPLE_RATE", 1.0))
+
+
+def _sampled(rate: float) -> bool:
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    trace_id = _trace_id.get()
+    if trace_id == NO_TRACE_ID:
+        # Fuera de una request (comandos, tareas): muestreo por evento
+        return random.random() < rate
+    # Determinístico por request: hash del id completo (cualquier X-Request-ID válido)
+    return zlib.crc32(trace_id.encode("utf-8")) / 0xFFFFFFFF < rate
+
+
+def enabled(level: int = logging.DEBUG, *, sample: float | None = None) -> bool:
+    """True si un evento de ese nivel se emitiría (para guardar trabajo más caro que un payload)."""
+    return logger.isEnabledFor(level) and _sampled(_sample_rate(sample))
+
+
+# =========================
+# Eventos
+# =========================
+
+def _emit(level: int, event: str, data: dict) -> None:
+    trace_id = _trace_id.get()
+    logger.log(
+        level,
+        "%s trace=%s %s",
+        event,
+        trace_id,
+        json.dumps(data, default=str, ensure_ascii=False, sort_keys=True),
+        extra={"event": event, "trace_id": trace_id, "payload": data},
+    )
+
+
+def trace(event: str, payload: Payload = None, *, level: int = logging.DEBUG, sample: float | None = None) -> None:
+    """
+    Emite `event` con el dict que devuelve `payload()`.
+    Si el nivel está deshabilitado (o la request no entra en el muestreo) no
+    se evalúa el payload.
+    """
+    if not logger.isEnabledFor(level) or not _sampled(_sample_rate(sample)):
+        return
+    _emit(level, event, payload() if payload is not None else {})
+
+
+class _Span:
+    __slots__ = ("event", "payload", "level", "started")
+
+    def __init__(self, event: str, payload: Payload, level: int):
+        self.event = event
+        self.payload = payload
+        self.level = level
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        data = dict(self.payload()) if self.payload is not None else {}
+        data["ms"] = round((time.perf_counter() - self.started) * 1000, 2)
+        if exc_type is not None:
+            data["error"] = exc_type.__name__
+        _emit(self.level, self.event, data)
+        return False
+
+
+_NULL_SPAN = nullcontext()
+
+
+def span(event: str, payload: Payload = None, *, level: int = logging.DEBUG, sample: float | None = None):
+    """
+    Context manager que emite `event` al salir, con la duración en ms.
+    Deshabilitado devuelve un nullcontext compartido (sin reloj ni payload).
+    """
+    if not logger.isEnabledFor(level) or not _sampled(_sample_rate(sample)):
+        return _NULL_SPAN
+    return _Span(event, payload, level)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Conteo opcional: se cuenta hasta este tope ("1000+"), nunca la tabla entera
+DEFAULT_COUNT_CAP = 1000
+
+
+@dataclass(frozen=True)
+class Cursor:
+    created_at: datetime
+    pk: int
+    # True: la página anterior (filas más nuevas que el cursor)
+    backwards: bool
+
+
+class KeysetPage:
+    """Página de KeysetPaginator; misma interfaz mínima que Page para los templates."""
+
+    def __init__(self, object_list: list, *, next_token: str, previous_token: str):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return bool(self.next_token)
+
+    def has_previous(self) -> bool:
+        return bool(self.previous_token)
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginación por cursor sobre (created_at, id) descendente: cada página es
+    un WHERE (created_at, id) < cursor + LIMIT, sin OFFSET ni COUNT, así que
+    cuesta lo mismo en la página 1 que en la 500 (usa los índices
+    (…, -created_at, -id) de los modelos).
+
+    Los tokens son el borde de la página firmado con `salt` (opacos y no
+    reutilizables entre listados). Un token inválido vuelve a la primera página.
+    """
+
+    def __init__(self, queryset, per_page: int, *, salt: str):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.salt = salt
+
+    # ---- tokens ----
+    def encode(self, obj, *, backwards: bool) -> str:
+        payload = {"c": obj.created_at.isoformat(), "i": obj.pk}
+        if backwards:
+            payload["b"] = 1
+        return signing.dumps(payload, salt=self.salt)
+
+    def decode(self, token: str) -> Cursor | None:
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=self.salt)
+            created_at = parse_datetime(payload["c"])
+            pk = int(payload["i"])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            logger.debug("keyset: token inválido salt=%s", self.salt)
+            return None
+        if created_at is None:
+            return None
+        return Cursor(created_at=created_at, pk=pk, backwards=bool(payload.get("b")))
+
+    # ---- páginas ----
+    def _rows(self, cursor: Cursor | None) -> list:
+        qs = self.queryset
+        limit = self.per_page + 1
+        if cursor is None:
+            return list(qs.order_by("-created_at", "-pk")[:limit])
+        if cursor.backwards:
+            newer = Q(created_at__gt=cursor.created_at) | Q(created_at=cursor.created_at, pk__gt=cursor.pk)
+            return list(qs.filter(newer).order_by("created_at", "pk")[:limit])
+        older = Q(created_at__lt=cursor.created_at) | Q(created_at=cursor.created_at, pk__lt=cursor.pk)
+        return list(qs.filter(older).order_by("-created_at", "-pk")[:limit])
+
+    def page(self, token: str = "") -> KeysetPage:
+        cursor = self.decode(token)
+        rows = self._rows(cursor)
+        more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+
+        if cursor is not None and cursor.backwards:
+            if not more:
+                # Se llegó al principio: la primera página completa
+                return self.page("")
+            rows.reverse()
+            has_next, has_previous = True, True
+        else:
+            has_next, has_previous = more, cursor is not None
+
+        return KeysetPage(
+            rows,
+            next_token=self.encode(rows[-1], backwards=False) if rows and has_next else "",
+            previous_token=self.encode(rows[0], backwards=True) if rows and has_previous else "",
+        )
+
+
+def capped_count(queryset, cap: int = DEFAULT_COUNT_CAP) -> tuple[int, bool]:
+    """
+    (cantidad, True si hay más de `cap`). Cuenta a lo sumo cap+1 ids: costo
+    acotado aunque el listado tenga toda la historia.
+    """
+    n = queryset.order_by().values("pk")[: cap + 1].count()
+    return min(n, cap), n > cap
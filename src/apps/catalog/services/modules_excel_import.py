@@ -0,0 +1,296 @@
+"""
+Importación de Módulo / Nivel / Subnivel desde permisos.xlsx.
+
+    parsed = parse_modules_workbook(path, sheet_name=None)
+    diff = diff_module_tree(parsed, reactivate=False)
+    apply_module_diff(diff)   # no llamar en dry-run: el reporte sale del diff
+
+    sync_module_workbook(parsed)  # --sync: solo filas cambiadas (services/catalog_sync.py)
+
+El Excel se lee en streaming (read_only) y se arma el árbol completo en
+memoria; el diff se calcula contra una lectura por tabla y se escribe con
+bulk_create / bulk_update: la cantidad de queries no depende de las filas.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.db import transaction
+from openpyxl import load_workbook
+
+from apps.catalog.models.modules import ErpModule, ErpModuleLevel, ErpModuleSubLevel
+from apps.catalog.services.catalog_sync import (
+    SheetDelta,
+    SheetRecords,
+    deactivate_keys,
+    save_sheet_state,
+    sheet_delta,
+)
+
+logger = logging.getLogger("apps.catalog")
+
+
+BULK_BATCH_SIZE = 1000
+REQUIRED_HEADERS = ("modulo", "nivel", "subnivel")
+# CatalogImportState.importer
+SYNC_IMPORTER = "modules"
+
+# (entidad del sync, modelo, lookups de la clave por nombres)
+SYNC_ENTITIES = (
+    ("modules", ErpModule, ("name",)),
+    ("levels", ErpModuleLevel, ("module__name", "name")),
+    ("sublevels", ErpModuleSubLevel, ("level__module__name", "level__name", "name")),
+)
+
+
+class ModulesExcelImportError(Exception):
+    pass
+
+
+# {módulo: {nivel: [subniveles]}}, en orden de aparición y sin repetidos
+ModuleTree = dict[str, dict[str, list[str]]]
+
+
+@dataclass(frozen=True)
+class ParsedModuleTree:
+    tree: ModuleTree
+    processed: int
+    skipped: int
+    # Título de la hoja leída (clave del estado de --sync)
+    sheet: str = ""
+
+
+@dataclass(frozen=True)
+class ModuleTreeDiff:
+    new_modules: list[str] = field(default_factory=list)
+    # (módulo, nivel)
+    new_levels: list[tuple[str, str]] = field(default_factory=list)
+    # (módulo, nivel, subnivel)
+    new_sublevels: list[tuple[str, str, str]] = field(default_factory=list)
+    # Filas existentes inactivas que están en el Excel (solo con reactivate=True)
+    reactivate_modules: list[ErpModule] = field(default_factory=list)
+    reactivate_levels: list[ErpModuleLevel] = field(default_factory=list)
+    reactivate_sublevels: list[ErpModuleSubLevel] = field(default_factory=list)
+
+    @property
+    def reactivated(self) -> int:
+        return len(self.reactivate_modules) + len(self.reactivate_levels) + len(self.reactivate_sublevels)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.new_modules or self.new_levels or self.new_sublevels or self.reactivated)
+
+
+def _norm(s: object) -> str:
+    return str(s or "").strip()
+
+
+def _norm_header(s: object) -> str:
+    return _norm(s).lower().replace(" ", "")
+
+
+def _cell(row: tuple, idx: int) -> str:
+    return _norm(row[idx] if idx < len(row) else "")
+
+
+def parse_modules_workbook(path: Path, *, sheet_name: str | None = None) -> ParsedModuleTree:
+    """Lee la hoja en modo read_only (fila a fila, sin materializar el libro)."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        if sheet_name and sheet_name not in wb.sheetnames:
+            raise ModulesExcelImportError(f"No existe la hoja: {sheet_name}")
+        ws = wb[sheet_name] if sheet_name else wb.active
+
+        rows = ws.iter_rows(values_only=True)
+        try:
+            header = next(rows)
+        except StopIteration:
+            raise ModulesExcelImportError("La hoja está vacía.")
+
+        header_map = {_norm_header(h): idx for idx, h in enumerate(header)}
+        missing = [k for k in REQUIRED_HEADERS if k not in header_map]
+        if missing:
+            raise ModulesExcelImportError(
+                "Encabezados inválidos. Deben existir columnas: Modulo, Nivel, Subnivel. "
+                f"Faltan: {', '.join(missing)}"
+            )
+        i_mod, i_lvl, i_sub = (header_map[k] for k in REQUIRED_HEADERS)
+
+        title = ws.title
+        tree: ModuleTree = {}
+        processed = skipped = 0
+        for row in rows:
+            processed += 1
+            mod_name = _cell(row, i_mod)
+            if not mod_name:
+                skipped += 1
+                continue
+            levels = tree.setdefault(mod_name, {})
+
+            lvl_name = _cell(row, i_lvl)
+            if not lvl_name:
+                continue
+            sublevels = levels.setdefault(lvl_name, [])
+
+            sub_name = _cell(row, i_sub)
+            if sub_name and sub_name not in sublevels:
+                sublevels.append(sub_name)
+    finally:
+        wb.close()
+
+    return ParsedModuleTree(tree=tree, processed=processed, skipped=skipped, sheet=title)
+
+
+def diff_module_tree(parsed: ParsedModuleTree, *, reactivate: bool = False) -> ModuleTreeDiff:
+    """
+    Compara el árbol del Excel con la DB (una query por tabla). Solo agrega:
+    lo que existe en la DB y no en el Excel no se toca.
+    """
+    modules = {m.name: m for m in ErpModule.objects.only("id", "name", "is_active")}
+    levels = {
+        (lvl.module_id, lvl.name): lvl
+        for lvl in ErpModuleLevel.objects.only("id", "module_id", "name", "is_active")
+    }
+    sublevels = {
+        (sub.level_id, sub.name): sub
+        for sub in ErpModuleSubLevel.objects.only("id", "level_id", "name", "is_active")
+    }
+
+    diff = ModuleTreeDiff()
+    for mod_name, mod_levels in parsed.tree.items():
+        module = modules.get(mod_name)
+        if module is None:
+            diff.new_modules.append(mod_name)
+        elif reactivate and not module.is_active:
+            diff.reactivate_modules.append(module)
+
+        for lvl_name, sub_names in mod_levels.items():
+            level = levels.get((module.pk, lvl_name)) if module else None
+            if level is None:
+                diff.new_levels.append((mod_name, lvl_name))
+            elif reactivate and not level.is_active:
+                diff.reactivate_levels.append(level)
+
+            for sub_name in sub_names:
+                sub = sublevels.get((level.pk, sub_name)) if level else None
+                if sub is None:
+                    diff.new_sublevels.append((mod_name, lvl_name, sub_name))
+                elif reactivate and not sub.is_active:
+                    diff.reactivate_sublevels.append(sub)
+
+    return diff
+
+
+@transaction.atomic
+def apply_module_diff(diff: ModuleTreeDiff) -> None:
+    """
+    Escribe el diff: bulk_create(ignore_conflicts) por tabla (otro import
+    concurrente no lo rompe) y bulk_update de is_active. Los ids de los
+    padres nuevos se releen por nombre en una query por tabla.
+    """
+    if diff.new_modules:
+        ErpModule.objects.bulk_create(
+            [ErpModule(name=name) for name in diff.new_modules],
+            batch_size=BULK_BATCH_SIZE, ignore_conflicts=True,
+        )
+
+    level_mods = {mod for mod, _ in diff.new_levels} | {mod for mod, _, _ in diff.new_sublevels}
+    module_ids = dict(ErpModule.objects.filter(name__in=level_mods).values_list("name", "id")) if level_mods else {}
+
+    if diff.new_levels:
+        ErpModuleLevel.objects.bulk_create(
+            [ErpModuleLevel(module_id=module_ids[mod], name=lvl) for mod, lvl in diff.new_levels],
+            batch_size=BULK_BATCH_SIZE, ignore_conflicts=True,
+        )
+
+    if diff.new_sublevels:
+        wanted = {(module_ids[mod], lvl) for mod, lvl, _ in diff.new_sublevels}
+        level_ids = {
+            (module_id, name): pk
+            for pk, module_id, name in ErpModuleLevel.objects.filter(
+                module_id__in={m for m, _ in wanted}, name__in={n for _, n in wanted}
+            ).values_list("id", "module_id", "name")
+        }
+        ErpModuleSubLevel.objects.bulk_create(
+            [
+                ErpModuleSubLevel(level_id=level_ids[(module_ids[mod], lvl)], name=sub)
+                for mod, lvl, sub in diff.new_sublevels
+            ],
+            batch_size=BULK_BATCH_SIZE, ignore_conflicts=True,
+        )
+
+    for model, rows in (
+        (ErpModule, diff.reactivate_modules),
+        (ErpModuleLevel, diff.reactivate_levels),
+        (ErpModuleSubLevel, diff.reactivate_sublevels),
+    ):
+        if rows:
+            for row in rows:
+                row.is_active = True
+            model.objects.bulk_update(rows, ["is_active"], batch_size=BULK_BATCH_SIZE)
+
+    logger.info(
+        "modules_import: módulos=%s niveles=%s subniveles=%s reactivados=%s",
+        len(diff.new_modules), len(diff.new_levels), len(diff.new_sublevels), diff.reactivated,
+    )
+
+
+# =========================
+# Sync incremental (--sync)
+# =========================
+
+@dataclass(frozen=True)
+class ModuleSyncResult:
+    delta: SheetDelta
+    diff: ModuleTreeDiff
+    # Filas pasadas a is_active=False (en dry-run: las que se desactivarían)
+    deactivated: int
+
+
+def _module_records(tree: ModuleTree) -> SheetRecords:
+    records: SheetRecords = {"modules": {}, "levels": {}, "sublevels": {}}
+    for mod_name, levels in tree.items():
+        records["modules"][(mod_name,)] = {}
+        for lvl_name, sub_names in levels.items():
+            records["levels"][(mod_name, lvl_name)] = {}
+            for sub_name in sub_names:
+                records["sublevels"][(mod_name, lvl_name, sub_name)] = {}
+    return records
+
+
+def _tree_from_keys(delta: SheetDelta) -> ParsedModuleTree:
+    tree: ModuleTree = {}
+    for (mod_name,) in delta.upserts("modules"):
+        tree.setdefault(mod_name, {})
+    for mod_name, lvl_name in delta.upserts("levels"):
+        tree.setdefault(mod_name, {}).setdefault(lvl_name, [])
+    for mod_name, lvl_name, sub_name in delta.upserts("sublevels"):
+        tree.setdefault(mod_name, {}).setdefault(lvl_name, []).append(sub_name)
+    return ParsedModuleTree(tree=tree, processed=0, skipped=0)
+
+
+def sync_module_workbook(parsed: ParsedModuleTree, *, dry_run: bool = False) -> ModuleSyncResult:
+    """
+    Aplica solo lo que cambió desde el último --sync de la hoja: si el hash
+    es el mismo no hace nada; si no, crea/reactiva las filas nuevas y pasa a
+    is_active=False los módulos/niveles/subniveles que ya no están.
+    """
+    delta = sheet_delta(SYNC_IMPORTER, parsed.sheet, _module_records(parsed.tree))
+    if delta.unchanged:
+        return ModuleSyncResult(delta, ModuleTreeDiff(), 0)
+
+    diff = diff_module_tree(_tree_from_keys(delta), reactivate=True)
+    if dry_run:
+        return ModuleSyncResult(delta, diff, delta.count("removed"))
+
+    deactivated = 0
+    with transaction.atomic():
+        if diff.has_changes:
+            apply_module_diff(diff)
+        for entity, model, key_lookups in SYNC_ENTITIES:
+            deactivated += deactivate_keys(model, key_lookups, delta.removed.get(entity, []))
+        save_sheet_state(delta)
+    return ModuleSyncResult(delta, diff, deactivated)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from django.db.models import Prefetch
+
+from apps.catalog.models.permissions.scoped import Branch
+from apps.catalog.models.requests import AccessRequest, AccessRequestItem
+
+
+# Atributo con las sucursales activas (orden por nombre) de la empresa de cada item
+ACTIVE_BRANCHES_ATTR = "active_branches"
+
+
+@dataclass(frozen=True)
+class RequestLoadProfile:
+    """
+    Qué lee un paso del wizard de un AccessRequest. Cada prefetch es una query
+    para todos los items: el total no crece con la cantidad de items.
+
+    Los items quedan en `req.items.all()` ya ordenados (Meta.ordering de
+    AccessRequestItem). No encadenar filter()/order_by() sobre el manager:
+    descarta lo prefetcheado y vuelve a consultar por item.
+    """
+    person_data: bool = True
+    # None = no cargar items
+    item_related: tuple[str, ...] | None = None
+    item_prefetch: tuple = ()
+
+
+REQUEST_PROFILES: dict[str, RequestLoadProfile] = {
+    # Step 1/2: solo la solicitud y sus datos personales
+    "person": RequestLoadProfile(),
+    # Step 3: módulos marcados por selection_set (los subniveles salen de
+    # selected_sublevel_ids_by_set, en queries fijas)
+    "modules": RequestLoadProfile(
+        item_related=("selection_set__company", "selection_set__branch"),
+        item_prefetch=("selection_set__modules",),
+    ),
+    # Step 4: el scope y las filas de cada sección se resuelven por lote en la vista
+    "globals": RequestLoadProfile(
+        item_related=("selection_set__company", "selection_set__branch"),
+    ),
+    # Parcial del Step 4: no muestra empresa/sucursal
+    "section": RequestLoadProfile(
+        person_data=False,
+        item_related=("selection_set",),
+    ),
+    # Step 5: paneles/vendedores del selection_set y sucursales activas de cada empresa
+    "scoped": RequestLoadProfile(
+        item_related=("selection_set__company", "selection_set__branch"),
+        item_prefetch=(
+            "selection_set__control_panels",
+            "selection_set__sellers",
+            Prefetch(
+                "selection_set__company__branches",
+                queryset=Branch.objects.filter(is_active=True).order_by("name"),
+                to_attr=ACTIVE_BRANCHES_ATTR,
+            ),
+        ),
+    ),
+    # Step 6: el documento sale de load_selection_bundles (por lote, por ids)
+    "review": RequestLoadProfile(item_related=()),
+}
+
+
+def load_request(req_id: int, profile: str) -> AccessRequest:
+    """
+    AccessRequest con lo que lee el perfil (ver REQUEST_PROFILES).
+    Lanza AccessRequest.DoesNotExist si no existe.
+    """
+    spec = REQUEST_PROFILES[profile]
+    qs = AccessRequest.objects.all()
+    if spec.person_data:
+        qs = qs.select_related("person_data")
+    if spec.item_related is not None:
+        items_qs = AccessRequestItem.objects.all()
+        if spec.item_related:
+            items_qs = items_qs.select_related(*spec.item_related)
+        if spec.item_prefetch:
+            items_qs = items_qs.prefetch_related(*spec.item_prefetch)
+        qs = qs.prefetch_related(Prefetch("items", queryset=items_qs))
+    return qs.get(pk=req_id)
+
+
+def prefetched_ids(manager, field: str = "pk") -> list[int]:
+    """Ids de una relación prefetcheada (sin query), en el orden del prefetch."""
+    return [getattr(obj, field) for obj in manager.all()]
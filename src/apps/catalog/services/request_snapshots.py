@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+
+from django.utils import timezone
+
+from apps.catalog.models.requests import AccessRequest, RequestStatus
+from apps.catalog.services.selection_bundles import build_company_payload, load_selection_bundles
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Subir si cambia la forma del documento: los snapshots viejos se reconstruyen en vivo
+# hasta correr `backfill_request_snapshots --force`.
+SNAPSHOT_VERSION = 1
+
+# Estados en los que el contenido de la solicitud ya no cambia.
+FROZEN_STATUSES = (RequestStatus.SUBMITTED, RequestStatus.APPROVED, RequestStatus.REJECTED)
+
+MODEL_USER_NOTE_PREFIX = "Usuario modelo ERP (texto libre):"
+
+
+def extract_model_user_reference(raw_note: str) -> str:
+    note = (raw_note or "").strip()
+    if not note:
+        return ""
+    if note.startswith(MODEL_USER_NOTE_PREFIX):
+        return note[len(MODEL_USER_NOTE_PREFIX):].strip()
+    return note
+
+
+def _to_json(value):
+    if is_dataclass(value):
+        return asdict(value)
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def build_request_document(req: AccessRequest) -> dict:
+    """
+    Documento resuelto de la solicitud (empresas, sucursales, árbol de niveles,
+    globales y scoped), serializable a JSON. Es lo que renderiza el detalle.
+    Formato:
+      {"version", "companies": [{"company": {id, name}, "payload": {...},
+                                 "model_user_reference": str}]}
+    """
+    items = sorted(req.items.all(), key=lambda it: (it.order, it.id))
+    bundles = load_selection_bundles(it.selection_set_id for it in items)
+
+    # Agrupar por empresa, respetando el orden de aparición en items
+    companies_map: "OrderedDict[int, list]" = OrderedDict()
+    for it in items:
+        bundle = bundles[it.selection_set_id]
+        companies_map.setdefault(bundle.company.id, []).append(bundle)
+
+    companies = []
+    for company_bundles in companies_map.values():
+        base = company_bundles[0]
+        companies.append({
+            "company": _to_json(base.company),
+            "payload": _to_json(build_company_payload(base, company_bundles)),
+            "model_user_reference": extract_model_user_reference(base.notes),
+        })
+
+    return {"version": SNAPSHOT_VERSION, "companies": companies}
+
+
+def snapshot_request(req: AccessRequest) -> dict:
+    """
+    Congela el documento de la solicitud en `AccessRequest.snapshot`.
+    Se llama al enviar (Step 6) y desde el comando de backfill.
+    """
+    document = build_request_document(req)
+    req.snapshot = document
+    req.snapshot_at = timezone.now()
+    AccessRequest.objects.filter(pk=req.pk).update(
+        snapshot=req.snapshot, snapshot_at=req.snapshot_at
+    )
+    logger.debug("Request snapshot saved request_id=%s companies=%s", req.pk, len(document["companies"]))
+    return document
+
+
+def get_request_document(req: AccessRequest) -> dict:
+    """
+    Documento para renderizar: el snapshot si la solicitud ya fue enviada y el
+    snapshot es de la versión actual; si no (borrador o datos previos), en vivo.
+    """
+    snapshot = req.snapshot
+    if (
+        req.status in FROZEN_STATUSES
+        and snapshot
+        and snapshot.get("version") == SNAPSHOT_VERSION
+    ):
+        return snapshot
+    return build_request_document(req)
+
+
+def copy_rows_for_document(document: dict) -> list[dict]:
+    """Filas de "copiar usuario modelo" (empresas con referencia a un usuario existente)."""
+    return [
+        {"company": c["company"], "model_user_reference": c["model_user_reference"]}
+        for c in document["companies"]
+        if c["model_user_reference"]
+    ]
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.catalog.models.requests import AccessRequest, AccessRequestItem, RequestStatus
+from apps.catalog.models.stats import AccessRequestDailyStat
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Clave de una fila de AccessRequestDailyStat: (day, status, company_id | None, owner_id)
+StatKey = tuple[date, str, Optional[int], int]
+
+
+# =========================
+# Tracker (signals de AccessRequest)
+# =========================
+
+def request_company_ids(req: AccessRequest) -> list[int]:
+    return list(
+        AccessRequestItem.objects.filter(request_id=req.pk)
+        .order_by()  # sin Meta.ordering: el DISTINCT sería por (company, order, id)
+        .values_list("selection_set__company_id", flat=True)
+        .distinct()
+    )
+
+
+def _keys(req: AccessRequest, status: str, company_ids: Iterable[int]) -> list[StatKey]:
+    day = timezone.localdate(req.created_at)
+    keys: list[StatKey] = [(day, status, None, req.owner_id)]
+    if status != RequestStatus.DRAFT:
+        keys.extend((day, status, cid, req.owner_id) for cid in company_ids)
+    return keys
+
+
+def _bump(key: StatKey, delta: int) -> None:
+    day, status, company_id, owner_id = key
+    rows = AccessRequestDailyStat.objects.filter(
+        day=day, status=status, company_id=company_id, owner_id=owner_id
+    )
+    if rows.update(count=F("count") + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            AccessRequestDailyStat.objects.create(
+                day=day, status=status, company_id=company_id, owner_id=owner_id, count=delta
+            )
+    except IntegrityError:
+        # Otra transacción creó la fila entre el update y el insert
+        rows.update(count=F("count") + delta)
+
+
+def _apply(removed: list[StatKey], added: list[StatKey]) -> None:
+    with transaction.atomic():
+        for key in removed:
+            _bump(key, -1)
+        for key in added:
+            _bump(key, 1)
+
+
+def track_request_saved(req: AccessRequest, *, created: bool, update_fields=None) -> None:
+    """
+    Alta o cambio de estado de una solicitud (post_save). Las empresas se leen
+    solo si el estado anterior o el nuevo no es DRAFT.
+    Los .update() por queryset no pasan por acá: corregir con `rebuild_request_stats`.
+    """
+    new = req.status
+    if created:
+        _apply([], _keys(req, new, request_company_ids(req) if new != RequestStatus.DRAFT else ()))
+        req._loaded_status = new
+        return
+
+    if update_fields is not None and "status" not in update_fields:
+        return
+    old = getattr(req, "_loaded_status", None)
+    if old == new:
+        return
+    if old is None:
+        logger.warning("request_stats: estado anterior desconocido para request_id=%s", req.pk)
+        return
+
+    company_ids = request_company_ids(req)
+    _apply(_keys(req, old, company_ids), _keys(req, new, company_ids))
+    req._loaded_status = new
+
+
+def track_request_companies_changed(req: AccessRequest, old_company_ids: Iterable[int]) -> None:
+    """
+    Cambiaron los items de una solicitud no DRAFT (inlines del admin): mueve
+    las filas por empresa de las empresas que salieron a las que entraron.
+    `old_company_ids`: request_company_ids(req) antes de tocar los items.
+    """
+    if req.status == RequestStatus.DRAFT:
+        return
+    old = set(old_company_ids)
+    new = set(request_company_ids(req))
+    if old == new:
+        return
+    day = timezone.localdate(req.created_at)
+    _apply(
+        [(day, req.status, cid, req.owner_id) for cid in old - new],
+        [(day, req.status, cid, req.owner_id) for cid in new - old],
+    )
+
+
+def track_request_deleted(req: AccessRequest) -> None:
+    """Baja de una solicitud (pre_delete: los items todavía existen)."""
+    status = getattr(req, "_loaded_status", None) or req.status
+    company_ids = request_company_ids(req) if status != RequestStatus.DRAFT else ()
+    _apply(_keys(req, status, company_ids), [])
+
+
+# =========================
+# Rebuild
+# =========================
+
+@transaction.atomic
+def rebuild_request_stats() -> int:
+    """Regenera la tabla desde AccessRequest/AccessRequestItem. Devuelve las filas creadas."""
+    totals = (
+        AccessRequest.objects
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "status", "owner_id")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    by_company = (
+        AccessRequestItem.objects
+        .exclude(request__status=RequestStatus.DRAFT)
+        .annotate(day=TruncDate("request__created_at"))
+        .values("day", "request__status", "selection_set__company_id", "request__owner_id")
+        .annotate(n=Count("request_id", distinct=True))
+        .order_by()
+    )
+
+    rows = [
+        AccessRequestDailyStat(day=r["day"], status=r["status"], owner_id=r["owner_id"], count=r["n"])
+        for r in totals
+    ]
+    rows.extend(
+        AccessRequestDailyStat(
+            day=r["day"],
+            status=r["request__status"],
+            company_id=r["selection_set__company_id"],
+            owner_id=r["request__owner_id"],
+            count=r["n"],
+        )
+        for r in by_company
+    )
+
+    AccessRequestDailyStat.objects.all().delete()
+    AccessRequestDailyStat.objects.bulk_create(rows, batch_size=500)
+    logger.info("request_stats: tabla regenerada (%s filas)", len(rows))
+    return len(rows)
+
+
+# =========================
+# Lectura (dashboard)
+# =========================
+
+@dataclass(frozen=True)
+class RequestStatsSummary:
+    # {status: cantidad}, sin DRAFT
+    by_status: dict[str, int]
+    # [(nombre empresa, cantidad)] de mayor a menor
+    top_companies: list[tuple[str, int]]
+
+    @property
+    def total(self) -> int:
+        return sum(self.by_status.values())
+
+    def count(self, status: str) -> int:
+        return self.by_status.get(status, 0)
+
+
+def request_stats_summary(*, owner=None, top: int = 10) -> RequestStatsSummary:
+    """
+    Totales por estado (y top empresas) de las solicitudes no DRAFT, en una
+    sola query agrupada. Con owner: solo las del usuario, sin empresas.
+    """
+    qs = AccessRequestDailyStat.objects.exclude(status=RequestStatus.DRAFT)
+    if owner is not None:
+        rows = (
+            qs.filter(owner=owner, company__isnull=True)
+            .values("status")
+            .annotate(n=Sum("count"))
+            .order_by("status")
+        )
+        return RequestStatsSummary(
+            by_status={r["status"]: r["n"] for r in rows if r["n"]},
+            top_companies=[],
+        )
+
+    rows = (
+        qs.values("status", "company_id", "company__name")
+        .annotate(n=Sum("count"))
+        .order_by("status")
+    )
+    by_status: dict[str, int] = {}
+    by_company: dict[int, list] = {}
+    for r in rows:
+        if not r["n"]:
+            continue
+        if r["company_id"] is None:
+            by_status[r["status"]] = r["n"]
+            continue
+        bucket = by_company.setdefault(r["company_id"], [r["company__name"], 0])
+        bucket[1] += r["n"]
+
+    top_companies = sorted(
+        ((name, n) for name, n in by_company.values()),
+        key=lambda x: (-x[1], x[0]),
+    )[:top]
+    return RequestStatsSummary(by_status=by_status, top_companies=top_companies)
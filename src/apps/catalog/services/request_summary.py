@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import logging
+from typing import Iterable
+
+from apps.catalog.models.requests import AccessRequest, AccessRequestItem
+from apps.catalog.models.selections import PermissionSelectionSet
+from apps.catalog.services.request_snapshots import MODEL_USER_NOTE_PREFIX
+
+logger = logging.getLogger("apps.catalog")
+
+
+TEMPLATE_NOTE_PREFIX = "Templates usados:"
+
+# Columnas de AccessRequest que mantiene este módulo
+SUMMARY_FIELDS = (
+    "summary_companies",
+    "summary_branch_count",
+    "summary_item_count",
+    "summary_template_source",
+    "summary_copy",
+)
+
+_SELECTION_VALUES = ("company__name", "branch_id", "notes")
+
+
+def extract_model_user_reference(raw_note: str) -> str:
+    """Referencia de usuario modelo de un selection_set ("" si la nota es otra cosa)."""
+    note = (raw_note or "").strip()
+    if note.startswith(MODEL_USER_NOTE_PREFIX):
+        return note[len(MODEL_USER_NOTE_PREFIX):].strip()
+    return ""
+
+
+def extract_template_source(raw_notes: str) -> str:
+    for line in (raw_notes or "").splitlines():
+        note = line.strip()
+        if note.startswith(TEMPLATE_NOTE_PREFIX):
+            return note[len(TEMPLATE_NOTE_PREFIX):].strip()
+    return ""
+
+
+def build_request_summary(req: AccessRequest, selections: list[dict]) -> dict:
+    """
+    Valores de SUMMARY_FIELDS para `req`. `selections`: dicts con
+    company__name / branch_id / notes de sus selection_sets, en orden de items.
+    """
+    companies: list[str] = []
+    copy_summary: list[str] = []
+    branch_ids: set[int] = set()
+    for s in selections:
+        name = s["selection_set__company__name"]
+        if name not in companies:
+            companies.append(name)
+        if s["selection_set__branch_id"]:
+            branch_ids.add(s["selection_set__branch_id"])
+        model_ref = extract_model_user_reference(s["selection_set__notes"])
+        label = f"{name}: {model_ref}"
+        if model_ref and label not in copy_summary:
+            copy_summary.append(label)
+
+    return {
+        "summary_companies": companies,
+        "summary_branch_count": len(branch_ids),
+        "summary_item_count": len(selections),
+        "summary_template_source": extract_template_source(req.notes),
+        "summary_copy": copy_summary,
+    }
+
+
+def refresh_request_summaries(requests: Iterable[AccessRequest]) -> int:
+    """
+    Recalcula las columnas de resumen de los listados (empresas, sucursales,
+    template de origen, copias de usuario modelo) con una lectura de items para
+    todas las solicitudes y un bulk_update. No dispara signals.
+
+    Llamarla después de escribir items, notas de la solicitud o notas de sus
+    selection_sets (wizard Step 2/5/6, admin, `refresh_request_summaries`).
+    """
+    reqs = [r for r in requests if r.pk]
+    if not reqs:
+        return 0
+
+    values = tuple(f"selection_set__{v}" for v in _SELECTION_VALUES)
+    by_request: dict[int, list[dict]] = {r.pk: [] for r in reqs}
+    rows = (
+        AccessRequestItem.objects
+        .filter(request_id__in=by_request)
+        .order_by("request_id", "order", "id")
+        .values("request_id", *values)
+    )
+    for row in rows:
+        by_request[row["request_id"]].append(row)
+
+    # Legado: solicitud con selection_set directo y sin items
+    legacy_ids = {r.selection_set_id for r in reqs if r.selection_set_id and not by_request[r.pk]}
+    legacy = {
+        s["id"]: {f"selection_set__{k}": s[k] for k in _SELECTION_VALUES}
+        for s in PermissionSelectionSet.objects.filter(pk__in=legacy_ids).values("id", *_SELECTION_VALUES)
+    } if legacy_ids else {}
+
+    for req in reqs:
+        selections = by_request[req.pk]
+        if not selections and req.selection_set_id in legacy:
+            selections = [legacy[req.selection_set_id]]
+        for field, value in build_request_summary(req, selections).items():
+            setattr(req, field, value)
+
+    AccessRequest.objects.bulk_update(reqs, SUMMARY_FIELDS, batch_size=500)
+    logger.debug("request_summary: %s solicitud(es) actualizadas", len(reqs))
+    return len(reqs)
+
+
+def refresh_request_summary(req: AccessRequest) -> None:
+    refresh_request_summaries([req])
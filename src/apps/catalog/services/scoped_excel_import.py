@@ -0,0 +1,312 @@
+"""
+Importación de Configuraciones.xlsx (Empresa, Sucursales, Depósitos, Cajas,
+Paneles y Vendedores).
+
+    parsed = parse_scoped_workbook(path)
+    diff = diff_scoped_catalog(parsed, reactivate=False)
+    apply_scoped_diff(diff)   # no llamar en dry-run: el reporte sale del diff
+
+    sync_scoped_workbook(parsed)  # --sync: solo hojas/filas cambiadas (services/catalog_sync.py)
+
+Se leen todas las hojas primero (read_only) y cada fila se reduce a su clave
+por nombres: (empresa,), (empresa, sucursal), (empresa, sucursal, depósito)…
+Los padres se resuelven en memoria y cada entidad se escribe con un
+bulk_create: la cantidad de queries es fija, no depende de las filas.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from django.db import transaction
+from openpyxl import load_workbook
+
+from apps.catalog.models.permissions.scoped import (
+    Branch,
+    CashRegister,
+    Company,
+    ControlPanel,
+    Seller,
+    Warehouse,
+)
+from apps.catalog.services.catalog_sync import (
+    SheetDelta,
+    deactivate_keys,
+    resolve_key_ids,
+    save_sheet_state,
+    sheet_delta,
+)
+
+logger = logging.getLogger("apps.catalog")
+
+
+BULK_BATCH_SIZE = 1000
+# CatalogImportState.importer
+SYNC_IMPORTER = "scoped"
+
+# Clave por nombres, de la empresa hacia abajo
+ScopedKey = tuple[str, ...]
+
+
+class ScopedExcelImportError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ScopedEntity:
+    name: str
+    model: type
+    # Lookups (desde el modelo) que arman la ScopedKey
+    key_lookups: tuple[str, ...]
+    # FK al padre: "company", "branch" o None
+    parent: str | None = None
+
+
+# En orden de escritura: padres primero
+ENTITIES: tuple[ScopedEntity, ...] = (
+    ScopedEntity("companies", Company, ("name",)),
+    ScopedEntity("branches", Branch, ("company__name", "name"), parent="company"),
+    ScopedEntity("warehouses", Warehouse, ("branch__company__name", "branch__name", "name"), parent="branch"),
+    ScopedEntity("cash_registers", CashRegister, ("branch__company__name", "branch__name", "name"), parent="branch"),
+    ScopedEntity("control_panels", ControlPanel, ("company__name", "name"), parent="company"),
+    ScopedEntity("sellers", Seller, ("company__name", "name"), parent="company"),
+)
+ENTITIES_BY_NAME = {e.name: e for e in ENTITIES}
+PARENT_ENTITY = {"company": "companies", "branch": "branches"}
+
+
+@dataclass(frozen=True)
+class ScopedSheet:
+    title: str
+    # Columnas (como en el Excel) en el orden de la clave
+    columns: tuple[str, ...]
+    entity: str
+
+
+SHEETS: tuple[ScopedSheet, ...] = (
+    ScopedSheet("Empresa", ("Empresa",), "companies"),
+    ScopedSheet("Sucursales", ("Empresa", "Sucursal"), "branches"),
+    ScopedSheet("Depositos Habilitados", ("Empresa", "Sucursal", "Nombre"), "warehouses"),
+    ScopedSheet("Cajas", ("Empresa", "Sucursal", "Nombre"), "cash_registers"),
+    ScopedSheet("Paneles Control", ("Empresa", "Paneles"), "control_panels"),
+    ScopedSheet("Vendedores", ("Empresa", "Vendedor"), "sellers"),
+)
+
+
+@dataclass(frozen=True)
+class ParsedScopedWorkbook:
+    # {entidad: [claves]} sin repetidos, en orden de aparición (incluye los
+    # padres implícitos: una caja agrega su sucursal y su empresa)
+    keys: dict[str, list[ScopedKey]]
+    # {hoja: [claves]} tal como vienen en cada hoja (para --sync)
+    sheets: dict[str, list[ScopedKey]] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class ScopedImportDiff:
+    # {entidad: [claves a crear]}
+    new: dict[str, list[ScopedKey]] = field(default_factory=dict)
+    # {entidad: [ids inactivos presentes en el Excel]} (solo con reactivate=True)
+    reactivate: dict[str, list[int]] = field(default_factory=dict)
+
+    def created(self, entity: str) -> int:
+        return len(self.new.get(entity, ()))
+
+    @property
+    def reactivated(self) -> int:
+        return sum(len(ids) for ids in self.reactivate.values())
+
+    @property
+    def has_changes(self) -> bool:
+        return any(self.new.values()) or bool(self.reactivated)
+
+
+def _norm(s: object) -> str:
+    return " ".join(str(s or "").strip().split())
+
+
+def _h(s: object) -> str:
+    return _norm(s).lower().replace(" ", "")
+
+
+def _parent_key(entity: ScopedEntity, key: ScopedKey) -> ScopedKey | None:
+    if entity.parent == "company":
+        return key[:1]
+    if entity.parent == "branch":
+        return key[:2]
+    return None
+
+
+def _read_sheet(wb, sheet: ScopedSheet) -> list[ScopedKey]:
+    if sheet.title not in wb.sheetnames:
+        raise ScopedExcelImportError(f"No existe la hoja '{sheet.title}'.")
+
+    rows = wb[sheet.title].iter_rows(values_only=True)
+    header = next(rows, None)
+    if not header:
+        raise ScopedExcelImportError(f"La hoja '{sheet.title}' está vacía.")
+
+    hm = {_h(h): i for i, h in enumerate(header)}
+    if any(_h(col) not in hm for col in sheet.columns):
+        raise ScopedExcelImportError(
+            f"La hoja '{sheet.title}' debe tener columnas: {', '.join(sheet.columns)}."
+        )
+    idx = [hm[_h(col)] for col in sheet.columns]
+
+    keys: list[ScopedKey] = []
+    for row in rows:
+        key = tuple(_norm(row[i] if i < len(row) else "") for i in idx)
+        if all(key):
+            keys.append(key)
+    return keys
+
+
+def parse_scoped_workbook(path: Path) -> ParsedScopedWorkbook:
+    """Lee las seis hojas en modo read_only; no toca la DB."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        by_sheet = [(sheet, _read_sheet(wb, sheet)) for sheet in SHEETS]
+    finally:
+        wb.close()
+    return _merge_sheets(by_sheet)
+
+
+def _merge_sheets(by_sheet: list[tuple[ScopedSheet, list[ScopedKey]]]) -> ParsedScopedWorkbook:
+    keys: dict[str, dict[ScopedKey, None]] = {e.name: {} for e in ENTITIES}
+    for sheet, sheet_keys in by_sheet:
+        entity = ENTITIES_BY_NAME[sheet.entity]
+        for key in sheet_keys:
+            # Padres implícitos (empresa de una sucursal, sucursal de una caja…)
+            if entity.parent:
+                keys["companies"].setdefault(key[:1])
+            if entity.parent == "branch":
+                keys["branches"].setdefault(key[:2])
+            keys[entity.name].setdefault(key)
+
+    return ParsedScopedWorkbook(
+        keys={name: list(k) for name, k in keys.items()},
+        sheets={sheet.title: sheet_keys for sheet, sheet_keys in by_sheet},
+    )
+
+
+def _existing(entity: ScopedEntity) -> dict[ScopedKey, tuple[int, bool]]:
+    """{clave: (id, is_active)} de toda la tabla, en una query."""
+    rows = entity.model.objects.order_by().values_list("id", "is_active", *entity.key_lookups)
+    return {tuple(row[2:]): (row[0], row[1]) for row in rows}
+
+
+def diff_scoped_catalog(parsed: ParsedScopedWorkbook, *, reactivate: bool = False) -> ScopedImportDiff:
+    """
+    Compara las claves del Excel con la DB (una query por tabla). Solo
+    agrega: lo que existe en la DB y no en el Excel no se toca.
+    """
+    diff = ScopedImportDiff()
+    for entity in ENTITIES:
+        wanted = parsed.keys.get(entity.name, [])
+        if not wanted:
+            continue
+        existing = _existing(entity)
+        new = diff.new.setdefault(entity.name, [])
+        inactive = diff.reactivate.setdefault(entity.name, [])
+        for key in wanted:
+            found = existing.get(key)
+            if found is None:
+                new.append(key)
+            elif reactivate and not found[1]:
+                inactive.append(found[0])
+    return diff
+
+
+def _parent_ids(diff: ScopedImportDiff, parent: str) -> dict[ScopedKey, int]:
+    """ids de los padres (`parent`) de todas las filas nuevas que cuelgan de ese tipo."""
+    keys = {
+        _parent_key(entity, key)
+        for entity in ENTITIES if entity.parent == parent
+        for key in diff.new.get(entity.name, ())
+    }
+    parent_entity = ENTITIES_BY_NAME[PARENT_ENTITY[parent]]
+    return resolve_key_ids(parent_entity.model, parent_entity.key_lookups, keys)
+
+
+@transaction.atomic
+def apply_scoped_diff(diff: ScopedImportDiff) -> None:
+    """
+    Escribe el diff: un bulk_create(ignore_conflicts) por entidad (otro import
+    concurrente no lo rompe) y un update de is_active por entidad reactivada.
+    Los ids de los padres se releen por nombre una vez creados, una query por
+    tabla padre.
+    """
+    parent_ids: dict[str, dict[ScopedKey, int]] = {}
+    for entity in ENTITIES:
+        new = diff.new.get(entity.name) or []
+        if new and entity.parent is None:
+            objs = [entity.model(name=key[-1]) for key in new]
+        elif new:
+            if entity.parent not in parent_ids:
+                parent_ids[entity.parent] = _parent_ids(diff, entity.parent)
+            ids = parent_ids[entity.parent]
+            fk = f"{entity.parent}_id"
+            objs = [entity.model(name=key[-1], **{fk: ids[_parent_key(entity, key)]}) for key in new]
+        if new:
+            entity.model.objects.bulk_create(objs, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+
+        reactivate_ids = diff.reactivate.get(entity.name) or []
+        if reactivate_ids:
+            entity.model.objects.filter(pk__in=reactivate_ids).update(is_active=True)
+
+    logger.info(
+        "scoped_import: %s reactivados=%s",
+        " ".join(f"{e.name}={diff.created(e.name)}" for e in ENTITIES),
+        diff.reactivated,
+    )
+
+
+# =========================
+# Sync incremental (--sync)
+# =========================
+
+@dataclass(frozen=True)
+class ScopedSyncResult:
+    deltas: list[SheetDelta]
+    diff: ScopedImportDiff
+    # Filas pasadas a is_active=False (en dry-run: las que se desactivarían)
+    deactivated: int
+
+    @property
+    def changed_sheets(self) -> list[SheetDelta]:
+        return [d for d in self.deltas if not d.unchanged]
+
+
+def sync_scoped_workbook(parsed: ParsedScopedWorkbook, *, dry_run: bool = False) -> ScopedSyncResult:
+    """
+    Aplica solo lo que cambió desde el último --sync: las hojas con el mismo
+    hash se saltean; de las demás se crean/reactivan las filas nuevas (con sus
+    padres) y las que desaparecieron de la hoja pasan a is_active=False.
+    """
+    deltas = [
+        sheet_delta(SYNC_IMPORTER, sheet.title, {sheet.entity: dict.fromkeys(parsed.sheets.get(sheet.title, []), {})})
+        for sheet in SHEETS
+    ]
+    changed = [(sheet, d) for sheet, d in zip(SHEETS, deltas) if not d.unchanged]
+
+    added = _merge_sheets([(sheet, d.upserts(sheet.entity)) for sheet, d in changed])
+    diff = diff_scoped_catalog(added, reactivate=True)
+    removed = {
+        entity.name: [key for _, d in changed for key in d.removed.get(entity.name, [])]
+        for entity in ENTITIES
+    }
+
+    if dry_run:
+        return ScopedSyncResult(deltas, diff, sum(len(keys) for keys in removed.values()))
+
+    deactivated = 0
+    with transaction.atomic():
+        if diff.has_changes:
+            apply_scoped_diff(diff)
+        for entity in ENTITIES:
+            deactivated += deactivate_keys(entity.model, entity.key_lookups, removed[entity.name])
+        for _, d in changed:
+            save_sheet_state(d)
+    return ScopedSyncResult(deltas, diff, deactivated)
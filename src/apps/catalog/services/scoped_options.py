@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from dataclasses import dataclass
+
+from django.db.models import Q
+
+from apps.catalog.models.permissions.scoped import (
+    Branch,
+    CashRegister,
+    Company,
+    ControlPanel,
+    Seller,
+    Warehouse,
+)
+from apps.catalog.services.catalog_cache import get_catalog_version
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Scope de versión de los catálogos por empresa/sucursal (ver signals.py).
+SCOPED_SCOPE = "scoped"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_QUERY_LENGTH = 80
+
+
+@dataclass(frozen=True)
+class ScopedSource:
+    model: type
+    # Atributo FK del dueño en el modelo ("company_id" / "branch_id")
+    owner_attr: str
+    owner_model: type
+
+
+# campo del Step 5 -> catálogo del que salen sus opciones
+SCOPED_SOURCES: dict[str, ScopedSource] = {
+    "control_panels": ScopedSource(ControlPanel, "company_id", Company),
+    "sellers": ScopedSource(Seller, "company_id", Company),
+    "warehouses": ScopedSource(Warehouse, "branch_id", Branch),
+    "cash_registers": ScopedSource(CashRegister, "branch_id", Branch),
+}
+
+
+@dataclass(frozen=True)
+class OptionsPage:
+    # [{"id", "name"}] en orden de nombre
+    results: tuple[dict, ...]
+    page: int
+    has_more: bool
+
+    def as_json(self) -> dict:
+        return {"results": list(self.results), "page": self.page, "has_more": self.has_more}
+
+
+def scoped_options_version() -> int:
+    return get_catalog_version(SCOPED_SCOPE)
+
+
+def options_etag(kind: str, owner_id: int, *, q: str, page: int, page_size: int) -> str:
+    """
+    ETag de una página de opciones: versión del catálogo scoped + parámetros.
+    No lee las opciones: la versión es la fila CatalogVersion del scope, que
+    cada worker relee de la DB recién cuando vence CATALOG_VERSION_TTL.
+    """
+    raw = f"{kind}|{owner_id}|{q.lower()}|{page}|{page_size}"
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    return f'"{scoped_options_version()}-{digest}"'
+
+
+def owner_is_active(kind: str, owner_id: int) -> bool:
+    source = SCOPED_SOURCES[kind]
+    qs = source.owner_model.objects.filter(pk=owner_id, is_active=True)
+    if source.owner_model is Branch:
+        qs = qs.filter(company__is_active=True)
+    return qs.exists()
+
+
+def list_scoped_options(
+    kind: str,
+    owner_id: int,
+    *,
+    q: str = "",
+    page: int = 1,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> OptionsPage:
+    """
+    Opciones activas de la empresa/sucursal para el campo `kind`, paginadas.
+    `q` busca por prefijo del nombre o de cualquiera de sus palabras
+    (sin distinguir mayúsculas). Una sola query: se pide una fila de más
+    para saber si hay otra página.
+    """
+    source = SCOPED_SOURCES[kind]
+    page = max(int(page), 1)
+    page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+
+    qs = source.model.objects.filter(**{source.owner_attr: owner_id}, is_active=True)
+    q = " ".join(q.split())[:MAX_QUERY_LENGTH]
+    if q:
+        qs = qs.filter(Q(name__istartswith=q) | Q(name__icontains=f" {q}"))
+
+    offset = (page - 1) * page_size
+    rows = list(qs.order_by("name", "id").values("id", "name")[offset:offset + page_size + 1])
+    return OptionsPage(
+        results=tuple(rows[:page_size]),
+        page=page,
+        has_more=len(rows) > page_size,
+    )
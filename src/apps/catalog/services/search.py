@@ -0,0 +1,175 @@
+"""
+Búsqueda indexada de los listados (solicitudes y templates).
+
+    qs = apply_search(qs, REQUEST_PERSON_INDEX, q, path="person_data", match_pk=True)
+
+- PostgreSQL: icontains sobre índices GIN pg_trgm (UPPER(col) gin_trgm_ops,
+  los arma la migración 0006) y orden por similitud trigram.
+- SQLite: tabla FTS5 (external content + triggers) con prefijos por palabra;
+  orden por bm25. Busca palabras que empiezan con lo escrito, no substrings
+  en el medio ("rez" no encuentra "Pérez"). El filtro es un subquery sin
+  tope; bm25 se calcula solo sobre las filas que pasan los filtros de `qs`.
+  Búsquedas solo numéricas (fragmentos de DNI) o con palabras de menos de
+  FTS_MIN_TOKEN caracteres van por icontains.
+- Otros motores, o SQLite sin FTS5: icontains sin índice.
+- match_pk: una búsqueda numérica también trae el id exacto, primero.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections, router
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from apps.catalog.models.person import RequestPersonData
+from apps.catalog.models.templates import AccessTemplate
+
+logger = logging.getLogger("apps.catalog")
+
+
+BACKEND_FTS5 = "fts5"
+BACKEND_TRIGRAM = "trigram"
+BACKEND_LIKE = "like"
+
+# Tope de filas FTS5 que se rankean (el orden va como CASE en la query); el
+# resto de los matches se lista igual, después, con el orden previo
+MAX_FTS_RANKED = 500
+# Prefijo mínimo del índice FTS5 (prefix='2 3' en la migración 0006)
+FTS_MIN_TOKEN = 2
+MAX_QUERY_LENGTH = 80
+
+_FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+# Encima de cualquier similitud/bm25: el id exacto va primero
+_PK_RANK = 1000.0
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    model: type
+    fields: tuple[str, ...]
+    # Tabla FTS5 (SQLite) creada por la migración 0006
+    fts_table: str
+
+
+REQUEST_PERSON_INDEX = SearchIndex(
+    RequestPersonData, ("first_name", "last_name", "dni", "email"), "catalog_requestpersondata_fts"
+)
+TEMPLATE_INDEX = SearchIndex(
+    AccessTemplate, ("name", "role_name", "department"), "catalog_accesstemplate_fts"
+)
+
+
+# Disponibilidad de la tabla FTS5 por (alias, tabla); se resuelve una vez por proceso
+_fts_ready: dict[tuple[str, str], bool] = {}
+
+
+def _has_fts_table(alias: str, table: str) -> bool:
+    key = (alias, table)
+    if key not in _fts_ready:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+            _fts_ready[key] = cursor.fetchone() is not None
+        if not _fts_ready[key]:
+            logger.warning("search: falta la tabla FTS5 %s, se busca sin índice", table)
+    return _fts_ready[key]
+
+
+def search_backend(index: SearchIndex) -> str:
+    alias = router.db_for_read(index.model)
+    vendor = connections[alias].vendor
+    if vendor == "postgresql":
+        return BACKEND_TRIGRAM
+    if vendor == "sqlite" and _has_fts_table(alias, index.fts_table):
+        return BACKEND_FTS5
+    return BACKEND_LIKE
+
+
+def _fts_expression(q: str) -> str:
+    """'juan per' -> '"juan"* "per"*' (todas las palabras, por prefijo)."""
+    return " ".join(f'"{token}"*' for token in _FTS_TOKEN.findall(q))
+
+
+def _fts_usable(q: str) -> bool:
+    """FTS5 cubre la búsqueda: hay palabras, no es solo numérica y ninguna es más corta que el prefijo."""
+    tokens = _FTS_TOKEN.findall(q)
+    return bool(tokens) and not q.replace(" ", "").isdigit() and all(len(t) >= FTS_MIN_TOKEN for t in tokens)
+
+
+def _fts_match(index: SearchIndex, prefix: str, expression: str) -> Q:
+    """pk en los matches de la tabla FTS5, como subquery (sin tope)."""
+    table = index.fts_table
+    return Q(**{f"{prefix}pk__in": RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [expression])})
+
+
+def _fts_scores(index: SearchIndex, expression: str, candidates) -> dict[float, list[int]]:
+    """
+    {score: [pks]} (score = -bm25: mayor es mejor) de las mejores filas entre
+    `candidates`: queryset de pks del índice que ya pasaron los filtros del listado.
+    """
+    alias = router.db_for_read(index.model)
+    table = index.fts_table
+    candidates_sql, candidates_params = candidates.query.sql_with_params()
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, bm25({table}) AS score FROM {table} WHERE {table} MATCH %s "
+            f"AND rowid IN ({candidates_sql}) ORDER BY score LIMIT %s",
+            [expression, *candidates_params, MAX_FTS_RANKED],
+        )
+        rows = cursor.fetchall()
+    by_score: dict[float, list[int]] = {}
+    for pk, score in rows:
+        by_score.setdefault(round(-score, 6), []).append(pk)
+    return by_score
+
+
+def _like_match(index: SearchIndex, prefix: str, q: str) -> Q:
+    return reduce(or_, (Q(**{f"{prefix}{field}__icontains": q}) for field in index.fields))
+
+
+def apply_search(qs, index: SearchIndex, q: str, *, path: str = "", match_pk: bool = False):
+    """
+    Filtra `qs` por `q` con el índice y lo ordena por relevancia (el orden que
+    traía queda como desempate). `path`: lookup desde el modelo de qs hasta el
+    del índice ("" si es el mismo). Agrega la anotación `search_rank`.
+    """
+    q = (q or "").strip()[:MAX_QUERY_LENGTH]
+    if not q:
+        return qs
+    prefix = f"{path}__" if path else ""
+    backend = search_backend(index)
+
+    if backend == BACKEND_FTS5 and not _fts_usable(q):
+        backend = BACKEND_LIKE
+
+    if backend == BACKEND_FTS5:
+        expression = _fts_expression(q)
+        match = _fts_match(index, prefix, expression)
+        by_score = _fts_scores(index, expression, qs.filter(match).order_by().values(f"{prefix}pk"))
+        # Un WHEN por score (los empates quedan juntos y desempata el orden previo)
+        rank = Case(
+            *(When(**{f"{prefix}pk__in": pks}, then=Value(score)) for score, pks in by_score.items()),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ) if by_score else Value(0.0, output_field=FloatField())
+    elif backend == BACKEND_TRIGRAM:
+        match = _like_match(index, prefix, q)
+        rank = Greatest(*(TrigramSimilarity(f"{prefix}{field}", q) for field in index.fields))
+    else:
+        match = _like_match(index, prefix, q)
+        rank = Value(0.0, output_field=FloatField())
+
+    if match_pk and q.isdigit() and len(q) <= 18:
+        pk_match = Q(pk=int(q))
+        match |= pk_match
+        rank = Case(When(pk_match, then=Value(_PK_RANK)), default=rank, output_field=FloatField())
+
+    ordering = qs.query.order_by
+    return qs.filter(match).annotate(search_rank=rank).order_by("-search_rank", *ordering)
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+
+from apps.catalog.models.permissions.global_ops import ActionValueType
+from apps.catalog.services.catalog_cache import get_module_catalog
+from apps.catalog.models.selections import (
+    PermissionSelectionSet,
+    SelectionSetModule,
+    SelectionSetLevel,
+    SelectionSetSubLevel,
+    SelectionSetWarehouse,
+    SelectionSetCashRegister,
+    SelectionSetControlPanel,
+    SelectionSetSeller,
+    SelectionSetActionValue,
+    SelectionSetMatrixPermission,
+    SelectionSetPaymentMethod,
+)
+
+
+# =========================
+# Read models (solo lectura, para templates)
+# =========================
+
+@dataclass(frozen=True)
+class NamedRef:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class LevelNode:
+    level: NamedRef
+    sublevels: list[NamedRef] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class ModuleNode:
+    module: NamedRef
+    levels: list[LevelNode] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class ActionRow:
+    group: str
+    name: str
+    val: str
+    value_type: str
+
+
+@dataclass(frozen=True)
+class MatrixRow:
+    permission: NamedRef
+    can_create: bool
+    can_update: bool
+    can_authorize: bool
+    can_close: bool
+    can_cancel: bool
+    can_update_validity: bool
+
+
+@dataclass(frozen=True)
+class SelectionSetBundle:
+    id: int
+    company: NamedRef
+    branch: NamedRef | None
+    notes: str
+    globals_fingerprint: str
+    modules: list[NamedRef]
+    levels_tree: list[ModuleNode]
+    control_panels: list[NamedRef]
+    sellers: list[NamedRef]
+    # Solo acciones activas con "valor útil" (BOOL=Sí, números/texto no vacíos)
+    actions: list[ActionRow]
+    # Solo filas de matriz con al menos un check
+    matrix: list[MatrixRow]
+    # Solo medios de pago habilitados
+    payment_methods: list[NamedRef]
+    warehouses: list[NamedRef]
+    cash_registers: list[NamedRef]
+
+
+# =========================
+# Helpers
+# =========================
+
+def _action_display_value(value_type: str, row: dict) -> str:
+    """
+    Valor a mostrar para una acción. "" = la acción no aporta nada y se omite.
+    """
+    if value_type == ActionValueType.BOOL:
+        return "Sí" if bool(row["value_bool"]) else ""
+    if value_type == ActionValueType.INT:
+        return "" if row["value_int"] is None else str(row["value_int"])
+    if value_type in (ActionValueType.DECIMAL, ActionValueType.PERCENT):
+        return "" if row["value_decimal"] is None else str(row["value_decimal"])
+    return (row["value_text"] or "").strip()
+
+
+def _refs_by_selection_set(qs, id_field: str, name_field: str, ids: list[int]) -> dict[int, list[NamedRef]]:
+    out: dict[int, list[NamedRef]] = defaultdict(list)
+    rows = (
+        qs.filter(selection_set_id__in=ids)
+        .order_by(name_field, id_field)
+        .values_list("selection_set_id", id_field, name_field)
+    )
+    for ss_id, ref_id, name in rows:
+        out[ss_id].append(NamedRef(id=ref_id, name=name))
+    return out
+
+
+def _implicit_sublevel_rows(ids: list[int]) -> list[tuple]:
+    """
+    Filas "virtuales" de subnivel para módulos/niveles include_all, con la misma
+    forma que las filas de SelectionSetSubLevel que lee _build_levels_trees.
+    Se expanden contra el snapshot del catálogo (solo subniveles activos).
+    """
+    full_modules = list(
+        SelectionSetModule.objects.filter(selection_set_id__in=ids, include_all=True)
+        .values_list("selection_set_id", "module_id")
+    )
+    full_levels = list(
+        SelectionSetLevel.objects.filter(selection_set_id__in=ids, include_all=True)
+        .values_list("selection_set_id", "level_id")
+    )
+    if not full_modules and not full_levels:
+        return []
+
+    catalog = get_module_catalog()
+    sub_ids_by_ss: dict[int, list[int]] = defaultdict(list)
+    for ss_id, module_id in full_modules:
+        sub_ids_by_ss[ss_id].extend(catalog.sublevel_ids_by_module.get(module_id, ()))
+    for ss_id, level_id in full_levels:
+        sub_ids_by_ss[ss_id].extend(catalog.sublevel_ids_by_level.get(level_id, ()))
+
+    rows: list[tuple] = []
+    for ss_id, sub_ids in sub_ids_by_ss.items():
+        for sub_id in dict.fromkeys(sub_ids):
+            sub = catalog.sublevels[sub_id]
+            level = catalog.levels[sub.parent_id]
+            module = catalog.modules[level.parent_id]
+            rows.append((ss_id, sub.id, sub.name, level.id, level.name, module.id, module.name))
+    return rows
+
+
+def _build_levels_trees(ids: list[int]) -> dict[int, list[ModuleNode]]:
+    """
+    Árbol Módulo -> Nivel -> Subnivel por selection_set, a partir de los niveles
+    y subniveles seleccionados (más los implícitos de include_all).
+    """
+    level_rows = (
+        SelectionSetLevel.objects.filter(selection_set_id__in=ids)
+        .order_by("level__module__name", "level__name")
+        .values_list(
+            "selection_set_id",
+            "level_id",
+            "level__name",
+            "level__module_id",
+            "level__module__name",
+        )
+    )
+    sublevel_rows = list(
+        SelectionSetSubLevel.objects.filter(selection_set_id__in=ids)
+        .order_by("sublevel__level__module__name", "sublevel__level__name", "sublevel__name")
+        .values_list(
+            "selection_set_id",
+            "sublevel_id",
+            "sublevel__name",
+            "sublevel__level_id",
+            "sublevel__level__name",
+            "sublevel__level__module_id",
+            "sublevel__level__module__name",
+        )
+    )
+
+    implicit_rows = _implicit_sublevel_rows(ids)
+    expanded_ids = {row[0] for row in implicit_rows}
+    if implicit_rows:
+        explicit = {(row[0], row[1]) for row in sublevel_rows}
+        sublevel_rows.extend(row for row in implicit_rows if (row[0], row[1]) not in explicit)
+        sublevel_rows.sort(key=lambda row: (row[6], row[4], row[2]))
+
+    # ss_id -> module_id -> {"module": NamedRef, "levels": OrderedDict(level_id -> LevelNode)}
+    maps: dict[int, dict[int, dict]] = defaultdict(dict)
+
+    for ss_id, level_id, level_name, module_id, module_name in level_rows:
+        bucket = maps[ss_id].setdefault(
+            module_id, {"module": NamedRef(module_id, module_name), "levels": OrderedDict()}
+        )
+        bucket["levels"].setdefault(level_id, LevelNode(level=NamedRef(level_id, level_name)))
+
+    for ss_id, sub_id, sub_name, level_id, level_name, module_id, module_name in sublevel_rows:
+        bucket = maps[ss_id].setdefault(
+            module_id, {"module": NamedRef(module_id, module_name), "levels": OrderedDict()}
+        )
+        level_node = bucket["levels"].setdefault(
+            level_id, LevelNode(level=NamedRef(level_id, level_name))
+        )
+        level_node.sublevels.append(NamedRef(sub_id, sub_name))
+
+    out: dict[int, list[ModuleNode]] = {}
+    for ss_id, mod_map in maps.items():
+        nodes = []
+        for bucket in sorted(mod_map.values(), key=lambda b: b["module"].name):
+            levels = list(bucket["levels"].values())
+            if ss_id in expanded_ids:
+                # Mezcla de niveles explícitos e implícitos: orden por nombre
+                levels.sort(key=lambda node: node.level.name)
+            nodes.append(ModuleNode(module=bucket["module"], levels=levels))
+        out[ss_id] = nodes
+    return out
+
+
+# =========================
+# Loader
+# =========================
+
+def load_selection_bundles(selection_set_ids) -> dict[int, SelectionSetBundle]:
+    """
+    Carga N selection_sets con todas sus selecciones en una cantidad fija de
+    queries (una por tabla hija), sin importar cuántos ids se pidan.
+    Devuelve {selection_set_id: SelectionSetBundle}.
+    """
+    ids = sorted({int(x) for x in selection_set_ids})
+    if not ids:
+        return {}
+
+    heads = list(
+        PermissionSelectionSet.objects.filter(pk__in=ids).values_list(
+            "id",
+            "company_id",
+            "company__name",
+            "branch_id",
+            "branch__name",
+            "notes",
+            "globals_fingerprint",
+        )
+    )
+
+    modules = _refs_by_selection_set(
+        SelectionSetModule.objects.filter(module__is_active=True),
+        "module_id", "module__name", ids,
+    )
+    levels_trees = _build_levels_trees(ids)
+    control_panels = _refs_by_selection_set(
+        SelectionSetControlPanel.objects, "control_panel_id", "control_panel__name", ids
+    )
+    sellers = _refs_by_selection_set(SelectionSetSeller.objects, "seller_id", "seller__name", ids)
+    warehouses = _refs_by_selection_set(
+        SelectionSetWarehouse.objects, "warehouse_id", "warehouse__name", ids
+    )
+    cash_registers = _refs_by_selection_set(
+        SelectionSetCashRegister.objects, "cash_register_id", "cash_register__name", ids
+    )
+    payment_methods = _refs_by_selection_set(
+        SelectionSetPaymentMethod.objects.filter(enabled=True, is_active=True),
+        "payment_method_id", "payment_method__name", ids,
+    )
+
+    actions: dict[int, list[ActionRow]] = defaultdict(list)
+    action_rows = (
+        SelectionSetActionValue.objects.filter(selection_set_id__in=ids, is_active=True)
+        .order_by("action_permission__group", "action_permission__action")
+        .values(
+            "selection_set_id",
+            "action_permission__group",
+            "action_permission__action",
+            "action_permission__value_type",
+            "value_bool",
+            "value_int",
+            "value_decimal",
+            "value_text",
+        )
+    )
+    for row in action_rows:
+        value_type = row["action_permission__value_type"]
+        val = _action_display_value(value_type, row)
+        if not val:
+            continue
+        actions[row["selection_set_id"]].append(
+            ActionRow(
+                group=row["action_permission__group"],
+                name=row["action_permission__action"],
+                val=val,
+                value_type=value_type,
+            )
+        )
+
+    matrix: dict[int, list[MatrixRow]] = defaultdict(list)
+    matrix_rows = (
+        SelectionSetMatrixPermission.objects.filter(selection_set_id__in=ids)
+        .order_by("permission__name")
+        .values_list(
+            "selection_set_id",
+            "permission_id",
+            "permission__name",
+            "can_create",
+            "can_update",
+            "can_authorize",
+            "can_close",
+            "can_cancel",
+            "can_update_validity",
+        )
+    )
+    for ss_id, perm_id, perm_name, *flags in matrix_rows:
+        if not any(flags):
+            continue
+        matrix[ss_id].append(MatrixRow(NamedRef(perm_id, perm_name), *flags))
+
+    out: dict[int, SelectionSetBundle] = {}
+    for ss_id, company_id, company_name, branch_id, branch_name, notes, fingerprint in heads:
+        out[ss_id] = SelectionSetBundle(
+            id=ss_id,
+            company=NamedRef(company_id, company_name),
+            branch=NamedRef(branch_id, branch_name) if branch_id else None,
+            notes=notes,
+            globals_fingerprint=fingerprint,
+            modules=modules.get(ss_id, []),
+            levels_tree=levels_trees.get(ss_id, []),
+            control_panels=control_panels.get(ss_id, []),
+            sellers=sellers.get(ss_id, []),
+            actions=actions.get(ss_id, []),
+            matrix=matrix.get(ss_id, []),
+            payment_methods=payment_methods.get(ss_id, []),
+            warehouses=warehouses.get(ss_id, []),
+            cash_registers=cash_registers.get(ss_id, []),
+        )
+    return out
+
+
+# =========================
+# Payloads para templates
+# =========================
+
+def build_company_payload(base: SelectionSetBundle, branch_bundles=()) -> dict:
+    """
+    Payload de una empresa: globales tomados del selection_set base y
+    depósitos/cajas por cada selection_set de sucursal.
+    """
+    actions_by_group: dict[str, list[ActionRow]] = {}
+    for row in base.actions:
+        actions_by_group.setdefault(row.group, []).append(row)
+
+    return {
+        "modules": base.modules,
+        "levels_tree": base.levels_tree,
+        "control_panels": base.control_panels,
+        "sellers": base.sellers,
+        "action_groups": list(actions_by_group),
+        "actions_by_group": actions_by_group,
+        "matrix": base.matrix,
+        "payment_methods": base.payment_methods,
+        "branches": [
+            {
+                "branch": b.branch,
+                "warehouses": b.warehouses,
+                "cash_registers": b.cash_registers,
+            }
+            for b in branch_bundles
+        ],
+    }
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+from django.db import connection
+from django.utils import timezone
+
+from apps.catalog.models.permissions.global_ops import ActionPermission, ActionValueType
+from apps.catalog.models.permissions.scoped import (
+    CashRegister,
+    ControlPanel,
+    Seller,
+    Warehouse,
+)
+from apps.catalog.models.selections import (
+    PermissionSelectionSet,
+    SelectionSetModule,
+    SelectionSetLevel,
+    SelectionSetSubLevel,
+    SelectionSetWarehouse,
+    SelectionSetCashRegister,
+    SelectionSetControlPanel,
+    SelectionSetSeller,
+    SelectionSetActionValue,
+    SelectionSetMatrixPermission,
+    SelectionSetPaymentMethod,
+)
+
+# Caracteres que descarta str.strip() en los textos que cargan los usuarios.
+_STRIP_CHARS = " \t\n\r\x0b\x0c"
+
+_MATRIX_FLAGS = (
+    "can_create",
+    "can_update",
+    "can_authorize",
+    "can_close",
+    "can_cancel",
+    "can_update_validity",
+)
+
+
+def _q(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def _table(model) -> str:
+    return _q(model._meta.db_table)
+
+
+def _col(model, field_name: str) -> str:
+    return _q(model._meta.get_field(field_name).column)
+
+
+class _MergeSql:
+    """
+    Arma los INSERT … SELECT … GROUP BY que replican la semántica de la fusión
+    en Python (ver merge_selection_sets en forms/helpers.py):
+
+    - "primero" = según el orden de `bases` (CASE sobre la posición).
+    - BOOL / flags: OR (BOOL_OR en PostgreSQL, MAX en SQLite).
+    - INT / DECIMAL / PERCENT: máximo ignorando NULL.
+    - TEXT: primer valor no vacío (trim); si hay una sola fila se copia tal cual.
+
+    Los ids se interpolan como enteros (int()), nunca como texto del usuario.
+    """
+
+    def __init__(self, base_ids: list[int], target_id: int):
+        self.target_id = int(target_id)
+        self.base_ids = [int(x) for x in base_ids]
+        self.unique_ids = list(dict.fromkeys(self.base_ids))
+        self.in_list = ", ".join(str(x) for x in self.unique_ids)
+
+        is_pg = connection.vendor == "postgresql"
+        self.bool_or = "BOOL_OR" if is_pg else "MAX"
+        self.trim = "BTRIM" if is_pg else "TRIM"
+
+    # -------- expresiones --------
+    def position(self, alias: str) -> str:
+        whens = " ".join(
+            f"WHEN {ss_id} THEN {pos}" for pos, ss_id in enumerate(self.unique_ids)
+        )
+        return f"CASE {alias}.{_q('selection_set_id')} {whens} END"
+
+    def multiplicity(self, alias: str) -> str:
+        # Un mismo selection_set repetido en `bases` cuenta varias veces (como en Python).
+        whens = " ".join(
+            f"WHEN {ss_id} THEN {self.base_ids.count(ss_id)}" for ss_id in self.unique_ids
+        )
+        return f"CASE {alias}.{_q('selection_set_id')} {whens} END"
+
+    def first_value(self, model, key: str, column: str, *, non_empty_text: bool = False) -> str:
+        """Subquery correlacionada: valor de `column` en la primera base (por orden)."""
+        table = _table(model)
+        k = _col(model, key)
+        c = _col(model, column)
+        value = f"x.{c}"
+        extra = ""
+        if non_empty_text:
+            value = f"{self.trim}(x.{c}, %s)"
+            extra = f" AND {self.trim}(x.{c}, %s) <> ''"
+        return (
+            f"(SELECT {value} FROM {table} x "
+            f"WHERE x.{k} = v.{k} AND x.{_q('selection_set_id')} IN ({self.in_list}){extra} "
+            f"ORDER BY {self.position('x')} LIMIT 1)"
+        )
+
+    # -------- statements --------
+    def union(
+        self, model, fk: str, *, created_at=None, or_fields=(),
+        scope_model=None, scope_fk=None, scope_id=None,
+    ):
+        table = _table(model)
+        col = _col(model, fk)
+        cols = [_q("selection_set_id"), col]
+        select = [str(self.target_id), f"v.{col}"]
+        params: list = []
+        # Flags como include_all: OR entre las bases (agrupando por fk)
+        for f in or_fields:
+            cols.append(_q(f))
+            select.append(f"{self.bool_or}(v.{_q(f)})")
+        if created_at is not None:
+            cols.append(_q("created_at"))
+            select.append("%s")
+            params.append(created_at)
+
+        join = ""
+        where = f"v.{_q('selection_set_id')} IN ({self.in_list})"
+        if scope_model is not None:
+            join = f" JOIN {_table(scope_model)} s ON s.{_q('id')} = v.{col}"
+            where += f" AND s.{_col(scope_model, scope_fk)} = {int(scope_id)}"
+
+        if or_fields:
+            sql = (
+                f"INSERT INTO {table} ({', '.join(cols)}) "
+                f"SELECT {', '.join(select)} FROM {table} v{join} WHERE {where} "
+                f"GROUP BY v.{col}"
+            )
+        else:
+            sql = (
+                f"INSERT INTO {table} ({', '.join(cols)}) "
+                f"SELECT DISTINCT {', '.join(select)} FROM {table} v{join} WHERE {where}"
+            )
+        return sql, params
+
+    def actions(self):
+        m = SelectionSetActionValue
+        table = _table(m)
+        ap_table = _table(ActionPermission)
+        key = _col(m, "action_permission")
+        vt = f"ap.{_col(ActionPermission, 'value_type')}"
+        numeric = f"'{ActionValueType.DECIMAL}', '{ActionValueType.PERCENT}'"
+        non_text = (
+            f"'{ActionValueType.BOOL}', '{ActionValueType.INT}', "
+            f"'{ActionValueType.DECIMAL}', '{ActionValueType.PERCENT}'"
+        )
+
+        value_bool = (
+            f"CASE WHEN {vt} = '{ActionValueType.BOOL}' THEN {self.bool_or}(v.{_q('value_bool')}) "
+            f"ELSE {self.first_value(m, 'action_permission', 'value_bool')} END"
+        )
+        value_int = (
+            f"CASE WHEN {vt} = '{ActionValueType.INT}' THEN MAX(v.{_q('value_int')}) "
+            f"ELSE {self.first_value(m, 'action_permission', 'value_int')} END"
+        )
+        value_decimal = (
+            f"CASE WHEN {vt} IN ({numeric}) THEN MAX(v.{_q('value_decimal')}) "
+            f"ELSE {self.first_value(m, 'action_permission', 'value_decimal')} END"
+        )
+        value_text = (
+            f"CASE WHEN {vt} IN ({non_text}) OR SUM({self.multiplicity('v')}) = 1 "
+            f"THEN {self.first_value(m, 'action_permission', 'value_text')} "
+            f"ELSE {self.first_value(m, 'action_permission', 'value_text', non_empty_text=True)} END"
+        )
+        is_active = f"{self.bool_or}(v.{_q('is_active')})"
+
+        sql = (
+            f"INSERT INTO {table} ({_q('selection_set_id')}, {key}, {_q('value_bool')}, "
+            f"{_q('value_int')}, {_q('value_decimal')}, {_q('value_text')}, {_q('is_active')}) "
+            f"SELECT {self.target_id}, v.{key}, {value_bool}, {value_int}, {value_decimal}, "
+            f"{value_text}, {is_active} "
+            f"FROM {table} v JOIN {ap_table} ap ON ap.{_q('id')} = v.{key} "
+            f"WHERE v.{_q('selection_set_id')} IN ({self.in_list}) "
+            f"GROUP BY v.{key}, {vt}"
+        )
+        # value_text no vacío: TRIM(x, chars) aparece dos veces en la subquery
+        return sql, [_STRIP_CHARS, _STRIP_CHARS]
+
+    def or_flags(self, model, key: str, flags: tuple[str, ...]):
+        table = _table(model)
+        k = _col(model, key)
+        cols = ", ".join(_q(f) for f in flags)
+        aggs = ", ".join(f"{self.bool_or}(v.{_q(f)})" for f in flags)
+        sql = (
+            f"INSERT INTO {table} ({_q('selection_set_id')}, {k}, {cols}) "
+            f"SELECT {self.target_id}, v.{k}, {aggs} FROM {table} v "
+            f"WHERE v.{_q('selection_set_id')} IN ({self.in_list}) GROUP BY v.{k}"
+        )
+        return sql, []
+
+
+def merge_into_selection_set(
+    target: PermissionSelectionSet,
+    bases: list[PermissionSelectionSet],
+    *,
+    company,
+    branch=None,
+) -> None:
+    """
+    Escribe en `target` (recién creado, vacío) la fusión de `bases` con una
+    cantidad fija de sentencias SQL, sin importar cuántas bases haya.
+    """
+    if not bases:
+        return
+
+    m = _MergeSql([b.pk for b in bases], target.pk)
+    now = timezone.now()
+
+    statements = [
+        m.union(SelectionSetModule, "module", created_at=now, or_fields=("include_all",)),
+        m.union(SelectionSetLevel, "level", created_at=now, or_fields=("include_all",)),
+        m.union(SelectionSetSubLevel, "sublevel", created_at=now),
+    ]
+    if branch is not None:
+        statements += [
+            m.union(SelectionSetWarehouse, "warehouse",
+                    scope_model=Warehouse, scope_fk="branch", scope_id=branch.id),
+            m.union(SelectionSetCashRegister, "cash_register",
+                    scope_model=CashRegister, scope_fk="branch", scope_id=branch.id),
+        ]
+    statements += [
+        m.union(SelectionSetControlPanel, "control_panel",
+                scope_model=ControlPanel, scope_fk="company", scope_id=company.id),
+        m.union(SelectionSetSeller, "seller",
+                scope_model=Seller, scope_fk="company", scope_id=company.id),
+        m.actions(),
+        m.or_flags(SelectionSetMatrixPermission, "permission", _MATRIX_FLAGS),
+        m.or_flags(SelectionSetPaymentMethod, "payment_method", ("enabled", "is_active")),
+    ]
+
+    with connection.cursor() as cursor:
+        for sql, params in statements:
+            cursor.execute(sql, params)
@@ -16,13 +16,11 @@ from apps.catalog.models import (
     AccessTemplateItem,
     ActionPermission,
     Company,
-    ErpModule,
-    ErpModuleLevel,
-    ErpModuleSubLevel,
     PermissionSelectionSet,
 )
 from apps.catalog.models.permissions.global_ops import ActionValueType
 from apps.catalog.models.selections import SelectionSetLevel, SelectionSetModule, SelectionSetSubLevel
+from apps.catalog.services.catalog_cache import CatalogNode, ModuleCatalogSnapshot, get_module_catalog
 
 MODULES_START_ROW = 2
 MODULES_END_ROW = 449
@@ -50,9 +48,9 @@ class SheetImportResult:
 @dataclass(frozen=True)
 class ParsedSheetTemplate:
     name: str
-    modules: list[ErpModule]
-    levels: list[ErpModuleLevel]
-    sublevels: list[ErpModuleSubLevel]
+    modules: list[CatalogNode]
+    levels: list[CatalogNode]
+    sublevels: list[CatalogNode]
     action_items: list[dict]
     action_values_selected: int
 
@@ -119,77 +117,33 @@ def _as_decimal(value, *, sheet_name: str, row_idx: int, label: str) -> Decimal
         )
 
 
-def _build_module_index() -> dict[tuple[str, str, str], ErpModuleSubLevel]:
-    sublevels = (
-        ErpModuleSubLevel.objects.filter(
-            is_active=True,
-            level__is_active=True,
-            level__module__is_active=True,
-        )
-        .select_related("level", "level__module")
-        .order_by("level__module__name", "level__name", "name")
-    )
-    index: dict[tuple[str, str, str], ErpModuleSubLevel] = {}
-    duplicates: set[tuple[str, str, str]] = set()
-    for sublevel in sublevels:
-        key = (
-            _normalize_text(sublevel.level.module.name),
-            _normalize_text(sublevel.level.name),
-            _normalize_text(sublevel.name),
-        )
+def _index_catalog_nodes(nodes, *, label: str) -> dict[tuple[str, ...], CatalogNode]:
+    index: dict[tuple[str, ...], CatalogNode] = {}
+    duplicates: set[tuple[str, ...]] = set()
+    for node in nodes:
+        key = tuple(_normalize_text(part) for part in node.path)
         if key in index:
             duplicates.add(key)
             continue
-        index[key] = sublevel
+        index[key] = node
     if duplicates:
         raise TemplateExcelImportError(
-            "Hay subniveles ERP duplicados luego de normalizar nombres. Revisar catalogo base."
+            f"Hay {label} ERP duplicados luego de normalizar nombres. Revisar catalogo base."
         )
     return index
 
 
-def _build_level_index() -> dict[tuple[str, str], ErpModuleLevel]:
-    levels = (
-        ErpModuleLevel.objects.filter(
-            is_active=True,
-            module__is_active=True,
-        )
-        .select_related("module")
-        .order_by("module__name", "name")
-    )
-    index: dict[tuple[str, str], ErpModuleLevel] = {}
-    duplicates: set[tuple[str, str]] = set()
-    for level in levels:
-        key = (
-            _normalize_text(level.module.name),
-            _normalize_text(level.name),
-        )
-        if key in index:
-            duplicates.add(key)
-            continue
-        index[key] = level
-    if duplicates:
-        raise TemplateExcelImportError(
-            "Hay niveles ERP duplicados luego de normalizar nombres. Revisar catalogo base."
-        )
-    return index
+def _build_module_index(catalog: ModuleCatalogSnapshot) -> dict[tuple[str, str, str], CatalogNode]:
+    return _index_catalog_nodes(catalog.sublevels.values(), label="subniveles")
 
 
-def _build_root_module_index() -> dict[str, ErpModule]:
-    modules = ErpModule.objects.filter(is_active=True).order_by("name")
-    index: dict[str, ErpModule] = {}
-    duplicates: set[str] = set()
-    for module in modules:
-        key = _normalize_text(module.name)
-        if key in index:
-            duplicates.add(key)
-            continue
-        index[key] = module
-    if duplicates:
-        raise TemplateExcelImportError(
-            "Hay modulos ERP duplicados luego de normalizar nombres. Revisar catalogo base."
-        )
-    return index
+def _build_level_index(catalog: ModuleCatalogSnapshot) -> dict[tuple[str, str], CatalogNode]:
+    return _index_catalog_nodes(catalog.levels.values(), label="niveles")
+
+
+def _build_root_module_index(catalog: ModuleCatalogSnapshot) -> dict[str, CatalogNode]:
+    index = _index_catalog_nodes(catalog.modules.values(), label="modulos")
+    return {key[0]: node for key, node in index.items()}
 
 
 def _build_action_index() -> dict[tuple[str, str], ActionPermission]:
@@ -210,9 +164,9 @@ def _build_action_index() -> dict[tuple[str, str], ActionPermission]:
 
 
 def _parse_sheet(sheet, *, module_index, level_index, root_module_index, action_index) -> ParsedSheetTemplate:
-    selected_modules: dict[int, ErpModule] = {}
-    selected_levels: dict[int, ErpModuleLevel] = {}
-    selected_sublevels: dict[int, ErpModuleSubLevel] = {}
+    selected_modules: dict[int, CatalogNode] = {}
+    selected_levels: dict[int, CatalogNode] = {}
+    selected_sublevels: dict[int, CatalogNode] = {}
     action_items: list[dict] = []
     action_values_selected = 0
 
@@ -305,12 +259,9 @@ def _parse_sheet(sheet, *, module_index, level_index, root_module_index, action_
 
     return ParsedSheetTemplate(
         name=" ".join(sheet.title.strip().split()),
-        modules=sorted(selected_modules.values(), key=lambda row: row.name),
-        levels=sorted(selected_levels.values(), key=lambda row: (row.module.name, row.name)),
-        sublevels=sorted(
-            selected_sublevels.values(),
-            key=lambda row: (row.level.module.name, row.level.name, row.name),
-        ),
+        modules=sorted(selected_modules.values(), key=lambda row: row.path),
+        levels=sorted(selected_levels.values(), key=lambda row: row.path),
+        sublevels=sorted(selected_sublevels.values(), key=lambda row: row.path),
         action_items=action_items,
         action_values_selected=action_values_selected,
     )
@@ -354,9 +305,10 @@ def import_templates_from_excel(
 
     base_company = _resolve_company(company=company)
     workbook = load_workbook(filename=BytesIO(_read_file_bytes(file_obj)), data_only=True)
-    module_index = _build_module_index()
-    level_index = _build_level_index()
-    root_module_index = _build_root_module_index()
+    catalog = get_module_catalog()
+    module_index = _build_module_index(catalog)
+    level_index = _build_level_index(catalog)
+    root_module_index = _build_root_module_index(catalog)
     action_index = _build_action_index()
 
     parsed_sheets: list[ParsedSheetTemplate] = []
@@ -412,19 +364,40 @@ def import_templates_from_excel(
         template.selection_set = selection_set
         template.save(update_fields=["selection_set"])
 
+        # Guardado compacto: módulo/nivel completo => include_all, sin filas por subnivel
+        compact = catalog.compact_selection(
+            [module.id for module in parsed.modules],
+            [sublevel.id for sublevel in parsed.sublevels],
+        )
+        full_modules = set(compact.full_module_ids)
+        full_levels = set(compact.full_level_ids)
         if parsed.modules:
             SelectionSetModule.objects.bulk_create(
-                [SelectionSetModule(selection_set=selection_set, module=module) for module in parsed.modules],
+                [
+                    SelectionSetModule(
+                        selection_set=selection_set,
+                        module_id=module.id,
+                        include_all=module.id in full_modules,
+                    )
+                    for module in parsed.modules
+                ],
                 batch_size=500,
             )
         if parsed.levels:
             SelectionSetLevel.objects.bulk_create(
-                [SelectionSetLevel(selection_set=selection_set, level=level) for level in parsed.levels],
+                [
+                    SelectionSetLevel(
+                        selection_set=selection_set,
+                        level_id=level.id,
+                        include_all=level.id in full_levels,
+                    )
+                    for level in parsed.levels
+                ],
                 batch_size=500,
             )
-        if parsed.sublevels:
+        if compact.sublevel_ids:
             SelectionSetSubLevel.objects.bulk_create(
-                [SelectionSetSubLevel(selection_set=selection_set, sublevel=sublevel) for sublevel in parsed.sublevels],
+                [SelectionSetSubLevel(selection_set=selection_set, sublevel_id=sublevel_id) for sublevel_id in compact.sublevel_ids],
                 batch_size=500,
             )
 
@@ -17,6 +17,7 @@ from apps.catalog.models.selections import (
     SelectionSetMatrixPermission,
     SelectionSetPaymentMethod,
 )
+from apps.catalog.services.fingerprints import refresh_global_fingerprints
 
 
 @dataclass(frozen=True)
@@ -39,14 +40,14 @@ def clone_selection_set(source: PermissionSelectionSet, *, notes: str = "") -> C
 
     # Modules
     SelectionSetModule.objects.bulk_create(
-        [SelectionSetModule(selection_set=target, module=row.module)
+        [SelectionSetModule(selection_set=target, module=row.module, include_all=row.include_all)
          for row in source.selected_modules.select_related("module").all()],
         ignore_conflicts=True,
     )
 
     # Levels
     SelectionSetLevel.objects.bulk_create(
-        [SelectionSetLevel(selection_set=target, level=row.level)
+        [SelectionSetLevel(selection_set=target, level=row.level, include_all=row.include_all)
          for row in source.selected_levels.select_related("level").all()],
         ignore_conflicts=True,
     )
@@ -120,4 +121,11 @@ def clone_selection_set(source: PermissionSelectionSet, *, notes: str = "") -> C
         ignore_conflicts=True,
     )
 
+    # Copia exacta: la huella global es la misma que la del origen.
+    if source.globals_fingerprint:
+        target.globals_fingerprint = source.globals_fingerprint
+        target.save(update_fields=["globals_fingerprint"])
+    else:
+        refresh_global_fingerprints([target])
+
     return CloneResult(source_id=source.pk, cloned=target)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+from apps.catalog.models.rules import (
+    PermissionBlock,
+    PermissionVisibilityRule,
+    PermissionVisibilityRuleBlock,
+    PermissionVisibilityTrigger,
+    RuleBlockMode,
+)
+from apps.catalog.models.selections import (
+    SelectionSetLevel,
+    SelectionSetModule,
+    SelectionSetSubLevel,
+)
+from apps.catalog.services.catalog_cache import get_module_catalog, get_snapshot
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Scope propio en el versionado de catalog_cache: se invalida por signals de
+# bloques / reglas / triggers (ver signals.py), independiente del árbol de módulos.
+RULES_SCOPE = "visibility_rules"
+
+# Claves del índice invertido: ("M", module_id) / ("L", level_id) / ("S", sublevel_id)
+MODULE_KEY = "M"
+LEVEL_KEY = "L"
+SUBLEVEL_KEY = "S"
+
+
+@dataclass(frozen=True)
+class BlockInfo:
+    code: str
+    name: str
+    kind: str
+    scoped_entity: str | None
+    global_entity: str | None
+    action_group: str | None
+    order: int
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    id: int
+    name: str
+    priority: int
+    # Bloques activos que muestra (SHOW), en orden de la regla
+    block_codes: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class CompiledVisibilityRules:
+    version: int
+    # Bloques activos por código (orden: order, name)
+    blocks: dict[str, BlockInfo]
+    # Reglas activas por id
+    rules: dict[int, CompiledRule]
+    # Reglas sin triggers ("siempre matchean"), por prioridad desc
+    always: tuple[int, ...]
+    # Índice invertido: clave de selección -> ids de regla (por prioridad desc)
+    index: dict[tuple[str, int], tuple[int, ...]]
+
+    def matching_rule_ids(self, selection_keys) -> list[int]:
+        """Reglas que matchean (ANY) para las claves dadas, por prioridad desc."""
+        matched = set(self.always)
+        for key in self.index.keys() & set(selection_keys):
+            matched.update(self.index[key])
+        return sorted(matched, key=lambda rid: (-self.rules[rid].priority, self.rules[rid].name, rid))
+
+    def visible_block_codes(self, selection_keys) -> list[str]:
+        """Códigos de bloques visibles, en el orden de PermissionBlock (order, name)."""
+        codes: set[str] = set()
+        for rule_id in self.matching_rule_ids(selection_keys):
+            codes.update(self.rules[rule_id].block_codes)
+        return [code for code in self.blocks if code in codes]
+
+
+def _build_compiled_rules(version: int) -> CompiledVisibilityRules:
+    blocks = {
+        row["code"]: BlockInfo(**row)
+        for row in PermissionBlock.objects.filter(is_active=True)
+        .order_by("order", "name")
+        .values("code", "name", "kind", "scoped_entity", "global_entity", "action_group", "order")
+    }
+
+    rule_rows = list(
+        PermissionVisibilityRule.objects.filter(is_active=True)
+        .order_by("-priority", "name", "id")
+        .values_list("id", "name", "priority")
+    )
+    rule_ids = [row[0] for row in rule_rows]
+
+    codes_by_rule: dict[int, list[str]] = defaultdict(list)
+    for rule_id, code in (
+        PermissionVisibilityRuleBlock.objects.filter(
+            rule_id__in=rule_ids, mode=RuleBlockMode.SHOW, block__is_active=True
+        )
+        .order_by("order", "block__order", "block__name")
+        .values_list("rule_id", "block__code")
+    ):
+        codes_by_rule[rule_id].append(code)
+
+    keys_by_rule: dict[int, list[tuple[str, int]]] = defaultdict(list)
+    for rule_id, module_id, level_id, sublevel_id in PermissionVisibilityTrigger.objects.filter(
+        rule_id__in=rule_ids
+    ).values_list("rule_id", "module_id", "level_id", "sublevel_id"):
+        if module_id:
+            keys_by_rule[rule_id].append((MODULE_KEY, module_id))
+        elif level_id:
+            keys_by_rule[rule_id].append((LEVEL_KEY, level_id))
+        elif sublevel_id:
+            keys_by_rule[rule_id].append((SUBLEVEL_KEY, sublevel_id))
+
+    rules: dict[int, CompiledRule] = {}
+    always: list[int] = []
+    index: dict[tuple[str, int], list[int]] = defaultdict(list)
+    # rule_rows ya viene por prioridad desc: las listas del índice quedan ordenadas
+    for rule_id, name, priority in rule_rows:
+        rules[rule_id] = CompiledRule(
+            id=rule_id,
+            name=name,
+            priority=priority,
+            block_codes=tuple(codes_by_rule.get(rule_id, ())),
+        )
+        keys = keys_by_rule.get(rule_id)
+        if not keys:
+            always.append(rule_id)
+            continue
+        for key in dict.fromkeys(keys):
+            index[key].append(rule_id)
+
+    logger.debug(
+        "Visibility rules compiled version=%s rules=%s blocks=%s keys=%s",
+        version, len(rules), len(blocks), len(index),
+    )
+    return CompiledVisibilityRules(
+        version=version,
+        blocks=blocks,
+        rules=rules,
+        always=tuple(always),
+        index={key: tuple(ids) for key, ids in index.items()},
+    )
+
+
+def get_compiled_rules() -> CompiledVisibilityRules:
+    return get_snapshot(RULES_SCOPE, _build_compiled_rules)
+
+
+def selection_keys_by_set(selection_set_ids) -> dict[int, set[tuple[str, int]]]:
+    """
+    Claves de selección (módulos, niveles y subniveles efectivos) por selection_set,
+    con 3 queries para todos los ids. Se expanden include_all y se agregan los
+    ancestros: un subnivel elegido implica su nivel y su módulo.
+    """
+    ids = [int(x) for x in selection_set_ids]
+    if not ids:
+        return {}
+
+    catalog = get_module_catalog()
+    out: dict[int, set[tuple[str, int]]] = {ss_id: set() for ss_id in ids}
+    sublevels: dict[int, set[int]] = defaultdict(set)
+    levels: dict[int, set[int]] = defaultdict(set)
+
+    for ss_id, module_id, include_all in SelectionSetModule.objects.filter(
+        selection_set_id__in=ids
+    ).values_list("selection_set_id", "module_id", "include_all"):
+        out[ss_id].add((MODULE_KEY, module_id))
+        if include_all:
+            sublevels[ss_id].update(catalog.sublevel_ids_by_module.get(module_id, ()))
+
+    for ss_id, level_id, include_all in SelectionSetLevel.objects.filter(
+        selection_set_id__in=ids
+    ).values_list("selection_set_id", "level_id", "include_all"):
+        levels[ss_id].add(level_id)
+        if include_all:
+            sublevels[ss_id].update(catalog.sublevel_ids_by_level.get(level_id, ()))
+
+    for ss_id, sublevel_id in SelectionSetSubLevel.objects.filter(
+        selection_set_id__in=ids
+    ).values_list("selection_set_id", "sublevel_id"):
+        sublevels[ss_id].add(sublevel_id)
+
+    for ss_id in ids:
+        keys = out[ss_id]
+        ss_levels = set(levels.get(ss_id, ()))
+        for sublevel_id in sublevels.get(ss_id, ()):
+            keys.add((SUBLEVEL_KEY, sublevel_id))
+            node = catalog.sublevels.get(sublevel_id)
+            if node is not None:
+                ss_levels.add(node.parent_id)
+        for level_id in ss_levels:
+            keys.add((LEVEL_KEY, level_id))
+            node = catalog.levels.get(level_id)
+            if node is not None:
+                keys.add((MODULE_KEY, node.parent_id))
+    return out
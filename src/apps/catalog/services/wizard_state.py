@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger("apps.catalog")
+
+
+# Campo hidden que viaja en los forms del wizard con la versión que vio la pestaña.
+WIZARD_VERSION_FIELD = "wizard_version"
+
+# Marca del formato versionado en la sesión ({"_v": n, "data": {...}}).
+# Un dict sin la marca es estado previo a este formato: se lee como versión 0.
+_VERSION_MARK = "_v"
+
+_CACHE_KEY = "catalog:wizard_state:{namespace}:{session_key}"
+_LOCK_ATTEMPTS = 50
+_LOCK_WAIT = 0.01
+
+
+class StaleWizardState(Exception):
+    """La pestaña trae una versión del wizard que ya no es la actual."""
+
+    def __init__(self, expected: int | None, current: int | None):
+        self.expected = expected
+        self.current = current
+        super().__init__(f"wizard state version expected={expected} current={current}")
+
+
+@dataclass(frozen=True)
+class WizardState:
+    version: int = 0
+    data: dict = field(default_factory=dict)
+
+    def get(self, key: str, default=None):
+        return self.data.get(key, default)
+
+
+def _decode(raw) -> WizardState:
+    if not raw:
+        return WizardState()
+    if _VERSION_MARK in raw:
+        return WizardState(version=int(raw[_VERSION_MARK]), data=dict(raw.get("data") or {}))
+    return WizardState(version=0, data=dict(raw))
+
+
+def _encode(state: WizardState) -> dict:
+    return {_VERSION_MARK: state.version, "data": state.data}
+
+
+class WizardStateStore:
+    """
+    Estado del wizard (empresas, sucursales, templates, request_id...) de un
+    namespace, versionado.
+
+    - load(): estado actual (memoizado en la request).
+    - update(changes, remove=..., expected_version=...): escribe solo si alguna
+      clave cambió; cada escritura incrementa la versión. Con expected_version
+      distinto del actual -> StaleWizardState (pestaña vieja).
+    - replace(data) / clear(): reinicio completo.
+
+    Los backends implementan _read / _write / _delete (y opcionalmente _lock).
+    """
+
+    def __init__(self, request, namespace: str):
+        self.request = request
+        self.namespace = namespace
+        self._state: WizardState | None = None
+        # Escrituras propias en esta request (la versión esperada las descuenta)
+        self._writes = 0
+
+    # ---- backend ----
+    def _read(self):
+        raise NotImplementedError
+
+    def _write(self, raw: dict) -> None:
+        raise NotImplementedError
+
+    def _delete(self) -> None:
+        raise NotImplementedError
+
+    def _lock(self):
+        return nullcontext()
+
+    # ---- API ----
+    def load(self) -> WizardState:
+        if self._state is None:
+            self._state = _decode(self._read())
+        return self._state
+
+    def _check(self, current: WizardState, expected_version: Optional[int]) -> None:
+        if expected_version is not None and expected_version + self._writes != current.version:
+            raise StaleWizardState(expected_version, current.version)
+
+    def _save(self, state: WizardState) -> WizardState:
+        self._write(_encode(state))
+        self._writes += 1
+        self._state = state
+        return state
+
+    def update(
+        self,
+        changes: dict | None = None,
+        *,
+        remove: Iterable[str] = (),
+        expected_version: Optional[int] = None,
+    ) -> WizardState:
+        with self._lock():
+            self._state = None
+            current = self.load()
+            self._check(current, expected_version)
+
+            data = dict(current.data)
+            changed = False
+            for key, value in (changes or {}).items():
+                if key not in data or data[key] != value:
+                    data[key] = value
+                    changed = True
+            for key in remove:
+                if key in data:
+                    del data[key]
+                    changed = True
+            if not changed:
+                return current
+
+            state = self._save(WizardState(version=current.version + 1, data=data))
+            logger.debug(
+                "Wizard state updated namespace=%s version=%s keys=%s",
+                self.namespace, state.version, sorted((changes or {}).keys()),
+            )
+            return state
+
+    def replace(self, data: dict, *, expected_version: Optional[int] = None) -> WizardState:
+        with self._lock():
+            self._state = None
+            current = self.load()
+            self._check(current, expected_version)
+            return self._save(WizardState(version=current.version + 1, data=dict(data)))
+
+    def clear(self) -> None:
+        with self._lock():
+            self._state = None
+            current = self.load()
+            if current.version:
+                # Se conserva la versión: una pestaña abierta antes del clear queda vieja
+                self._save(WizardState(version=current.version + 1))
+            else:
+                self._delete()
+                self._state = None
+
+
+class SessionWizardStateStore(WizardStateStore):
+    """Estado dentro de la sesión de Django (una clave por namespace)."""
+
+    def _read(self):
+        return self.request.session.get(self.namespace)
+
+    def _write(self, raw: dict) -> None:
+        self.request.session[self.namespace] = raw
+
+    def _delete(self) -> None:
+        self.request.session.pop(self.namespace, None)
+
+
+class CacheWizardStateStore(WizardStateStore):
+    """
+    Estado en el cache de Django, indexado por la clave de sesión: los pasos
+    del wizard no reescriben la fila de sesión. Requiere un cache compartido
+    entre workers (Redis/Memcached); expira con la sesión.
+    """
+
+    def _key(self) -> str:
+        session = self.request.session
+        if not session.session_key:
+            session.save()
+        return _CACHE_KEY.format(namespace=self.namespace, session_key=session.session_key)
+
+    def _timeout(self) -> int:
+        return int(getattr(settings, "SESSION_COOKIE_AGE", 1209600))
+
+    def _read(self):
+        return cache.get(self._key())
+
+    def _write(self, raw: dict) -> None:
+        cache.set(self._key(), raw, timeout=self._timeout())
+
+    def _delete(self) -> None:
+        cache.delete(self._key())
+
+    @contextmanager
+    def _lock(self):
+        # cache.add es atómico: serializa escrituras concurrentes de la misma sesión
+        lock_key = f"{self._key()}:lock"
+        for _ in range(_LOCK_ATTEMPTS):
+            if cache.add(lock_key, 1, timeout=5):
+                break
+            time.sleep(_LOCK_WAIT)
+        else:
+            raise StaleWizardState(None, None)
+        try:
+            yield
+        finally:
+            cache.delete(lock_key)
+
+
+_BACKENDS = {
+    "session": SessionWizardStateStore,
+    "cache": CacheWizardStateStore,
+}
+
+# Backends de cache que no comparten datos entre workers: con estos el
+# estado del wizard se perdería (o divergiría) al cambiar de proceso.
+_LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def check_wizard_store_settings() -> None:
+    """
+    Valida CATALOG_WIZARD_STATE_STORE al arrancar (CatalogConfig.ready):
+    "cache" exige un CACHES["default"] compartido (Redis, Memcached, DB…).
+    """
+    backend = getattr(settings, "CATALOG_WIZARD_STATE_STORE", "session")
+    if backend not in _BACKENDS:
+        raise ImproperlyConfigured(
+            f"CATALOG_WIZARD_STATE_STORE inválido: {backend!r} (usar 'session' o 'cache')."
+        )
+    if backend == "cache":
+        cache_backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+        if cache_backend in _LOCAL_CACHE_BACKENDS:
+            raise ImproperlyConfigured(
+                "CATALOG_WIZARD_STATE_STORE='cache' requiere un cache compartido entre "
+                f"workers en CACHES['default'] (configurado: {cache_backend!r})."
+            )
+
+
+def get_wizard_store(request, namespace: str) -> WizardStateStore:
+    """
+    Store del namespace para la request (uno por request y namespace).
+    Backend: settings.CATALOG_WIZARD_STATE_STORE ("session" | "cache").
+    """
+    stores = request.__dict__.setdefault("_catalog_wizard_stores", {})
+    store = stores.get(namespace)
+    if store is None:
+        backend = getattr(settings, "CATALOG_WIZARD_STATE_STORE", "session")
+        try:
+            store_cls = _BACKENDS[backend]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f"CATALOG_WIZARD_STATE_STORE inválido: {backend!r} (usar 'session' o 'cache')."
+            )
+        store = stores[namespace] = store_cls(request, namespace)
+    return store
+
+
+def posted_wizard_version(request) -> int | None:
+    """Versión que trae el POST (campo hidden); None si el form no la envía."""
+    raw = request.POST.get(WIZARD_VERSION_FIELD, "")
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
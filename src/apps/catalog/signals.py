@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.catalog.models.modules import ErpModule, ErpModuleLevel, ErpModuleSubLevel
+from apps.catalog.models.permissions.scoped import (
+    Branch,
+    CashRegister,
+    Company,
+    ControlPanel,
+    Seller,
+    Warehouse,
+)
+from apps.catalog.models.requests import AccessRequest
+from apps.catalog.models.rules import (
+    PermissionBlock,
+    PermissionVisibilityRule,
+    PermissionVisibilityRuleBlock,
+    PermissionVisibilityTrigger,
+)
+from apps.catalog.services.catalog_cache import MODULES_SCOPE, bump_catalog_version
+from apps.catalog.services.request_stats import track_request_deleted, track_request_saved
+from apps.catalog.services.scoped_options import SCOPED_SCOPE
+from apps.catalog.services.visibility_rules import RULES_SCOPE
+
+
+@receiver(post_save, sender=ErpModule)
+@receiver(post_delete, sender=ErpModule)
+@receiver(post_save, sender=ErpModuleLevel)
+@receiver(post_delete, sender=ErpModuleLevel)
+@receiver(post_save, sender=ErpModuleSubLevel)
+@receiver(post_delete, sender=ErpModuleSubLevel)
+def _invalidate_module_catalog(sender, **kwargs):
+    bump_catalog_version(MODULES_SCOPE)
+
+
+@receiver(post_save, sender=PermissionBlock)
+@receiver(post_delete, sender=PermissionBlock)
+@receiver(post_save, sender=PermissionVisibilityRule)
+@receiver(post_delete, sender=PermissionVisibilityRule)
+@receiver(post_save, sender=PermissionVisibilityTrigger)
+@receiver(post_delete, sender=PermissionVisibilityTrigger)
+@receiver(post_save, sender=PermissionVisibilityRuleBlock)
+@receiver(post_delete, sender=PermissionVisibilityRuleBlock)
+def _invalidate_visibility_rules(sender, **kwargs):
+    bump_catalog_version(RULES_SCOPE)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+@receiver(post_save, sender=ControlPanel)
+@receiver(post_delete, sender=ControlPanel)
+@receiver(post_save, sender=Seller)
+@receiver(post_delete, sender=Seller)
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+@receiver(post_save, sender=CashRegister)
+@receiver(post_delete, sender=CashRegister)
+def _invalidate_scoped_options(sender, **kwargs):
+    bump_catalog_version(SCOPED_SCOPE)
+
+
+@receiver(post_save, sender=AccessRequest)
+def _track_request_saved(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    track_request_saved(instance, created=created, update_fields=update_fields)
+
+
+@receiver(pre_delete, sender=AccessRequest)
+def _track_request_deleted(sender, instance, **kwargs):
+    track_request_deleted(instance)
@@ -1,3 +1,426 @@
+import json
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.catalog.forms.helpers import merge_selection_sets
+from apps.catalog.forms.helpers_globals import TableDelta, _apply_delta
+from apps.catalog.forms.step_4_globals import (
+    DELTA_MAX_ROWS,
+    DeltaCatalog,
+    GlobalsDeltaForm,
+)
+from apps.catalog.models.modules import ErpModule, ErpModuleLevel
+from apps.catalog.models.permissions.global_ops import (
+    ActionPermission,
+    ActionValueType,
+    MatrixPermission,
+    PaymentMethodPermission,
+)
+from apps.catalog.models.permissions.scoped import (
+    Branch,
+    Company,
+    ControlPanel,
+    Warehouse,
+)
+from apps.catalog.models.selections import (
+    PermissionSelectionSet,
+    SelectionSetActionValue,
+    SelectionSetControlPanel,
+    SelectionSetLevel,
+    SelectionSetMatrixPermission,
+    SelectionSetModule,
+    SelectionSetPaymentMethod,
+    SelectionSetWarehouse,
+)
+
+
+class MergeSelectionSetsTests(TestCase):
+    """Fusión SQL (services/selection_merge.py) de 2–3 selection sets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Empresa A")
+        cls.other_company = Company.objects.create(name="Empresa B")
+        cls.branch = Branch.objects.create(company=cls.company, name="Central")
+        cls.other_branch = Branch.objects.create(company=cls.company, name="Norte")
+
+        cls.ap_bool = ActionPermission.objects.create(
+            group="Ventas", action="Anular", value_type=ActionValueType.BOOL)
+        cls.ap_int = ActionPermission.objects.create(
+            group="Ventas", action="Cuotas", value_type=ActionValueType.INT)
+        cls.ap_dec = ActionPermission.objects.create(
+            group="Ventas", action="Descuento", value_type=ActionValueType.PERCENT)
+        cls.ap_text = ActionPermission.objects.create(
+            group="Ventas", action="Lista", value_type=ActionValueType.TEXT)
+
+        cls.mp_a = MatrixPermission.objects.create(name="Pedidos")
+        cls.mp_b = MatrixPermission.objects.create(name="Remitos")
+        cls.pay_a = PaymentMethodPermission.objects.create(name="Efectivo")
+        cls.pay_b = PaymentMethodPermission.objects.create(name="Tarjeta")
+        cls.pay_c = PaymentMethodPermission.objects.create(name="Cheque")
+
+        cls.module = ErpModule.objects.create(name="Ventas")
+        cls.level = ErpModuleLevel.objects.create(module=cls.module, name="Facturación")
+
+        cls.s1 = PermissionSelectionSet.objects.create(company=cls.company, notes="Nota 1")
+        cls.s2 = PermissionSelectionSet.objects.create(company=cls.company, notes="Nota 2")
+        cls.s3 = PermissionSelectionSet.objects.create(company=cls.company, notes="Nota 1")
+
+        # Acciones
+        SelectionSetActionValue.objects.bulk_create([
+            SelectionSetActionValue(selection_set=cls.s1, action_permission=cls.ap_bool, value_bool=False),
+            SelectionSetActionValue(selection_set=cls.s2, action_permission=cls.ap_bool, value_bool=True),
+            SelectionSetActionValue(selection_set=cls.s1, action_permission=cls.ap_int, value_int=3),
+            SelectionSetActionValue(selection_set=cls.s2, action_permission=cls.ap_int, value_int=12),
+            SelectionSetActionValue(selection_set=cls.s3, action_permission=cls.ap_int, value_int=6),
+            SelectionSetActionValue(
+                selection_set=cls.s1, action_permission=cls.ap_dec, value_decimal=Decimal("10.5")),
+            SelectionSetActionValue(
+                selection_set=cls.s3, action_permission=cls.ap_dec, value_decimal=Decimal("25")),
+            SelectionSetActionValue(selection_set=cls.s1, action_permission=cls.ap_text, value_text="   "),
+            SelectionSetActionValue(selection_set=cls.s2, action_permission=cls.ap_text, value_text="Mayorista"),
+            SelectionSetActionValue(selection_set=cls.s3, action_permission=cls.ap_text, value_text="Minorista"),
+        ])
+
+        # Matriz: mismo permiso con flags distintos + uno solo en s3
+        SelectionSetMatrixPermission.objects.bulk_create([
+            SelectionSetMatrixPermission(selection_set=cls.s1, permission=cls.mp_a, can_create=True),
+            SelectionSetMatrixPermission(selection_set=cls.s2, permission=cls.mp_a, can_close=True),
+            SelectionSetMatrixPermission(selection_set=cls.s3, permission=cls.mp_b, can_cancel=True),
+        ])
+
+        # Medios de pago
+        SelectionSetPaymentMethod.objects.bulk_create([
+            SelectionSetPaymentMethod(selection_set=cls.s1, payment_method=cls.pay_a, enabled=True),
+            SelectionSetPaymentMethod(selection_set=cls.s2, payment_method=cls.pay_a, enabled=False),
+            SelectionSetPaymentMethod(selection_set=cls.s2, payment_method=cls.pay_b, enabled=True),
+            SelectionSetPaymentMethod(selection_set=cls.s3, payment_method=cls.pay_c, enabled=True),
+        ])
+
+        # Módulos / niveles: include_all en una sola de las bases
+        SelectionSetModule.objects.bulk_create([
+            SelectionSetModule(selection_set=cls.s1, module=cls.module, include_all=False),
+            SelectionSetModule(selection_set=cls.s2, module=cls.module, include_all=True),
+        ])
+        SelectionSetLevel.objects.bulk_create([
+            SelectionSetLevel(selection_set=cls.s2, level=cls.level, include_all=False),
+            SelectionSetLevel(selection_set=cls.s3, level=cls.level, include_all=True),
+        ])
+
+        # Scoped: solo entra lo de la empresa / sucursal destino
+        cls.panel = ControlPanel.objects.create(company=cls.company, name="Panel A")
+        cls.foreign_panel = ControlPanel.objects.create(company=cls.other_company, name="Panel B")
+        SelectionSetControlPanel.objects.bulk_create([
+            SelectionSetControlPanel(selection_set=cls.s1, control_panel=cls.panel),
+            SelectionSetControlPanel(selection_set=cls.s2, control_panel=cls.panel),
+            SelectionSetControlPanel(selection_set=cls.s3, control_panel=cls.foreign_panel),
+        ])
+        cls.warehouse = Warehouse.objects.create(branch=cls.branch, name="Depósito 1")
+        cls.foreign_warehouse = Warehouse.objects.create(branch=cls.other_branch, name="Depósito 2")
+        SelectionSetWarehouse.objects.bulk_create([
+            SelectionSetWarehouse(selection_set=cls.s1, warehouse=cls.warehouse),
+            SelectionSetWarehouse(selection_set=cls.s2, warehouse=cls.foreign_warehouse),
+        ])
+
+    def _merge(self, *bases, branch=None):
+        return merge_selection_sets(list(bases), company=self.company, branch=branch)
+
+    def _action(self, ss, ap) -> SelectionSetActionValue:
+        return SelectionSetActionValue.objects.get(selection_set=ss, action_permission=ap)
+
+    def test_creates_new_set_with_unique_notes(self):
+        merged = self._merge(self.s1, self.s2, self.s3)
+
+        self.assertNotIn(merged.pk, {self.s1.pk, self.s2.pk, self.s3.pk})
+        self.assertEqual(merged.company_id, self.company.id)
+        self.assertIsNone(merged.branch_id)
+        self.assertEqual(merged.notes, "Nota 1\n\nNota 2")
+        self.assertTrue(merged.globals_fingerprint)
+
+    def test_bool_action_is_or(self):
+        merged = self._merge(self.s1, self.s2)
+        self.assertIs(self._action(merged, self.ap_bool).value_bool, True)
+
+        only_false = self._merge(self.s1, self.s3)
+        self.assertIs(self._action(only_false, self.ap_bool).value_bool, False)
+
+    def test_int_and_decimal_actions_take_max(self):
+        merged = self._merge(self.s1, self.s2, self.s3)
+
+        self.assertEqual(self._action(merged, self.ap_int).value_int, 12)
+        self.assertEqual(self._action(merged, self.ap_dec).value_decimal, Decimal("25"))
+
+    def test_text_action_is_first_non_empty_by_base_order(self):
+        merged = self._merge(self.s1, self.s3, self.s2)
+        self.assertEqual(self._action(merged, self.ap_text).value_text, "Minorista")
+
+        merged = self._merge(self.s1, self.s2, self.s3)
+        self.assertEqual(self._action(merged, self.ap_text).value_text, "Mayorista")
+
+    def test_text_action_single_row_is_copied_as_is(self):
+        merged = self._merge(self.s1)
+        self.assertEqual(self._action(merged, self.ap_text).value_text, "   ")
+
+    def test_matrix_flags_are_or(self):
+        merged = self._merge(self.s1, self.s2, self.s3)
+
+        rows = {
+            r.permission_id: r
+            for r in SelectionSetMatrixPermission.objects.filter(selection_set=merged)
+        }
+        self.assertEqual(set(rows), {self.mp_a.id, self.mp_b.id})
+        a = rows[self.mp_a.id]
+        self.assertEqual(
+            (a.can_create, a.can_update, a.can_authorize, a.can_close, a.can_cancel),
+            (True, False, False, True, False),
+        )
+        self.assertTrue(rows[self.mp_b.id].can_cancel)
+        self.assertFalse(rows[self.mp_b.id].can_create)
+
+    def test_payments_are_union(self):
+        merged = self._merge(self.s1, self.s2, self.s3)
+
+        rows = dict(
+            SelectionSetPaymentMethod.objects
+            .filter(selection_set=merged)
+            .values_list("payment_method_id", "enabled")
+        )
+        self.assertEqual(rows, {self.pay_a.id: True, self.pay_b.id: True, self.pay_c.id: True})
+
+    def test_include_all_is_or(self):
+        merged = self._merge(self.s1, self.s2, self.s3)
+
+        modules = list(
+            SelectionSetModule.objects.filter(selection_set=merged)
+            .values_list("module_id", "include_all")
+        )
+        levels = list(
+            SelectionSetLevel.objects.filter(selection_set=merged)
+            .values_list("level_id", "include_all")
+        )
+        self.assertEqual(modules, [(self.module.id, True)])
+        self.assertEqual(levels, [(self.level.id, True)])
+
+        merged = self._merge(self.s1)
+        self.assertFalse(SelectionSetModule.objects.get(selection_set=merged).include_all)
+
+    def test_scoped_rows_are_filtered_by_company_and_branch(self):
+        merged = self._merge(self.s1, self.s2, self.s3, branch=self.branch)
+
+        panels = list(
+            SelectionSetControlPanel.objects.filter(selection_set=merged)
+            .values_list("control_panel_id", flat=True)
+        )
+        warehouses = list(
+            SelectionSetWarehouse.objects.filter(selection_set=merged)
+            .values_list("warehouse_id", flat=True)
+        )
+        self.assertEqual(panels, [self.panel.id])
+        self.assertEqual(warehouses, [self.warehouse.id])
+
+        without_branch = self._merge(self.s1, self.s2)
+        self.assertFalse(SelectionSetWarehouse.objects.filter(selection_set=without_branch).exists())
+
+    def test_query_count_does_not_grow_with_bases(self):
+        with CaptureQueriesContext(connection) as two:
+            self._merge(self.s1, self.s2)
+        with CaptureQueriesContext(connection) as three:
+            self._merge(self.s1, self.s2, self.s3)
+        self.assertEqual(len(two), len(three))
+
+
+class ApplyDeltaTests(TestCase):
+    """_apply_delta (forms/helpers_globals.py): solo escribe lo que cambió."""
+
+    FIELDS = ("enabled", "is_active")
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name="Empresa A")
+        cls.ss = PermissionSelectionSet.objects.create(company=company)
+        cls.pay_a = PaymentMethodPermission.objects.create(name="Efectivo")
+        cls.pay_b = PaymentMethodPermission.objects.create(name="Tarjeta")
+        cls.pay_c = PaymentMethodPermission.objects.create(name="Cheque")
+
+    def _apply(self, desired, scope_ids=None) -> TableDelta:
+        return _apply_delta(
+            SelectionSetPaymentMethod,
+            self.ss,
+            key="payment_method",
+            fields=self.FIELDS,
+            desired=desired,
+            scope_ids=scope_ids,
+        )
+
+    def _rows(self) -> dict:
+        return {
+            pid: (enabled, is_active)
+            for pid, enabled, is_active in SelectionSetPaymentMethod.objects
+            .filter(selection_set=self.ss)
+            .values_list("payment_method_id", "enabled", "is_active")
+        }
+
+    def _seed(self, *payment_methods):
+        SelectionSetPaymentMethod.objects.bulk_create([
+            SelectionSetPaymentMethod(selection_set=self.ss, payment_method=pm, enabled=True)
+            for pm in payment_methods
+        ])
+
+    def test_inserts_updates_and_deletes(self):
+        self._seed(self.pay_a, self.pay_b)
+
+        delta = self._apply({
+            self.pay_a.id: {"enabled": True, "is_active": True},
+            self.pay_b.id: {"enabled": True, "is_active": False},
+            self.pay_c.id: {"enabled": True, "is_active": True},
+        })
+
+        self.assertEqual(delta, TableDelta(inserted=1, updated=1, deleted=0))
+        self.assertEqual(self._rows(), {
+            self.pay_a.id: (True, True),
+            self.pay_b.id: (True, False),
+            self.pay_c.id: (True, True),
+        })
+
+        delta = self._apply({self.pay_c.id: {"enabled": True, "is_active": True}})
+        self.assertEqual(delta, TableDelta(inserted=0, updated=0, deleted=2))
+        self.assertEqual(self._rows(), {self.pay_c.id: (True, True)})
+
+    def test_unchanged_rows_write_nothing(self):
+        self._seed(self.pay_a)
+        desired = {self.pay_a.id: {"enabled": True, "is_active": True}}
+
+        with self.assertNumQueries(1):
+            delta = self._apply(desired)
+
+        self.assertEqual(delta, TableDelta())
+        self.assertEqual(delta.changed, 0)
+
+    def test_scope_leaves_rows_outside_untouched(self):
+        self._seed(self.pay_a, self.pay_b)
+
+        delta = self._apply(
+            {self.pay_c.id: {"enabled": True, "is_active": True}},
+            scope_ids={self.pay_b.id, self.pay_c.id},
+        )
+
+        self.assertEqual(delta, TableDelta(inserted=1, updated=0, deleted=1))
+        self.assertEqual(set(self._rows()), {self.pay_a.id, self.pay_c.id})
+
+    def test_desired_outside_scope_is_ignored(self):
+        delta = self._apply(
+            {self.pay_a.id: {"enabled": True, "is_active": True}},
+            scope_ids={self.pay_b.id},
+        )
+
+        self.assertEqual(delta, TableDelta())
+        self.assertEqual(self._rows(), {})
+
+    def test_empty_scope_is_a_noop(self):
+        self._seed(self.pay_a)
+
+        with self.assertNumQueries(0):
+            delta = self._apply({}, scope_ids=set())
+
+        self.assertEqual(delta, TableDelta())
+        self.assertEqual(set(self._rows()), {self.pay_a.id})
+
+
+class GlobalsDeltaFormTests(TestCase):
+    """Validación del envío compacto (JSON) del Step 4."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ap_bool = ActionPermission.objects.create(
+            group="Ventas", action="Anular", value_type=ActionValueType.BOOL)
+        cls.ap_pct = ActionPermission.objects.create(
+            group="Ventas", action="Descuento", value_type=ActionValueType.PERCENT)
+        cls.ap_int = ActionPermission.objects.create(
+            group="Ventas", action="Cuotas", value_type=ActionValueType.INT)
+        cls.ap_hidden = ActionPermission.objects.create(
+            group="Compras", action="Aprobar", value_type=ActionValueType.BOOL)
+        cls.mp = MatrixPermission.objects.create(name="Pedidos")
+        cls.pay = PaymentMethodPermission.objects.create(name="Efectivo")
+
+    def _form(self, rows) -> GlobalsDeltaForm:
+        catalog = DeltaCatalog(
+            actions={ap.id: ap for ap in (self.ap_bool, self.ap_pct, self.ap_int)},
+            matrix={self.mp.id: self.mp},
+            payments={self.pay.id: self.pay},
+        )
+        payload = rows if isinstance(rows, str) else json.dumps(rows)
+        return GlobalsDeltaForm(data={"globals_delta": payload}, catalogs={"GLOBAL": catalog})
+
+    def _errors(self, form) -> list[str]:
+        self.assertFalse(form.is_valid())
+        return form.errors["globals_delta"]
+
+    def test_valid_rows_are_grouped_by_block_and_section(self):
+        form = self._form([
+            {"block": "GLOBAL", "section": "actions", "id": self.ap_bool.id, "value": True},
+            {"block": "GLOBAL", "section": "actions", "id": self.ap_pct.id, "value": "12.5"},
+            {"block": "GLOBAL", "section": "actions", "id": self.ap_int.id, "value": None},
+            {"block": "GLOBAL", "section": "matrix", "id": self.mp.id,
+             "value": {"can_create": True, "can_close": "yes"}},
+            {"block": "GLOBAL", "section": "payments", "id": self.pay.id, "value": False},
+        ])
+
+        self.assertTrue(form.is_valid(), form.errors)
+        delta = form.cleaned_data["globals_delta"]
+        self.assertEqual(set(delta), {"GLOBAL"})
+        actions = delta["GLOBAL"]["actions"]
+        self.assertIs(actions[self.ap_bool.id]["value_bool"], True)
+        self.assertEqual(actions[self.ap_pct.id]["value_decimal"], Decimal("12.5"))
+        self.assertIsNone(actions[self.ap_int.id]["value_int"])
+        matrix = delta["GLOBAL"]["matrix"][self.mp.id]
+        self.assertIs(matrix["can_create"], True)
+        self.assertIs(matrix["can_close"], False)
+        self.assertEqual(delta["GLOBAL"]["payments"], {self.pay.id: {"enabled": False}})
+
+    def test_percent_out_of_range(self):
+        form = self._form([
+            {"block": "GLOBAL", "section": "actions", "id": self.ap_pct.id, "value": 150},
+        ])
+        errors = self._errors(form)
+        self.assertEqual(len(errors), 1)
+        self.assertIn("Porcentaje fuera de rango (0–100).", errors[0])
+
+    def test_non_boolean_value_for_bool_action(self):
+        form = self._form([
+            {"block": "GLOBAL", "section": "actions", "id": self.ap_bool.id, "value": "sí"},
+        ])
+        self.assertEqual(self._errors(form), ["Ventas / Anular: valor inválido."])
+
+    def test_ids_outside_visible_catalog_are_rejected(self):
+        cases = [
+            ({"section": "actions", "id": self.ap_hidden.id, "value": True}, "Acción inválida."),
+            ({"section": "matrix", "id": self.mp.id + 1000, "value": {}}, "Permiso de matriz inválido."),
+            ({"section": "matrix", "id": self.mp.id, "value": True}, "Permiso de matriz inválido."),
+            ({"section": "payments", "id": self.pay.id + 1000, "value": True}, "Medio de pago inválido."),
+            ({"section": "payments", "id": self.pay.id, "value": "on"}, "Medio de pago inválido."),
+        ]
+        for row, message in cases:
+            with self.subTest(row=row):
+                form = self._form([{"block": "GLOBAL", **row}])
+                self.assertEqual(self._errors(form), [message])
+
+    def test_malformed_payload(self):
+        cases = [
+            "{no es json",
+            json.dumps({"block": "GLOBAL"}),
+            json.dumps([{"block": "GLOBAL", "section": "actions"}]),
+            json.dumps([{"block": "GLOBAL", "section": "actions", "id": "x"}]),
+            json.dumps([{"block": "999", "section": "payments", "id": self.pay.id, "value": True}]),
+            json.dumps([{"block": "GLOBAL", "section": "modules", "id": 1, "value": True}]),
+        ]
+        for payload in cases:
+            with self.subTest(payload=payload):
+                self.assertEqual(self._errors(self._form(payload)), ["Envío inválido."])
 
-# Create your tests here.
+    def test_too_many_rows(self):
+        row = {"block": "GLOBAL", "section": "payments", "id": self.pay.id, "value": True}
+        form = self._form([row] * (DELTA_MAX_ROWS + 1))
+        self.assertEqual(self._errors(form), ["Demasiados cambios en un solo envío."])
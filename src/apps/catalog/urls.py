@@ -5,8 +5,8 @@ from apps.catalog.views.wizard.step_0_start import WizardStep0StartView
 from apps.catalog.views.wizard.step_1_person import WizardStep1PersonView
 from apps.catalog.views.wizard.step_2_companies import WizardStep2CompaniesView
 from apps.catalog.views.wizard.step_3_modules import WizardStep3ModulesView
-from apps.catalog.views.wizard.step_4_globals import WizardStep4GlobalsView
-from apps.catalog.views.wizard.step_5_scoped import WizardStep5ScopedView
+from apps.catalog.views.wizard.step_4_globals import WizardStep4GlobalsView, WizardStep4SectionView
+from apps.catalog.views.wizard.step_5_scoped import WizardStep5ScopedView, WizardStep5OptionsView
 from apps.catalog.views.wizard.step_6_review import WizardStep6ReviewView
 from apps.catalog.views.requests import RequestSubmittedView, RequestDetailView
 from apps.catalog.views.request_list import RequestListView
@@ -37,8 +37,12 @@ urlpatterns = [
          name="wizard_step_3_modules"),
     path("wizard/globals/", WizardStep4GlobalsView.as_view(),
          name="wizard_step_4_globals"),
+    path("wizard/globals/section/", WizardStep4SectionView.as_view(),
+         name="wizard_step_4_section"),
     path("wizard/scoped/", WizardStep5ScopedView.as_view(),
          name="wizard_step_5_scoped"),
+    path("wizard/scoped/options/<str:kind>/<int:owner_id>/", WizardStep5OptionsView.as_view(),
+         name="wizard_step_5_options"),
     path("wizard/review/", WizardStep6ReviewView.as_view(),
          name="wizard_step_6_review"),
     # confirmación de envío
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from apps.catalog.services.keyset_pagination import (
+    DEFAULT_COUNT_CAP,
+    KeysetPaginator,
+    capped_count,
+)
+
+
+CURSOR_PARAM = "cursor"
+
+
+class KeysetPaginationMixin:
+    """
+    Para ListView: pagina por cursor (?cursor=<token>) cuando keyset_enabled();
+    si no (p.ej. búsqueda ordenada por relevancia) usa la paginación de Django.
+
+    Contexto extra: `keyset` (bool), `cursor_param` y, si keyset_count_cap,
+    `approx_count` / `approx_count_capped`.
+    """
+    keyset_salt: str = ""
+    # None = sin conteo
+    keyset_count_cap: int | None = DEFAULT_COUNT_CAP
+
+    def keyset_enabled(self) -> bool:
+        return True
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_enabled():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, salt=self.keyset_salt)
+        page = paginator.page(self.request.GET.get(CURSOR_PARAM, ""))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["keyset"] = self.keyset_enabled()
+        ctx["cursor_param"] = CURSOR_PARAM
+        if ctx["keyset"] and self.keyset_count_cap:
+            ctx["approx_count"], ctx["approx_count_capped"] = capped_count(
+                self.object_list, self.keyset_count_cap
+            )
+        return ctx
@@ -10,39 +10,22 @@ from django.views import View
 from apps.catalog.models.permissions.scoped import Company
 from apps.catalog.models.selections import PermissionSelectionSet
 from apps.catalog.models.templates import AccessTemplate, AccessTemplateItem
+from apps.catalog.views.wizard.base import WizardStateMixin
 
 TEMPLATE_WIZARD_SESSION_KEY = "catalog_template_wizard"
 
 
-class TemplateWizardBaseView(LoginRequiredMixin, View):
+class TemplateWizardBaseView(LoginRequiredMixin, WizardStateMixin, View):
     step: int = 0
     total_steps: int = 3
     progress_percent: int = 0
+    state_namespace = TEMPLATE_WIZARD_SESSION_KEY
 
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_staff and not request.user.is_superuser:
             raise PermissionDenied
         return super().dispatch(request, *args, **kwargs)
 
-    def get_wizard(self, request: HttpRequest) -> dict:
-        return request.session.get(TEMPLATE_WIZARD_SESSION_KEY, {})
-
-    def set_wizard(self, request: HttpRequest, data: dict) -> None:
-        request.session[TEMPLATE_WIZARD_SESSION_KEY] = data
-        request.session.modified = True
-
-    def clear_wizard(self, request: HttpRequest) -> None:
-        request.session.pop(TEMPLATE_WIZARD_SESSION_KEY, None)
-        request.session.modified = True
-
-    def wizard_context(self, **extra):
-        return {
-            "step": self.step,
-            "total_steps": self.total_steps,
-            "progress_percent": self.progress_percent,
-            **extra,
-        }
-
     def redirect_to(self, name: str):
         return redirect(reverse(name))
 
@@ -83,9 +83,11 @@ class TemplateWizardStep0StartView(TemplateWizardBaseView):
             form.add_error(None, ensure_error)
             return render(request, self.template_name, self._context(request, form))
 
-        wizard["template_id"] = tmpl_id
-        wizard.setdefault("is_editing", False)
-        self.set_wizard(request, wizard)
+        self.update_wizard(
+            request,
+            template_id=tmpl_id,
+            is_editing=bool(wizard.get("is_editing", False)),
+        )
 
         messages.info(request, "Metadatos del modelo guardados.")
         return self.redirect_to("catalog:template_wizard_modules")
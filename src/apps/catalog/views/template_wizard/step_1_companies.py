@@ -94,11 +94,12 @@ class TemplateWizardStep1CompaniesView(TemplateWizardBaseView):
             ss = PermissionSelectionSet.objects.create(company=company, branch=None)
             AccessTemplateItem.objects.create(template=tmpl, selection_set=ss, order=order)
 
-        wizard = self.get_wizard(request)
-        wizard["company_ids"] = [c.id for c in companies]
-        wizard["branch_ids"] = [b.id for b in branches]
-        wizard["same_modules_for_all"] = same_modules_for_all
-        self.set_wizard(request, wizard)
+        self.update_wizard(
+            request,
+            company_ids=[c.id for c in companies],
+            branch_ids=[b.id for b in branches],
+            same_modules_for_all=same_modules_for_all,
+        )
 
         messages.success(request, "Empresas guardadas.")
         return self.redirect_to("catalog:template_wizard_modules")
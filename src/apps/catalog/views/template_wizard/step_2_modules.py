@@ -7,11 +7,11 @@ from django.shortcuts import render
 
 from apps.catalog.forms.step_3_modules import Step3ModulesForm
 from apps.catalog.forms.helpers import (
-    set_selection_set_modules,
-    set_selection_set_sublevels,
-    active_sublevels_for_modules,
+    set_modules_and_sublevels_bulk,
+    active_sublevel_ids_for_modules,
+    filter_active_sublevel_ids,
+    selected_sublevel_ids_by_set,
 )
-from apps.catalog.models.modules import ErpModuleSubLevel
 from apps.catalog.models.templates import AccessTemplate
 from apps.catalog.views.wizard.step_3_modules import build_module_tree
 
@@ -43,11 +43,10 @@ class TemplateWizardStep2ModulesView(TemplateWizardBaseView):
         ss = item.selection_set
         module_tree = build_module_tree()
         selected_module_ids = list(ss.modules.values_list("id", flat=True))
-        current_sub_ids = list(ss.sublevels.values_list("sublevel_id", flat=True))
+        current_sub_ids = selected_sublevel_ids_by_set([ss])[ss.pk]
         selected_sublevel_ids = (
             {str(x) for x in current_sub_ids} if current_sub_ids
-            else {str(s.id) for s in active_sublevels_for_modules(
-                list(ss.modules.filter(is_active=True).all()))}
+            else {str(x) for x in active_sublevel_ids_for_modules(selected_module_ids)}
         )
         form = Step3ModulesForm(initial={"modules": selected_module_ids})
         return render(request, self.template_name, self.wizard_context(
@@ -79,16 +78,11 @@ class TemplateWizardStep2ModulesView(TemplateWizardBaseView):
             ))
 
         modules = list(form.cleaned_data["modules"])
-        set_selection_set_modules(ss, modules)
         if refine_enabled:
-            sub_ids = request.POST.getlist("sublevels")
-            sublevels = list(ErpModuleSubLevel.objects.filter(
-                id__in=sub_ids, is_active=True,
-                level__is_active=True, level__module__is_active=True,
-            ))
-            set_selection_set_sublevels(ss, sublevels)
+            sub_ids = filter_active_sublevel_ids(request.POST.getlist("sublevels"))
         else:
-            set_selection_set_sublevels(ss, active_sublevels_for_modules(modules))
+            sub_ids = active_sublevel_ids_for_modules(modules)
+        set_modules_and_sublevels_bulk([(ss, modules, sub_ids)])
 
         messages.success(request, "Módulos guardados.")
         return self.redirect_to("catalog:template_wizard_globals")
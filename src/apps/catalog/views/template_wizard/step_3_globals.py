@@ -7,6 +7,7 @@ from django.shortcuts import render
 
 from apps.catalog.forms.helpers_globals import save_globals_for_selection_set
 from apps.catalog.forms.step_4_globals import ActionValueFormSet, MatrixFormSet, PaymentFormSet
+from apps.catalog.forms.visibility import resolve_globals_scopes
 from apps.catalog.models.permissions.global_ops import (
     ActionPermission, MatrixPermission, PaymentMethodPermission,
 )
@@ -18,10 +19,13 @@ from apps.catalog.models.templates import AccessTemplate
 from .base import TemplateWizardBaseView
 
 
-def _active_catalogs():
-    actions = list(ActionPermission.objects.filter(is_active=True).order_by("group", "action"))
-    matrix = list(MatrixPermission.objects.filter(is_active=True).order_by("name"))
-    payments = list(PaymentMethodPermission.objects.filter(is_active=True).order_by("name"))
+def _active_catalogs(selection_set):
+    """Catálogos activos recortados a los bloques visibles para la selección del template."""
+    scope = resolve_globals_scopes([selection_set])[selection_set.pk]
+    actions = scope.actions(ActionPermission.objects.filter(is_active=True).order_by("group", "action"))
+    # Los querysets solo se evalúan si el bloque está visible
+    matrix = scope.matrix_perms(MatrixPermission.objects.filter(is_active=True).order_by("name"))
+    payments = scope.payment_methods(PaymentMethodPermission.objects.filter(is_active=True).order_by("name"))
     return actions, matrix, payments
 
 
@@ -107,9 +111,9 @@ class TemplateWizardStep3GlobalsView(TemplateWizardBaseView):
             messages.warning(request, ensure_error or "No se pudo inicializar el template.")
             return self.redirect_to("catalog:template_wizard_start")
 
-        actions, matrix, payments = _active_catalogs()
-        action_groups = sorted({a.group for a in actions})
         ss = item.selection_set
+        actions, matrix, payments = _active_catalogs(ss)
+        action_groups = sorted({a.group for a in actions})
         a_fs, m_fs, p_fs = _build_formsets(ss, actions, matrix, payments)
         return render(request, self.template_name, self.wizard_context(
             template_obj=tmpl, mode="GLOBAL", items=[item],
@@ -133,7 +137,7 @@ class TemplateWizardStep3GlobalsView(TemplateWizardBaseView):
             messages.warning(request, ensure_error or "No se pudo inicializar el template.")
             return self.redirect_to("catalog:template_wizard_start")
 
-        actions, matrix, payments = _active_catalogs()
+        actions, matrix, payments = _active_catalogs(item.selection_set)
         action_groups = sorted({a.group for a in actions})
         actions_by_id = {a.id: a for a in actions}
         matrix_by_id = {m.id: m for m in matrix}
@@ -171,6 +175,9 @@ class TemplateWizardStep3GlobalsView(TemplateWizardBaseView):
             ))
 
         ai, mi, pi = parse_formsets(a_fs, m_fs, p_fs)
-        save_globals_for_selection_set(item.selection_set, action_items=ai, matrix_items=mi, payment_items=pi)
+        save_globals_for_selection_set(
+            item.selection_set, action_items=ai, matrix_items=mi, payment_items=pi,
+            action_ids=actions_by_id, matrix_ids=matrix_by_id, payment_ids=pay_by_id,
+        )
         messages.success(request, "Permisos globales guardados.")
         return self.redirect_to("catalog:template_wizard_review")
@@ -8,7 +8,7 @@ from django.db import transaction
 from django.shortcuts import render
 
 from apps.catalog.forms.helpers import clone_selection_set
-from apps.catalog.forms.step_5_scoped import CompanyScopedForm, BranchScopedForm
+from apps.catalog.forms.step_5_scoped import BranchScopedForm, CompanyScopedForm, ScopedIdValidator
 from apps.catalog.models.selections import (
     PermissionSelectionSet,
     SelectionSetWarehouse,
@@ -17,6 +17,8 @@ from apps.catalog.models.selections import (
     SelectionSetSeller,
 )
 from apps.catalog.models.templates import AccessTemplate, AccessTemplateItem
+from apps.catalog.services.fingerprints import refresh_global_fingerprints
+from apps.catalog.services.scoped_options import scoped_options_version
 
 from .base import TemplateWizardBaseView
 
@@ -38,6 +40,12 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
             by_company[it.selection_set.company_id].append(it)
         return by_company
 
+    def _scoped_forms(self, companies_blocks) -> list:
+        return (
+            [b["company_form"] for b in companies_blocks]
+            + [bb["form"] for b in companies_blocks for bb in b["branches_blocks"]]
+        )
+
     def _company_initial(self, items_for_company):
         ss = items_for_company[0].selection_set
         return {
@@ -95,8 +103,12 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
                 "branches_blocks": branches_blocks,
             })
 
+        # Names of the checked options: one query per entity
+        ScopedIdValidator(self._scoped_forms(companies_blocks))
+
         return render(request, self.template_name, self.wizard_context(
             template_obj=tmpl, companies_blocks=companies_blocks,
+            options_version=scoped_options_version(),
         ))
 
     @transaction.atomic
@@ -114,15 +126,12 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
         selected_branch_ids = set(wizard.get("branch_ids") or [])
         grouped = self._group_items(items)
         companies_blocks = []
-        ok = True
 
         for company_id, items_for_company in grouped.items():
             company = items_for_company[0].selection_set.company
             company_form = CompanyScopedForm(
                 data=request.POST, prefix=f"c_{company_id}", company=company,
             )
-            if not company_form.is_valid():
-                ok = False
 
             branches_blocks = []
             for branch in company.branches.filter(
@@ -132,8 +141,6 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
                     prefix=f"b_{branch.id}_c_{company_id}",
                     branch=branch,
                 )
-                if not branch_form.is_valid():
-                    ok = False
                 branches_blocks.append({"branch": branch, "form": branch_form})
 
             companies_blocks.append({
@@ -143,9 +150,11 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
                 "items_for_company": items_for_company,
             })
 
+        ok = ScopedIdValidator(self._scoped_forms(companies_blocks)).is_valid()
         if not ok:
             return render(request, self.template_name, self.wizard_context(
                 template_obj=tmpl, companies_blocks=companies_blocks,
+                options_version=scoped_options_version(),
             ))
 
         # Persist
@@ -154,10 +163,8 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
             company_form: CompanyScopedForm = block["company_form"]
             items_for_company = block["items_for_company"]
 
-            panels_qs = company_form.cleaned_data.get("control_panels")
-            sellers_qs = company_form.cleaned_data.get("sellers")
-            panel_ids = list(panels_qs.values_list("id", flat=True)) if panels_qs else []
-            seller_ids = list(sellers_qs.values_list("id", flat=True)) if sellers_qs else []
+            panel_ids = company_form.cleaned_data.get("control_panels") or []
+            seller_ids = company_form.cleaned_data.get("sellers") or []
 
             # Base item for this company (without branch)
             base_item = next(
@@ -181,6 +188,7 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
                     SelectionSetSeller(selection_set=base_ss, seller_id=sid)
                     for sid in seller_ids
                 ])
+            refresh_global_fingerprints([base_ss])
 
             # Remove existing branch-level items and recreate
             old_branch_items = [it for it in items_for_company if it.selection_set.branch_id]
@@ -212,10 +220,8 @@ class TemplateWizardStep4ScopedView(TemplateWizardBaseView):
                     if bb["branch"].id != branch.id:
                         continue
                     bf: BranchScopedForm = bb["form"]
-                    wh_qs = bf.cleaned_data.get("warehouses")
-                    cr_qs = bf.cleaned_data.get("cash_registers")
-                    wh_ids = list(wh_qs.values_list("id", flat=True)) if wh_qs else []
-                    cr_ids = list(cr_qs.values_list("id", flat=True)) if cr_qs else []
+                    wh_ids = bf.cleaned_data.get("warehouses") or []
+                    cr_ids = bf.cleaned_data.get("cash_registers") or []
                     if wh_ids:
                         SelectionSetWarehouse.objects.bulk_create([
                             SelectionSetWarehouse(selection_set=new_ss, warehouse_id=wid)
@@ -1,53 +1,108 @@
 from __future__ import annotations
 
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
+from django.utils.cache import add_never_cache_headers
 from django.views import View
 
 from apps.catalog.models import AccessRequest
 from apps.catalog.models.requests import RequestKind, RequestStatus
+from apps.catalog.services.request_loaders import load_request
+from apps.catalog.services.wizard_state import (
+    StaleWizardState,
+    WizardStateStore,
+    get_wizard_store,
+    posted_wizard_version,
+)
 
 
 WIZARD_SESSION_KEY = "catalog_wizard"
 WIZARD_REQUEST_ID_KEY = "access_request_id"
 
 
-class WizardBaseView(LoginRequiredMixin, View):
-    step: int = 0
-    total_steps: int = 6
-    progress_percent: int = 0
+class WizardStateMixin:
+    """
+    Estado del wizard vía WizardStateStore (services/wizard_state.py).
+
+    Los forms envían la versión que vieron (hidden `wizard_version`, viene en
+    wizard_context); un POST de una pestaña vieja no se aplica: se vuelve a
+    mostrar el paso con el estado actual.
+    """
+    state_namespace: str = ""
+    stale_message = "El asistente cambió en otra pestaña. Revisá los datos y volvé a guardar."
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method == "POST":
+                expected = posted_wizard_version(request)
+                current = self.wizard_store(request).load().version
+                if expected is not None and expected != current:
+                    raise StaleWizardState(expected, current)
+            response = super().dispatch(request, *args, **kwargs)
+        except StaleWizardState:
+            messages.warning(request, self.stale_message)
+            return redirect(request.get_full_path())
+        # Sin cache del navegador: "Atrás" vuelve a pedir el paso con la versión actual
+        if request.method == "GET" and not response.has_header("Cache-Control"):
+            add_never_cache_headers(response)
+        return response
+
+    def wizard_store(self, request: HttpRequest) -> WizardStateStore:
+        return get_wizard_store(request, self.state_namespace)
 
     def get_wizard(self, request: HttpRequest) -> dict:
-        return request.session.get(WIZARD_SESSION_KEY, {})
+        return dict(self.wizard_store(request).load().data)
+
+    def update_wizard(self, request: HttpRequest, **changes) -> None:
+        """Escribe solo las claves del paso (con control de versión si el POST la trae)."""
+        self.wizard_store(request).update(changes, expected_version=posted_wizard_version(request))
 
     def set_wizard(self, request: HttpRequest, data: dict) -> None:
-        request.session[WIZARD_SESSION_KEY] = data
-        request.session.modified = True
+        """Reemplaza el estado completo (inicio de un wizard nuevo)."""
+        self.wizard_store(request).replace(data, expected_version=posted_wizard_version(request))
+
+    def clear_wizard(self, request: HttpRequest) -> None:
+        self.wizard_store(request).clear()
 
     def wizard_context(self, **extra):
         return {
             "step": self.step,
             "total_steps": self.total_steps,
             "progress_percent": self.progress_percent,
+            "wizard_version": self.wizard_store(self.request).load().version,
             **extra,
         }
 
+
+class WizardBaseView(LoginRequiredMixin, WizardStateMixin, View):
+    step: int = 0
+    total_steps: int = 6
+    progress_percent: int = 0
+    state_namespace = WIZARD_SESSION_KEY
+    # Perfil de carga del AccessRequest del paso (services/request_loaders.py)
+    request_profile: str = "person"
+
     def redirect_to(self, name: str):
         return redirect(reverse(name))
 
     # -----------------------------
     # Request actual del wizard
     # -----------------------------
+    def _get_request(self, request) -> AccessRequest:
+        req_id = self.get_wizard(request).get("request_id")
+        if not req_id:
+            raise AccessRequest.DoesNotExist
+        return load_request(req_id, self.request_profile)
+
     def get_current_request_id(self, request: HttpRequest) -> int | None:
         wiz = self.get_wizard(request)
         return wiz.get(WIZARD_REQUEST_ID_KEY)
 
     def set_current_request_id(self, request: HttpRequest, request_id: int) -> None:
-        wiz = self.get_wizard(request)
-        wiz[WIZARD_REQUEST_ID_KEY] = request_id
-        self.set_wizard(request, wiz)
+        self.update_wizard(request, **{WIZARD_REQUEST_ID_KEY: request_id})
 
     def get_current_request_obj(self, request: HttpRequest) -> AccessRequest | None:
         req_id = self.get_current_request_id(request)
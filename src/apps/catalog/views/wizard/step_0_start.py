@@ -44,20 +44,17 @@ class WizardStep0StartView(WizardBaseView):
                 ),
             )
 
-        wizard = self.get_wizard(request)
-        wizard.update(
-            {
-                "start_mode": form.cleaned_data["start_mode"],
-                "template_ids": [tpl.pk for tpl in form.cleaned_data.get("templates", [])],
-                "template_id": (
-                    form.cleaned_data["templates"][0].pk
-                    if form.cleaned_data.get("templates")
-                    else None
-                ),
-                "request_id": None,
-            }
+        self.update_wizard(
+            request,
+            start_mode=form.cleaned_data["start_mode"],
+            template_ids=[tpl.pk for tpl in form.cleaned_data.get("templates", [])],
+            template_id=(
+                form.cleaned_data["templates"][0].pk
+                if form.cleaned_data.get("templates")
+                else None
+            ),
+            request_id=None,
         )
-        self.set_wizard(request, wizard)
 
         messages.info(request, "Inicio configurado correctamente.")
         return self.redirect_to("catalog:wizard_step_1_person")
@@ -81,7 +81,6 @@ class WizardStep1PersonView(WizardBaseView):
                 req.person_data = person
                 req.save(update_fields=["person_data"])
 
-        wizard["request_id"] = req.pk
-        self.set_wizard(request, wizard)
+        self.update_wizard(request, request_id=req.pk)
 
         return self.redirect_to("catalog:wizard_step_2_companies")
@@ -14,25 +14,16 @@ from apps.catalog.models.permissions.scoped import Company, Branch
 from apps.catalog.models.requests import AccessRequest, AccessRequestItem
 from apps.catalog.models.selections import PermissionSelectionSet
 from apps.catalog.models.templates import AccessTemplate
+from apps.catalog.services.request_summary import TEMPLATE_NOTE_PREFIX, refresh_request_summary
 
 from .base import WizardBaseView
 
 
-TEMPLATE_NOTE_PREFIX = "Templates usados:"
-
-
 class WizardStep2CompaniesView(WizardBaseView):
     step = 2
     progress_percent = 40
     template_name = "catalog/wizard/step_2_companies.html"
 
-    def _get_request(self, request) -> AccessRequest:
-        wizard = self.get_wizard(request)
-        req_id = wizard.get("request_id")
-        if not req_id:
-            raise AccessRequest.DoesNotExist
-        return AccessRequest.objects.select_related("person_data").get(pk=req_id)
-
     def _context_lists(self, *, form, req):
         wizard = self.get_wizard(self.request)
         selected_company_ids = set(wizard.get("company_ids") or [])
@@ -243,11 +234,15 @@ class WizardStep2CompaniesView(WizardBaseView):
             )
             created_items += 1
 
-        wizard["company_ids"] = [company.id for company in companies]
-        wizard["branch_ids"] = [branch.id for branch in branches]
-        wizard["same_modules_for_all"] = same_modules_for_all
-        wizard["clone_model_by_company"] = clone_model_by_company
-        self.set_wizard(request, wizard)
+        refresh_request_summary(req)
+
+        self.update_wizard(
+            request,
+            company_ids=[company.id for company in companies],
+            branch_ids=[branch.id for branch in branches],
+            same_modules_for_all=same_modules_for_all,
+            clone_model_by_company=clone_model_by_company,
+        )
 
         if clone_model_by_company:
             messages.success(
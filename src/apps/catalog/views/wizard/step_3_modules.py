@@ -6,13 +6,16 @@ from django.shortcuts import render
 
 from apps.catalog.forms.step_3_modules import Step3ModulesForm
 from apps.catalog.forms.helpers import (
-    set_selection_set_modules,
-    set_selection_set_sublevels,
-    active_sublevels_for_modules,
+    set_modules_and_sublevels_bulk,
+    active_sublevel_ids_for_modules,
+    filter_active_sublevel_ids,
+    selected_sublevel_ids_by_set,
 )
-from apps.catalog.models.modules import ErpModule, ErpModuleLevel, ErpModuleSubLevel
+from apps.catalog.models.modules import ErpModule
 from apps.catalog.models.requests import AccessRequest
 from apps.catalog.models.selections import PermissionSelectionSet
+from apps.catalog.services.catalog_cache import get_module_catalog
+from apps.catalog.services.request_loaders import prefetched_ids
 
 from .base import WizardBaseView
 
@@ -23,68 +26,17 @@ def build_module_tree() -> list[dict]:
     [
       {id, name, levels:[{id,name,sublevels:[{id,name}]}]}
     ]
-    Solo activos.
+    Solo activos. Se sirve desde el snapshot versionado del catálogo
+    (services.catalog_cache); la estructura es compartida: no mutarla.
     """
-    modules = list(ErpModule.objects.filter(is_active=True).order_by("name"))
-
-    levels = list(
-        ErpModuleLevel.objects.filter(is_active=True, module__is_active=True)
-        .select_related("module")
-        .order_by("module__name", "name")
-    )
-    sublevels = list(
-        ErpModuleSubLevel.objects.filter(
-            is_active=True, level__is_active=True, level__module__is_active=True
-        )
-        .select_related("level", "level__module")
-        .order_by("level__module__name", "level__name", "name")
-    )
-
-    levels_by_module: dict[int, list[ErpModuleLevel]] = {}
-    for lvl in levels:
-        levels_by_module.setdefault(lvl.module_id, []).append(lvl)
-
-    subs_by_level: dict[int, list[ErpModuleSubLevel]] = {}
-    for s in sublevels:
-        subs_by_level.setdefault(s.level_id, []).append(s)
-
-    tree: list[dict] = []
-    for m in modules:
-        m_levels = []
-        for lvl in levels_by_module.get(m.id, []):
-            m_levels.append(
-                {
-                    "id": lvl.id,
-                    "name": lvl.name,
-                    "sublevels": [{"id": s.id, "name": s.name} for s in subs_by_level.get(lvl.id, [])],
-                }
-            )
-        tree.append({"id": m.id, "name": m.name, "levels": m_levels})
-
-    return tree
+    return list(get_module_catalog().tree)
 
 
 class WizardStep3ModulesView(WizardBaseView):
     step = 3
     progress_percent = 60
     template_name = "catalog/wizard/step_3_modules.html"
-
-    def _get_request(self, request) -> AccessRequest:
-        wizard = self.get_wizard(request)
-        req_id = wizard.get("request_id")
-        if not req_id:
-            raise AccessRequest.DoesNotExist
-        return (
-            AccessRequest.objects
-            .select_related("person_data")
-            .prefetch_related(
-                "items__selection_set__company",
-                "items__selection_set__branch",
-                "items__selection_set__modules",
-                "items__selection_set__sublevels__sublevel",
-            )
-            .get(pk=req_id)
-        )
+    request_profile = "modules"
 
     def get(self, request):
         try:
@@ -92,7 +44,7 @@ class WizardStep3ModulesView(WizardBaseView):
         except AccessRequest.DoesNotExist:
             return self.redirect_to("catalog:wizard_step_1_person")
 
-        items = list(req.items.all().order_by("order", "id"))
+        items = list(req.items.all())
         if not items:
             messages.warning(request, "Primero definí empresas y sucursales.")
             return self.redirect_to("catalog:wizard_step_2_companies")
@@ -102,18 +54,16 @@ class WizardStep3ModulesView(WizardBaseView):
         if req.same_modules_for_all:
             ss = items[0].selection_set
 
-            selected_module_ids = list(ss.modules.values_list("id", flat=True))
+            selected_module_ids = prefetched_ids(ss.modules)
 
-            # Si ya existen subniveles guardados, usarlos; si no, derivar default desde módulos actuales
-            current_sub_ids = list(
-                ss.sublevels.values_list("sublevel_id", flat=True))
+            # Si ya existen subniveles guardados (explícitos o include_all), usarlos;
+            # si no, derivar default desde módulos actuales
+            current_sub_ids = selected_sublevel_ids_by_set([ss])[ss.pk]
             if current_sub_ids:
                 selected_sublevel_ids = {str(x) for x in current_sub_ids}
             else:
-                mods = list(ErpModule.objects.filter(
-                    id__in=selected_module_ids, is_active=True))
                 selected_sublevel_ids = {
-                    str(s.id) for s in active_sublevels_for_modules(mods)}
+                    str(x) for x in active_sublevel_ids_for_modules(selected_module_ids)}
 
             form = Step3ModulesForm(initial={"modules": selected_module_ids})
 
@@ -132,18 +82,16 @@ class WizardStep3ModulesView(WizardBaseView):
 
         # PER_ITEM: forms por item + selected_sublevels por item
         forms_by_item = []
+        sub_ids_by_set = selected_sublevel_ids_by_set([it.selection_set for it in items])
         for it in items:
             ss = it.selection_set
-            selected_module_ids = list(ss.modules.values_list("id", flat=True))
-            current_sub_ids = list(
-                ss.sublevels.values_list("sublevel_id", flat=True))
+            selected_module_ids = prefetched_ids(ss.modules)
+            current_sub_ids = sub_ids_by_set[ss.pk]
             if current_sub_ids:
                 selected_sub_ids = {str(x) for x in current_sub_ids}
             else:
-                mods = list(ErpModule.objects.filter(
-                    id__in=selected_module_ids, is_active=True))
-                selected_sub_ids = {str(s.id)
-                                    for s in active_sublevels_for_modules(mods)}
+                selected_sub_ids = {
+                    str(x) for x in active_sublevel_ids_for_modules(selected_module_ids)}
 
             forms_by_item.append(
                 {
@@ -172,7 +120,7 @@ class WizardStep3ModulesView(WizardBaseView):
         except AccessRequest.DoesNotExist:
             return self.redirect_to("catalog:wizard_step_1_person")
 
-        items = list(req.items.all().order_by("order", "id"))
+        items = list(req.items.all())
         if not items:
             return self.redirect_to("catalog:wizard_step_2_companies")
 
@@ -199,25 +147,17 @@ class WizardStep3ModulesView(WizardBaseView):
                 )
 
             modules = list(form.cleaned_data["modules"])
-            for it in items:
-                set_selection_set_modules(it.selection_set, modules)
-
-                if refine_enabled:
-                    sub_ids = request.POST.getlist("sublevels")
-                    sublevels = list(
-                        ErpModuleSubLevel.objects.filter(
-                            id__in=sub_ids,
-                            is_active=True,
-                            level__is_active=True,
-                            level__module__is_active=True,
-                        )
-                    )
-                    # Normalización: si refinó, guardamos exactamente lo seleccionado
-                    set_selection_set_sublevels(it.selection_set, sublevels)
-                else:
-                    # Default: módulo seleccionado => todo subnivel del módulo
-                    sublevels = active_sublevels_for_modules(modules)
-                    set_selection_set_sublevels(it.selection_set, sublevels)
+            if refine_enabled:
+                # Normalización: si refinó, guardamos exactamente lo seleccionado
+                sublevels = filter_active_sublevel_ids(
+                    request.POST.getlist("sublevels"))
+            else:
+                # Default: módulo seleccionado => todo subnivel del módulo
+                sublevels = active_sublevel_ids_for_modules(modules)
+
+            set_modules_and_sublevels_bulk(
+                (it.selection_set, modules, sublevels) for it in items
+            )
 
             messages.success(
                 request, "Módulos (y detalle) guardados para todas las empresas.")
@@ -259,24 +199,17 @@ class WizardStep3ModulesView(WizardBaseView):
                 ),
             )
 
+        assignments = []
         for it in items:
             modules = cleaned_modules[it.id]
-            set_selection_set_modules(it.selection_set, modules)
-
             if refine_enabled:
-                sub_ids = posted_sublevel_ids_by_item[it.id]
-                sublevels = list(
-                    ErpModuleSubLevel.objects.filter(
-                        id__in=sub_ids,
-                        is_active=True,
-                        level__is_active=True,
-                        level__module__is_active=True,
-                    )
-                )
-                set_selection_set_sublevels(it.selection_set, sublevels)
+                sublevels = filter_active_sublevel_ids(
+                    posted_sublevel_ids_by_item[it.id])
             else:
-                sublevels = active_sublevels_for_modules(modules)
-                set_selection_set_sublevels(it.selection_set, sublevels)
+                sublevels = active_sublevel_ids_for_modules(modules)
+            assignments.append((it.selection_set, modules, sublevels))
+
+        set_modules_and_sublevels_bulk(assignments)
 
         messages.success(request, "Módulos guardados por empresa/sucursal.")
         return self.redirect_to("catalog:wizard_step_4_globals")
@@ -1,13 +1,36 @@
 from __future__ import annotations
 
-from collections import defaultdict
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import cached_property
+from urllib.parse import urlencode
 
 from django.contrib import messages
 from django.db import transaction
+from django.http import Http404
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.text import slugify
 
 from apps.catalog.forms.helpers_globals import save_globals_for_selection_set
-from apps.catalog.forms.step_4_globals import ActionValueFormSet, MatrixFormSet, PaymentFormSet
+from apps.catalog.forms.step_4_globals import (
+    DELTA_FIELD,
+    MATRIX_FLAGS,
+    SECTION_ACTIONS,
+    SECTION_MATRIX,
+    SECTION_PAYMENTS,
+    SECTIONS,
+    STALE_SECTION_ERROR,
+    ActionValueFormSet,
+    DeltaCatalog,
+    GlobalsDeltaForm,
+    MatrixFormSet,
+    PaymentFormSet,
+    delta_row_values,
+    formset_data,
+)
+from apps.catalog.forms.visibility import GlobalsScope, resolve_globals_scopes
 from apps.catalog.models.permissions.global_ops import ActionPermission, MatrixPermission, PaymentMethodPermission
 from apps.catalog.models.requests import AccessRequest
 from apps.catalog.models.selections import (
@@ -19,437 +42,554 @@ from apps.catalog.models.selections import (
 from .base import WizardBaseView
 
 
-class WizardStep4GlobalsView(WizardBaseView):
-    step = 4
-    progress_percent = 80
-    template_name = "catalog/wizard/step_4_globals.html"
-
-    def _get_request(self, request) -> AccessRequest:
-        wizard = self.get_wizard(request)
-        req_id = wizard.get("request_id")
-        if not req_id:
-            raise AccessRequest.DoesNotExist
-        return (
-            AccessRequest.objects
-            .select_related("person_data")
-            .prefetch_related(
-                "items__selection_set__company",
-                "items__selection_set__branch",
-            )
-            .get(pk=req_id)
+# Las acciones se parten en una sección por grupo (tab); ver SECTIONS en forms/step_4_globals.py.
+# Bloque único cuando same_modules_for_all (se aplica a todos los items)
+GLOBAL_BLOCK = "GLOBAL"
+
+_ACTION_VALUE_FIELDS = ("value_bool", "value_int", "value_decimal", "value_text")
+
+# Campo con el id de catálogo en cada fila, por sección
+_ID_FIELDS = {
+    SECTION_ACTIONS: "action_permission_id",
+    SECTION_MATRIX: "permission_id",
+    SECTION_PAYMENTS: "payment_method_id",
+}
+
+
+def _group_key(group: str) -> str:
+    """
+    Identificador estable de un grupo de acciones (prefijo del formset y
+    ?group= del parcial): no depende de qué otros grupos estén visibles.
+    """
+    digest = hashlib.sha1(group.encode("utf-8")).hexdigest()[:8]
+    return f"{slugify(group).replace('-', '_')[:40]}_{digest}"
+
+
+class _Catalogs:
+    """Catálogos activos del Step 4; cada uno se consulta recién cuando se usa."""
+
+    @cached_property
+    def actions(self) -> list[ActionPermission]:
+        return list(ActionPermission.objects.filter(is_active=True).order_by("group", "action"))
+
+    @cached_property
+    def matrix(self) -> list[MatrixPermission]:
+        return list(MatrixPermission.objects.filter(is_active=True).order_by("name"))
+
+    @cached_property
+    def payments(self) -> list[PaymentMethodPermission]:
+        return list(PaymentMethodPermission.objects.filter(is_active=True).order_by("name"))
+
+
+@dataclass
+class _Block:
+    """
+    Un bloque de la página: GLOBAL (mismos globales para todos los items) o un item
+    (PER_ITEM). Conoce sus prefijos y el catálogo recortado a los bloques visibles.
+    """
+    key: str
+    item: object
+    scope: GlobalsScope
+    catalogs: _Catalogs
+    prefix_actions: str
+    prefix_matrix: str
+    prefix_payments: str
+
+    @property
+    def selection_set(self):
+        return self.item.selection_set
+
+    @cached_property
+    def action_groups(self) -> list[tuple[str, list[ActionPermission]]]:
+        groups: dict[str, list[ActionPermission]] = {}
+        for ap in self.scope.actions(self.catalogs.actions):
+            groups.setdefault(ap.group, []).append(ap)
+        return sorted(groups.items())
+
+    @cached_property
+    def action_groups_by_key(self) -> dict[str, tuple[str, list[ActionPermission]]]:
+        """{_group_key(grupo): (grupo, acciones)}, en el orden de los tabs."""
+        return {_group_key(name): (name, aps) for name, aps in self.action_groups}
+
+    @cached_property
+    def matrix(self) -> list[MatrixPermission]:
+        return self.catalogs.matrix if self.scope.matrix else []
+
+    @cached_property
+    def payments(self) -> list[PaymentMethodPermission]:
+        return self.catalogs.payments if self.scope.payments else []
+
+    def prefix(self, kind: str, group: str | None = None) -> str:
+        if kind == SECTION_ACTIONS:
+            return f"{self.prefix_actions}_{group}"
+        if kind == SECTION_MATRIX:
+            return self.prefix_matrix
+        return self.prefix_payments
+
+    def section_keys(self) -> list[tuple[str, str | None]]:
+        """(kind, group_key) de cada sección del bloque, en orden de página."""
+        keys: list[tuple[str, str | None]] = [
+            (SECTION_ACTIONS, key) for key in self.action_groups_by_key]
+        if self.matrix:
+            keys.append((SECTION_MATRIX, None))
+        if self.payments:
+            keys.append((SECTION_PAYMENTS, None))
+        return keys
+
+    def section_label(self, kind: str, group: str | None = None) -> str:
+        if kind == SECTION_ACTIONS:
+            return self.action_groups_by_key[group][0]
+        return "Matriz de permisos" if kind == SECTION_MATRIX else "Medios de pago"
+
+    def catalog_for(self, kind: str, group: str | None = None) -> list:
+        if kind == SECTION_ACTIONS:
+            return self.action_groups_by_key[group][1]
+        if kind == SECTION_MATRIX:
+            return self.matrix
+        return self.payments
+
+    @cached_property
+    def delta_catalog(self) -> DeltaCatalog:
+        return DeltaCatalog(
+            actions={ap.id: ap for _, aps in self.action_groups for ap in aps},
+            matrix={mp.id: mp for mp in self.matrix},
+            payments={pm.id: pm for pm in self.payments},
         )
 
-    def _active_catalogs(self):
-        actions = list(ActionPermission.objects.filter(
-            is_active=True).order_by("group", "action"))
-        matrix = list(MatrixPermission.objects.filter(
-            is_active=True).order_by("name"))
-        payments = list(PaymentMethodPermission.objects.filter(
-            is_active=True).order_by("name"))
-        return actions, matrix, payments
-
-    def _build_initial_for_selection_set(self, selection_set):
-        # ACTIONS initial (map action_permission_id -> row values)
-        existing_actions = {
+
+def _initial_rows(block: _Block, kind: str, catalog: list) -> list[dict]:
+    """Initial del formset de una sección (solo lee las filas de esa sección)."""
+    ss = block.selection_set
+    ids = [obj.id for obj in catalog]
+    if kind == SECTION_ACTIONS:
+        existing = {
             r.action_permission_id: r
-            for r in SelectionSetActionValue.objects.filter(selection_set=selection_set)
+            for r in SelectionSetActionValue.objects.filter(selection_set=ss, action_permission_id__in=ids)
         }
-
-        # MATRIX initial
-        existing_matrix = {
+        rows = []
+        for ap in catalog:
+            row = {"action_permission_id": ap.id}
+            r = existing.get(ap.id)
+            if r:
+                row.update({k: getattr(r, k) for k in _ACTION_VALUE_FIELDS})
+            rows.append(row)
+        return rows
+
+    if kind == SECTION_MATRIX:
+        existing = {
             r.permission_id: r
-            for r in SelectionSetMatrixPermission.objects.filter(selection_set=selection_set)
-        }
-
-        # PAYMENTS initial
-        existing_pay = {
-            r.payment_method_id: r
-            for r in SelectionSetPaymentMethod.objects.filter(selection_set=selection_set)
+            for r in SelectionSetMatrixPermission.objects.filter(selection_set=ss, permission_id__in=ids)
         }
-
-        return existing_actions, existing_matrix, existing_pay
-
-    def get(self, request):
+        rows = []
+        for mp in catalog:
+            row = {"permission_id": mp.id}
+            r = existing.get(mp.id)
+            if r:
+                row.update({k: getattr(r, k) for k in MATRIX_FLAGS})
+            rows.append(row)
+        return rows
+
+    existing = {
+        r.payment_method_id: r
+        for r in SelectionSetPaymentMethod.objects.filter(selection_set=ss, payment_method_id__in=ids)
+    }
+    rows = []
+    for pm in catalog:
+        row = {"payment_method_id": pm.id}
+        r = existing.get(pm.id)
+        if r:
+            row["enabled"] = bool(r.enabled)
+        rows.append(row)
+    return rows
+
+
+def _build_formset(block: _Block, kind: str, group: str | None, catalog: list, data=None):
+    prefix = block.prefix(kind, group)
+    if kind == SECTION_ACTIONS:
+        if data is not None:
+            return ActionValueFormSet(data=data, prefix=prefix, action_permissions=catalog)
+        return ActionValueFormSet(
+            prefix=prefix,
+            initial=_initial_rows(block, kind, catalog),
+            action_permissions=catalog,
+        )
+    formset_class = MatrixFormSet if kind == SECTION_MATRIX else PaymentFormSet
+    if data is not None:
+        return formset_class(data=data, prefix=prefix, catalog_ids=[obj.id for obj in catalog])
+    return formset_class(prefix=prefix, initial=_initial_rows(block, kind, catalog))
+
+
+def _section_url(block: _Block, kind: str, group: str | None) -> str:
+    params = {"block": block.key, "section": kind}
+    if group is not None:
+        params["group"] = group
+    return f"{reverse('catalog:wizard_step_4_section')}?{urlencode(params)}"
+
+
+def _section_context(block: _Block, kind: str, group: str | None, formset=None) -> dict:
+    """
+    Sección para el template. Con formset: se renderiza inline (filas zip
+    (catálogo, form)); sin formset: placeholder que se carga al mostrarse.
+    """
+    catalog = block.catalog_for(kind, group) if formset is not None else []
+    return {
+        "kind": kind,
+        "group_key": group,
+        "group": block.section_label(kind, group) if kind == SECTION_ACTIONS else "",
+        "loaded": formset is not None,
+        "formset": formset,
+        "rows": list(zip(catalog, formset.forms)) if formset is not None else [],
+        "url": _section_url(block, kind, group),
+    }
+
+
+def _block_context(block: _Block, sections: dict) -> dict:
+    """sections: {(kind, group_key): formset} de las secciones que van inline."""
+    def ctx(kind, group=None):
+        return _section_context(block, kind, group, sections.get((kind, group)))
+
+    return {
+        "key": block.key,
+        "item": block.item,
+        "action_tabs": [ctx(SECTION_ACTIONS, key) for key in block.action_groups_by_key],
+        "matrix": ctx(SECTION_MATRIX) if block.matrix else None,
+        "payments": ctx(SECTION_PAYMENTS) if block.payments else None,
+    }
+
+
+def _first_section(blocks: list[_Block]) -> dict:
+    """Inline al entrar: la primera sección del primer bloque (tab activo)."""
+    first = blocks[0]
+    keys = first.section_keys()
+    if not keys:
+        return {}
+    kind, group = keys[0]
+    return {first.key: {(kind, group): _build_formset(first, kind, group, first.catalog_for(kind, group))}}
+
+
+def _delta_sections(blocks: list[_Block], raw: str) -> dict:
+    """
+    Secciones que tocó un delta rechazado, como formsets ligados a lo guardado
+    más lo que mandó el usuario: se re-muestran con sus valores y los errores
+    por fila. Las filas que no se pueden ubicar (JSON roto, ids fuera del
+    catálogo visible) se ignoran.
+    """
+    try:
+        rows = json.loads(raw)
+    except ValueError:
+        return {}
+    if not isinstance(rows, list):
+        return {}
+
+    by_key = {b.key: b for b in blocks}
+    posted: dict[tuple[str, str, str | None], dict[int, dict]] = {}
+    for row in rows:
         try:
-            req = self._get_request(request)
-        except AccessRequest.DoesNotExist:
-            return self.redirect_to("catalog:wizard_step_1_person")
+            block = by_key.get(str(row["block"]))
+            kind = row["section"]
+            obj_id = int(row["id"])
+        except (TypeError, KeyError, ValueError):
+            continue
+        if block is None or kind not in SECTIONS:
+            continue
+        obj = getattr(block.delta_catalog, kind).get(obj_id)
+        if obj is None:
+            continue
+        group = _group_key(obj.group) if kind == SECTION_ACTIONS else None
+        posted.setdefault((block.key, kind, group), {})[obj_id] = delta_row_values(kind, obj, row.get("value"))
+
+    sections: dict = {}
+    for (block_key, kind, group), values in posted.items():
+        block = by_key[block_key]
+        catalog = block.catalog_for(kind, group)
+        id_field = _ID_FIELDS[kind]
+        data_rows = [{**row, **values.get(row[id_field], {})} for row in _initial_rows(block, kind, catalog)]
+        fs = _build_formset(block, kind, group, catalog, data=formset_data(block.prefix(kind, group), data_rows))
+        fs.is_valid()
+        sections.setdefault(block_key, {})[(kind, group)] = fs
+    return sections
+
+
+def _action_items(formset, catalog) -> list[dict]:
+    by_id = {a.id: a for a in catalog}
+    out = []
+    for f in formset:
+        ap = by_id.get(f.cleaned_data["action_permission_id"])
+        if not ap:
+            continue
+        out.append({"action_permission": ap, **{k: f.cleaned_data.get(k) for k in _ACTION_VALUE_FIELDS}})
+    return out
+
+
+def _matrix_items(formset, catalog) -> list[dict]:
+    by_id = {m.id: m for m in catalog}
+    out = []
+    for f in formset:
+        mp = by_id.get(f.cleaned_data["permission_id"])
+        if not mp:
+            continue
+        out.append({"permission": mp, **{k: f.cleaned_data.get(k) for k in MATRIX_FLAGS}})
+    return out
+
+
+def _payment_items(formset, catalog) -> list[dict]:
+    by_id = {p.id: p for p in catalog}
+    out = []
+    for f in formset:
+        pm = by_id.get(f.cleaned_data["payment_method_id"])
+        if not pm:
+            continue
+        out.append({"payment_method": pm, "enabled": bool(f.cleaned_data.get("enabled"))})
+    return out
 
-        items = list(req.items.all().order_by("order", "id"))
-        if not items:
-            messages.warning(request, "Primero definí empresas y sucursales.")
-            return self.redirect_to("catalog:wizard_step_2_companies")
 
-        actions, matrix, payments = self._active_catalogs()
+class WizardStep4GlobalsView(WizardBaseView):
+    """
+    Step 4. La página trae inline solo la primera sección (primer tab de acciones
+    del primer bloque); el resto (otros tabs, matriz, medios de pago y los bloques
+    PER_ITEM) lo pide el navegador a WizardStep4SectionView al mostrarse.
+
+    El POST valida y guarda solo las secciones que llegaron (las cargadas): las no
+    abiertas no mandan management form y conservan lo guardado.
 
-        # Groups para tabs (Generales, Comercial, etc.)
-        action_groups = sorted({a.group for a in actions})
+    Con JS, el POST trae en `globals_delta` (GlobalsDeltaForm) solo las filas que
+    cambiaron y se valida/aplica eso; el envío de formsets queda como fallback.
+    """
+    step = 4
+    progress_percent = 80
+    template_name = "catalog/wizard/step_4_globals.html"
+    request_profile = "globals"
 
+    def _blocks(self, req: AccessRequest, items: list) -> list[_Block]:
+        catalogs = _Catalogs()
         if req.same_modules_for_all:
             ss = items[0].selection_set
-            existing_actions, existing_matrix, existing_pay = self._build_initial_for_selection_set(
-                ss)
-
-            # --------- ACTIONS initial ---------
-            action_initial = []
-            for ap in actions:
-                row = {"action_permission_id": ap.id}
-                r = existing_actions.get(ap.id)
-                if r:
-                    row.update(
-                        {
-                            "value_bool": r.value_bool,
-                            "value_int": r.value_int,
-                            "value_decimal": r.value_decimal,
-                            "value_text": r.value_text,
-                        }
-                    )
-                action_initial.append(row)
-
-            # --------- MATRIX initial ---------
-            matrix_initial = []
-            for mp in matrix:
-                row = {"permission_id": mp.id}
-                r = existing_matrix.get(mp.id)
-                if r:
-                    row.update(
-                        {
-                            "can_create": r.can_create,
-                            "can_update": r.can_update,
-                            "can_authorize": r.can_authorize,
-                            "can_close": r.can_close,
-                            "can_cancel": r.can_cancel,
-                            "can_update_validity": r.can_update_validity,
-                        }
-                    )
-                matrix_initial.append(row)
-
-            # --------- PAYMENTS initial ---------
-            pay_initial = []
-            for pm in payments:
-                row = {"payment_method_id": pm.id}
-                r = existing_pay.get(pm.id)
-                if r:
-                    row["enabled"] = bool(r.enabled)
-                pay_initial.append(row)
-
-            # Formsets
-            action_fs = ActionValueFormSet(
-                prefix="actions",
-                initial=action_initial,
-                action_permissions=actions,
-            )
-            matrix_fs = MatrixFormSet(prefix="matrix", initial=matrix_initial)
-            pay_fs = PaymentFormSet(prefix="payments", initial=pay_initial)
-
-            # IMPORTANTÍSIMO: zip (modelo, form) para template limpio
-            action_rows = list(zip(actions, action_fs.forms))
-            matrix_rows = list(zip(matrix, matrix_fs.forms))
-            payment_rows = list(zip(payments, pay_fs.forms))
-
-            return render(
-                request,
-                self.template_name,
-                self.wizard_context(
-                    request_obj=req,
-                    mode="GLOBAL",
-                    items=items,
-
-                    # catálogos
-                    actions=actions,
-                    matrix_perms=matrix,
-                    payment_methods=payments,
-
-                    # formsets
-                    action_formset=action_fs,
-                    matrix_formset=matrix_fs,
-                    payment_formset=pay_fs,
-
-                    # extras que usa el template
-                    action_groups=action_groups,
-                    action_rows=action_rows,
-                    matrix_rows=matrix_rows,
-                    payment_rows=payment_rows,
-                ),
-            )
-
-        # -------------------------
-        # PER_ITEM (backend listo)
-        # -------------------------
-        blocks = []
-        for it in items:
-            ss = it.selection_set
-            existing_actions, existing_matrix, existing_pay = self._build_initial_for_selection_set(
-                ss)
-
-            action_initial = []
-            for ap in actions:
-                row = {"action_permission_id": ap.id}
-                r = existing_actions.get(ap.id)
-                if r:
-                    row.update(
-                        {
-                            "value_bool": r.value_bool,
-                            "value_int": r.value_int,
-                            "value_decimal": r.value_decimal,
-                            "value_text": r.value_text,
-                        }
-                    )
-                action_initial.append(row)
-
-            matrix_initial = []
-            for mp in matrix:
-                row = {"permission_id": mp.id}
-                r = existing_matrix.get(mp.id)
-                if r:
-                    row.update(
-                        {
-                            "can_create": r.can_create,
-                            "can_update": r.can_update,
-                            "can_authorize": r.can_authorize,
-                            "can_close": r.can_close,
-                            "can_cancel": r.can_cancel,
-                            "can_update_validity": r.can_update_validity,
-                        }
-                    )
-                matrix_initial.append(row)
-
-            pay_initial = []
-            for pm in payments:
-                row = {"payment_method_id": pm.id}
-                r = existing_pay.get(pm.id)
-                if r:
-                    row["enabled"] = bool(r.enabled)
-                pay_initial.append(row)
-
-            a_fs = ActionValueFormSet(
-                prefix=f"it_{it.id}_a",
-                initial=action_initial,
-                action_permissions=actions,
-            )
-            m_fs = MatrixFormSet(
-                prefix=f"it_{it.id}_m", initial=matrix_initial)
-            p_fs = PaymentFormSet(prefix=f"it_{it.id}_p", initial=pay_initial)
-
-            blocks.append(
-                {
-                    "item": it,
-                    "action_formset": a_fs,
-                    "matrix_formset": m_fs,
-                    "payment_formset": p_fs,
-                    "action_rows": list(zip(actions, a_fs.forms)),
-                    "matrix_rows": list(zip(matrix, m_fs.forms)),
-                    "payment_rows": list(zip(payments, p_fs.forms)),
-                }
+            scope = resolve_globals_scopes([ss])[ss.pk]
+            return [_Block(
+                key=GLOBAL_BLOCK,
+                item=items[0],
+                scope=scope,
+                catalogs=catalogs,
+                prefix_actions="actions",
+                prefix_matrix="matrix",
+                prefix_payments="payments",
+            )]
+
+        scopes = resolve_globals_scopes([it.selection_set for it in items])
+        return [
+            _Block(
+                key=str(it.id),
+                item=it,
+                scope=scopes[it.selection_set_id],
+                catalogs=catalogs,
+                prefix_actions=f"it_{it.id}_a",
+                prefix_matrix=f"it_{it.id}_m",
+                prefix_payments=f"it_{it.id}_p",
             )
+            for it in items
+        ]
 
+    def _render(self, request, req, items, blocks: list[_Block], sections_by_block: dict):
         return render(
             request,
             self.template_name,
             self.wizard_context(
                 request_obj=req,
-                mode="PER_ITEM",
+                mode="GLOBAL" if req.same_modules_for_all else "PER_ITEM",
                 items=items,
-                actions=actions,
-                matrix_perms=matrix,
-                payment_methods=payments,
-                blocks=blocks,
-                action_groups=action_groups,  # útil para futuro template per-item
+                blocks=[_block_context(b, sections_by_block.get(b.key, {})) for b in blocks],
             ),
         )
 
-    @transaction.atomic
-    def post(self, request):
+    def get(self, request):
         try:
             req = self._get_request(request)
         except AccessRequest.DoesNotExist:
             return self.redirect_to("catalog:wizard_step_1_person")
 
-        items = list(req.items.all().order_by("order", "id"))
+        items = list(req.items.all())
         if not items:
+            messages.warning(request, "Primero definí empresas y sucursales.")
             return self.redirect_to("catalog:wizard_step_2_companies")
 
-        actions, matrix, payments = self._active_catalogs()
+        blocks = self._blocks(req, items)
+        return self._render(request, req, items, blocks, _first_section(blocks))
 
-        if req.same_modules_for_all:
-            action_fs = ActionValueFormSet(
-                data=request.POST, prefix="actions", action_permissions=actions)
-            matrix_fs = MatrixFormSet(data=request.POST, prefix="matrix")
-            pay_fs = PaymentFormSet(data=request.POST, prefix="payments")
-
-            if not (action_fs.is_valid() and matrix_fs.is_valid() and pay_fs.is_valid()):
-                return render(
-                    request,
-                    self.template_name,
-                    self.wizard_context(
-                        request_obj=req,
-                        mode="GLOBAL",
-                        items=items,
-                        actions=actions,
-                        matrix_perms=matrix,
-                        payment_methods=payments,
-                        action_groups=sorted({a.group for a in actions}),
-                        action_formset=action_fs,
-                        matrix_formset=matrix_fs,
-                        payment_formset=pay_fs,
-                        action_rows=list(zip(actions, action_fs.forms)),
-                        matrix_rows=list(zip(matrix, matrix_fs.forms)),
-                        payment_rows=list(zip(payments, pay_fs.forms)),
-                    ),
-                )
+    @transaction.atomic
+    def post(self, request):
+        try:
+            req = self._get_request(request)
+        except AccessRequest.DoesNotExist:
+            return self.redirect_to("catalog:wizard_step_1_person")
 
-            # Build payloads
-            actions_by_id = {a.id: a for a in actions}
-            matrix_by_id = {m.id: m for m in matrix}
-            pay_by_id = {p.id: p for p in payments}
+        items = list(req.items.all())
+        if not items:
+            return self.redirect_to("catalog:wizard_step_2_companies")
 
-            action_items = []
-            for f in action_fs:
-                ap_id = f.cleaned_data["action_permission_id"]
-                ap = actions_by_id.get(ap_id)
-                if not ap:
-                    continue
-                action_items.append(
-                    {
-                        "action_permission": ap,
-                        "value_bool": f.cleaned_data.get("value_bool"),
-                        "value_int": f.cleaned_data.get("value_int"),
-                        "value_decimal": f.cleaned_data.get("value_decimal"),
-                        "value_text": f.cleaned_data.get("value_text"),
-                    }
-                )
+        blocks = self._blocks(req, items)
 
-            matrix_items = []
-            for f in matrix_fs:
-                pid = f.cleaned_data["permission_id"]
-                mp = matrix_by_id.get(pid)
-                if not mp:
-                    continue
-                matrix_items.append(
-                    {
-                        "permission": mp,
-                        "can_create": f.cleaned_data.get("can_create"),
-                        "can_update": f.cleaned_data.get("can_update"),
-                        "can_authorize": f.cleaned_data.get("can_authorize"),
-                        "can_close": f.cleaned_data.get("can_close"),
-                        "can_cancel": f.cleaned_data.get("can_cancel"),
-                        "can_update_validity": f.cleaned_data.get("can_update_validity"),
-                    }
-                )
+        if request.POST.get(DELTA_FIELD):
+            return self._post_delta(request, req, items, blocks)
 
-            payment_items = []
-            for f in pay_fs:
-                pm_id = f.cleaned_data["payment_method_id"]
-                pm = pay_by_id.get(pm_id)
-                if not pm:
+        # Solo las secciones cargadas en el navegador traen management form
+        all_valid = True
+        sections_by_block: dict = {}
+        known_prefixes = set()
+        for block in blocks:
+            bound = {}
+            for kind, group in block.section_keys():
+                prefix = block.prefix(kind, group)
+                known_prefixes.add(prefix)
+                if f"{prefix}-TOTAL_FORMS" not in request.POST:
                     continue
-                payment_items.append(
-                    {"payment_method": pm, "enabled": bool(f.cleaned_data.get("enabled"))})
+                catalog = block.catalog_for(kind, group)
+                fs = _build_formset(block, kind, group, catalog, data=request.POST)
+                if not fs.is_valid():
+                    all_valid = False
+                    if fs.stale:
+                        # Filas de otro catálogo: se vuelve a mostrar la sección como está guardada
+                        messages.error(request, f"{block.section_label(kind, group)}: {STALE_SECTION_ERROR}")
+                        fs = _build_formset(block, kind, group, catalog)
+                bound[(kind, group)] = fs
+            sections_by_block[block.key] = bound
+
+        # Secciones posteadas que ya no existen (p.ej. un grupo que dejó de estar visible)
+        posted_prefixes = {k.removesuffix("-TOTAL_FORMS") for k in request.POST if k.endswith("-TOTAL_FORMS")}
+        if posted_prefixes - known_prefixes:
+            all_valid = False
+            messages.error(request, STALE_SECTION_ERROR)
 
-            # Apply to all selection_sets
-            for it in items:
+        if not all_valid:
+            return self._render(request, req, items, blocks, sections_by_block)
+
+        for block in blocks:
+            bound = sections_by_block[block.key]
+            if not bound:
+                continue
+
+            action_items, matrix_items, payment_items = [], [], []
+            action_ids, matrix_ids, payment_ids = [], [], []
+            # Scope del guardado: las filas posteadas (ya validadas contra la sección)
+            for (kind, group), fs in bound.items():
+                catalog = block.catalog_for(kind, group)
+                if kind == SECTION_ACTIONS:
+                    action_items += _action_items(fs, catalog)
+                    action_ids += fs.posted_ids()
+                elif kind == SECTION_MATRIX:
+                    matrix_items = _matrix_items(fs, catalog)
+                    matrix_ids = fs.posted_ids()
+                else:
+                    payment_items = _payment_items(fs, catalog)
+                    payment_ids = fs.posted_ids()
+
+            # GLOBAL: misma selección => mismo scope para todos los items
+            targets = items if block.key == GLOBAL_BLOCK else [block.item]
+            for it in targets:
                 save_globals_for_selection_set(
                     it.selection_set,
                     action_items=action_items,
                     matrix_items=matrix_items,
                     payment_items=payment_items,
+                    action_ids=action_ids,
+                    matrix_ids=matrix_ids,
+                    payment_ids=payment_ids,
                 )
 
-            messages.success(request, "Permisos globales guardados.")
-            return self.redirect_to("catalog:wizard_step_5_scoped")
-
-        # PER_ITEM (plantilla futura, pero backend listo)
-        all_valid = True
-        blocks = []
-
-        for it in items:
-            a_fs = ActionValueFormSet(
-                data=request.POST, prefix=f"it_{it.id}_a", action_permissions=actions)
-            m_fs = MatrixFormSet(data=request.POST, prefix=f"it_{it.id}_m")
-            p_fs = PaymentFormSet(data=request.POST, prefix=f"it_{it.id}_p")
-
-            if not (a_fs.is_valid() and m_fs.is_valid() and p_fs.is_valid()):
-                all_valid = False
+        return self._saved(request, req)
 
-            blocks.append({"item": it, "action_formset": a_fs,
-                          "matrix_formset": m_fs, "payment_formset": p_fs,
-                           "action_rows": list(zip(actions, a_fs.forms)),
-                           "matrix_rows": list(zip(matrix, m_fs.forms)),
-                           "payment_rows": list(zip(payments, p_fs.forms))})
+    def _saved(self, request, req):
+        if req.same_modules_for_all:
+            messages.success(request, "Permisos globales guardados.")
+        else:
+            messages.success(
+                request, "Permisos globales guardados por empresa/sucursal.")
+        return self.redirect_to("catalog:wizard_step_5_scoped")
 
-        if not all_valid:
-            return render(
-                request,
-                self.template_name,
-                self.wizard_context(
-                    request_obj=req,
-                    mode="PER_ITEM",
-                    items=items,
-                    actions=actions,
-                    matrix_perms=matrix,
-                    payment_methods=payments,
-                    blocks=blocks,
-                    action_groups=sorted({a.group for a in actions}),
-                ),
-            )
+    def _post_delta(self, request, req, items, blocks: list[_Block]):
+        """
+        Aplica solo las filas cambiadas: el scope del guardado son los ids del delta,
+        así que el resto de las filas del selection_set no se lee ni se toca.
+        Un delta inválido no redirige: se re-muestra el paso con los errores y las
+        secciones tocadas con los valores enviados.
+        """
+        by_key = {b.key: b for b in blocks}
+        form = GlobalsDeltaForm(
+            data=request.POST,
+            catalogs={key: b.delta_catalog for key, b in by_key.items()},
+        )
+        if not form.is_valid():
+            for error in form.errors.get(DELTA_FIELD, []):
+                messages.error(request, error)
+            sections_by_block = _delta_sections(blocks, request.POST.get(DELTA_FIELD, "")) or _first_section(blocks)
+            return self._render(request, req, items, blocks, sections_by_block)
+
+        for key, sections in form.cleaned_data[DELTA_FIELD].items():
+            block = by_key[key]
+            catalog = block.delta_catalog
+            actions = sections.get(SECTION_ACTIONS, {})
+            matrix = sections.get(SECTION_MATRIX, {})
+            payments = sections.get(SECTION_PAYMENTS, {})
+
+            action_items = [{"action_permission": catalog.actions[i], **v} for i, v in actions.items()]
+            matrix_items = [{"permission": catalog.matrix[i], **v} for i, v in matrix.items()]
+            payment_items = [{"payment_method": catalog.payments[i], **v} for i, v in payments.items()]
+
+            targets = items if key == GLOBAL_BLOCK else [block.item]
+            for it in targets:
+                save_globals_for_selection_set(
+                    it.selection_set,
+                    action_items=action_items,
+                    matrix_items=matrix_items,
+                    payment_items=payment_items,
+                    action_ids=actions.keys(),
+                    matrix_ids=matrix.keys(),
+                    payment_ids=payments.keys(),
+                )
 
-        actions_by_id = {a.id: a for a in actions}
-        matrix_by_id = {m.id: m for m in matrix}
-        pay_by_id = {p.id: p for p in payments}
+        return self._saved(request, req)
 
-        for b in blocks:
-            it = b["item"]
-            a_fs = b["action_formset"]
-            m_fs = b["matrix_formset"]
-            p_fs = b["payment_formset"]
 
-            action_items = []
-            for f in a_fs:
-                ap = actions_by_id.get(f.cleaned_data["action_permission_id"])
-                if not ap:
-                    continue
-                action_items.append(
-                    {
-                        "action_permission": ap,
-                        "value_bool": f.cleaned_data.get("value_bool"),
-                        "value_int": f.cleaned_data.get("value_int"),
-                        "value_decimal": f.cleaned_data.get("value_decimal"),
-                        "value_text": f.cleaned_data.get("value_text"),
-                    }
-                )
+class WizardStep4SectionView(WizardStep4GlobalsView):
+    """
+    Parcial del Step 4: una sección (grupo de acciones, matriz o medios de pago)
+    de un bloque, con los mismos formsets y prefijos que la página completa.
+    GET ?block=<GLOBAL|item_id>&section=<actions|matrix|payments>[&group=<group_key>]
+    """
+    template_name = "catalog/wizard/_step_4_section.html"
+    http_method_names = ["get"]
+    # El parcial no muestra empresa/sucursal: alcanza con los selection_sets
+    request_profile = "section"
 
-            matrix_items = []
-            for f in m_fs:
-                mp = matrix_by_id.get(f.cleaned_data["permission_id"])
-                if not mp:
-                    continue
-                matrix_items.append(
-                    {
-                        "permission": mp,
-                        "can_create": f.cleaned_data.get("can_create"),
-                        "can_update": f.cleaned_data.get("can_update"),
-                        "can_authorize": f.cleaned_data.get("can_authorize"),
-                        "can_close": f.cleaned_data.get("can_close"),
-                        "can_cancel": f.cleaned_data.get("can_cancel"),
-                        "can_update_validity": f.cleaned_data.get("can_update_validity"),
-                    }
-                )
+    def get(self, request):
+        try:
+            req = self._get_request(request)
+        except AccessRequest.DoesNotExist:
+            raise Http404
 
-            payment_items = []
-            for f in p_fs:
-                pm = pay_by_id.get(f.cleaned_data["payment_method_id"])
-                if not pm:
-                    continue
-                payment_items.append(
-                    {"payment_method": pm, "enabled": bool(f.cleaned_data.get("enabled"))})
-
-            save_globals_for_selection_set(
-                it.selection_set,
-                action_items=action_items,
-                matrix_items=matrix_items,
-                payment_items=payment_items,
-            )
+        items = list(req.items.all())
+        block_key = request.GET.get("block", "")
+        kind = request.GET.get("section", "")
+        if not items or kind not in SECTIONS:
+            raise Http404
 
-        messages.success(
-            request, "Permisos globales guardados por empresa/sucursal.")
-        return self.redirect_to("catalog:wizard_step_5_scoped")
+        if req.same_modules_for_all:
+            if block_key != GLOBAL_BLOCK:
+                raise Http404
+        else:
+            # Solo el item pedido: resolver visibilidad de uno solo
+            items = [it for it in items if str(it.id) == block_key]
+            if not items:
+                raise Http404
+        block = self._blocks(req, items)[0]
+
+        group = None
+        if kind == SECTION_ACTIONS:
+            # Grupo que ya no está visible: 404 (la página quedó vieja)
+            group = request.GET.get("group", "")
+            if group not in block.action_groups_by_key:
+                raise Http404
+        elif not block.catalog_for(kind):
+            raise Http404
+
+        fs = _build_formset(block, kind, group, block.catalog_for(kind, group))
+        return render(request, self.template_name, {"section": _section_context(block, kind, group, fs)})
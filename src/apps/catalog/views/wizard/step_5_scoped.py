@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-import logging
 from collections import defaultdict
 
 from django.contrib import messages
 from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
 
 from apps.catalog.forms.helpers import clone_selection_set
 from apps.catalog.forms.step_5_scoped import (
     CompanyScopedForm,
     BranchScopedForm,
+    ScopedIdValidator,
 )
 from apps.catalog.models.requests import AccessRequest, AccessRequestItem
 from apps.catalog.models.selections import (
@@ -20,97 +22,63 @@ from apps.catalog.models.selections import (
     SelectionSetControlPanel,
     SelectionSetSeller,
 )
+from apps.catalog.services.fingerprints import refresh_global_fingerprints
+from apps.catalog.services.instrumentation import span, trace
+from apps.catalog.services.request_loaders import ACTIVE_BRANCHES_ATTR, prefetched_ids
+from apps.catalog.services.request_summary import refresh_request_summary
+from apps.catalog.services.scoped_options import (
+    DEFAULT_PAGE_SIZE,
+    SCOPED_SOURCES,
+    list_scoped_options,
+    options_etag,
+    owner_is_active,
+    scoped_options_version,
+)
 
 from .base import WizardBaseView
 
-logger = logging.getLogger("apps.catalog")
+# Las URLs de opciones llevan la versión del catálogo (?v=): una página nueva
+# pide URLs nuevas cuando cambian paneles/vendedores/depósitos/cajas.
+OPTIONS_MAX_AGE = 300
+
+
+def _invalid_form_payload(form) -> dict:
+    """Errores de un form scoped ya validado + lo posteado en los campos con error."""
+    return {
+        "prefix": form.prefix,
+        "errors": form.errors.get_json_data(),
+        "posted": {
+            name: form.data.getlist(form.add_prefix(name))
+            for name in form.errors if name in form.fields
+        },
+    }
 
 
 class WizardStep5ScopedView(WizardBaseView):
     step = 5
     progress_percent = 90
     template_name = "catalog/wizard/step_5_scoped.html"
-
-    # -------------------------------------------------
-    # Debug helpers
-    # -------------------------------------------------
-    def _dbg_post_list(self, request, form, field_name: str, label: str, extra: str = ""):
-        html_name = f"{form.prefix}-{field_name}"
-        posted = request.POST.getlist(html_name)
-        logger.debug(
-            "[STEP5][POST] %s %s | prefix=%s field=%s posted_raw=%s",
-            label, extra, form.prefix, field_name, posted,
-        )
-
-    def _dbg_mmcf(self, request, form, field_name: str, label: str, extra: str = ""):
-        html_name = f"{form.prefix}-{field_name}"
-        posted_ids = request.POST.getlist(html_name)
-
-        try:
-            qs_ids = list(
-                form.fields[field_name].queryset.values_list("id", flat=True))
-        except Exception:
-            qs_ids = []
-
-        logger.debug(
-            "[STEP5][INVALID] %s %s | prefix=%s field=%s posted=%s valid_qs=%s field_errors=%s",
-            label, extra, form.prefix, field_name, posted_ids, qs_ids[:200], form.errors.get(
-                field_name),
-        )
-
-    def _dbg_form(self, request, form, label: str, extra: str = ""):
-        # OJO: llamar form.is_valid() acá re-ejecuta validación.
-        # Preferimos asumir que ya fue evaluado y solo loguear errores.
-        logger.debug(
-            "[STEP5][FORM] %s %s | prefix=%s",
-            label, extra, form.prefix,
-        )
-
-        if form.is_valid():
-            logger.debug("[STEP5][OK] %s %s | prefix=%s",
-                         label, extra, form.prefix)
-            return
-
-        logger.debug("[STEP5][ERRORS] %s %s | errors=%s",
-                     label, extra, dict(form.errors))
-
-        for fn in ("control_panels", "sellers", "warehouses", "cash_registers"):
-            if fn in form.fields:
-                self._dbg_post_list(request, form, fn,
-                                    label=label, extra=extra)
-                self._dbg_mmcf(request, form, fn, label=label, extra=extra)
+    request_profile = "scoped"
 
     # -------------------------------------------------
     # Internals
     # -------------------------------------------------
-    def _get_request(self, request) -> AccessRequest:
-        wizard = self.get_wizard(request)
-        req_id = wizard.get("request_id")
-        if not req_id:
-            raise AccessRequest.DoesNotExist
-
-        return (
-            AccessRequest.objects
-            .select_related("person_data")
-            .prefetch_related(
-                "items__selection_set__company",
-                "items__selection_set__branch",
-            )
-            .get(pk=req_id)
-        )
-
     def _company_initial(self, company, items_for_company):
         ss = items_for_company[0].selection_set
         return {
-            "control_panels": list(ss.control_panels.values_list("control_panel_id", flat=True)),
-            "sellers": list(ss.sellers.values_list("seller_id", flat=True)),
+            "control_panels": prefetched_ids(ss.control_panels, "control_panel_id"),
+            "sellers": prefetched_ids(ss.sellers, "seller_id"),
         }
 
-    def _branch_initial(self, ss: PermissionSelectionSet):
-        return {
-            "warehouses": list(ss.warehouses.values_list("warehouse_id", flat=True)),
-            "cash_registers": list(ss.cash_registers.values_list("cash_register_id", flat=True)),
-        }
+    def _selected_branches(self, company, selected_branch_ids) -> list:
+        """Sucursales activas de la empresa elegidas en Step 2 (prefetch del perfil "scoped")."""
+        return [b for b in getattr(company, ACTIVE_BRANCHES_ATTR) if b.id in selected_branch_ids]
+
+    def _scoped_forms(self, companies_blocks) -> list:
+        return (
+            [b["company_form"] for b in companies_blocks]
+            + [bb["form"] for b in companies_blocks for bb in b["branches_blocks"]]
+        )
 
     def _group_items(self, items):
         by_company = defaultdict(list)
@@ -130,7 +98,7 @@ class WizardStep5ScopedView(WizardBaseView):
         except AccessRequest.DoesNotExist:
             return self.redirect_to("catalog:wizard_step_1_person")
 
-        items = list(req.items.all().order_by("order", "id"))
+        items = list(req.items.all())
         if not items:
             messages.warning(request, "Primero definí empresas.")
             return self.redirect_to("catalog:wizard_step_2_companies")
@@ -154,7 +122,7 @@ class WizardStep5ScopedView(WizardBaseView):
 
             # Construir branches_blocks solo con sucursales elegidas en Step 2
             branches_blocks = []
-            for branch in company.branches.filter(is_active=True, id__in=selected_branch_ids).order_by("name"):
+            for branch in self._selected_branches(company, selected_branch_ids):
                 branch_form = BranchScopedForm(
                     prefix=f"b_{branch.id}_c_{company_id}",
                     branch=branch,
@@ -175,11 +143,17 @@ class WizardStep5ScopedView(WizardBaseView):
                 }
             )
 
+        # Nombres de las opciones marcadas: una query por entidad
+        ScopedIdValidator(self._scoped_forms(companies_blocks))
+
         return render(
             request,
             self.template_name,
             self.wizard_context(
-                request_obj=req, companies_blocks=companies_blocks),
+                request_obj=req,
+                companies_blocks=companies_blocks,
+                options_version=scoped_options_version(),
+            ),
         )
 
     # -------------------------------------------------
@@ -192,7 +166,7 @@ class WizardStep5ScopedView(WizardBaseView):
         except AccessRequest.DoesNotExist:
             return self.redirect_to("catalog:wizard_step_1_person")
 
-        items = list(req.items.all().order_by("order", "id"))
+        items = list(req.items.all())
         if not items:
             return self.redirect_to("catalog:wizard_step_2_companies")
 
@@ -202,44 +176,26 @@ class WizardStep5ScopedView(WizardBaseView):
 
         grouped = self._group_items(items)
         companies_blocks = []
-        ok = True
 
         # 1) Validación (company scoped + branch scoped)
         for company_id, items_for_company in grouped.items():
             company = items_for_company[0].selection_set.company
 
-            # Validar permisos globales (paneles, vendedores)
+            # Permisos globales (paneles, vendedores)
             company_form = CompanyScopedForm(
                 data=request.POST,
                 prefix=f"c_{company_id}",
                 company=company,
             )
-            if not company_form.is_valid():
-                ok = False
-                self._dbg_form(
-                    request,
-                    company_form,
-                    label="COMPANY",
-                    extra=f"company={company_id}({company.name})",
-                )
 
-            # Validar depósitos/cajas solo para sucursales elegidas
+            # Depósitos/cajas solo para sucursales elegidas
             branches_blocks = []
-            for branch in company.branches.filter(is_active=True, id__in=selected_branch_ids).order_by("name"):
+            for branch in self._selected_branches(company, selected_branch_ids):
                 branch_form = BranchScopedForm(
                     data=request.POST,
                     prefix=f"b_{branch.id}_c_{company_id}",
                     branch=branch,
                 )
-                if not branch_form.is_valid():
-                    ok = False
-                    self._dbg_form(
-                        request,
-                        branch_form,
-                        label="BRANCH",
-                        extra=f"company={company_id}({company.name}) branch={branch.id}({branch.name})",
-                    )
-
                 branches_blocks.append(
                     {
                         "branch": branch,
@@ -255,17 +211,24 @@ class WizardStep5ScopedView(WizardBaseView):
                 }
             )
 
+        # Todos los ids posteados se resuelven juntos (una query por entidad)
+        scoped_forms = self._scoped_forms(companies_blocks)
+        with span("step5.validate", lambda: {"request_id": req.id, "forms": len(scoped_forms)}):
+            ok = ScopedIdValidator(scoped_forms).is_valid()
+
         if not ok:
-            logger.debug(
-                "[STEP5] Validation failed. request_id=%s posted_keys=%s",
-                req.id,
-                sorted(list(request.POST.keys()))[:200],
-            )
+            trace("step5.invalid", lambda: {
+                "request_id": req.id,
+                "forms": [_invalid_form_payload(f) for f in scoped_forms if f.errors],
+            })
             return render(
                 request,
                 self.template_name,
                 self.wizard_context(
-                    request_obj=req, companies_blocks=companies_blocks),
+                    request_obj=req,
+                    companies_blocks=companies_blocks,
+                    options_version=scoped_options_version(),
+                ),
             )
 
         # 2) Persistencia
@@ -274,13 +237,8 @@ class WizardStep5ScopedView(WizardBaseView):
             company = block["company"]
             company_form: CompanyScopedForm = block["company_form"]
 
-            panels_qs = company_form.cleaned_data.get("control_panels")
-            sellers_qs = company_form.cleaned_data.get("sellers")
-
-            panel_ids = list(panels_qs.values_list(
-                "id", flat=True)) if panels_qs is not None else []
-            seller_ids = list(sellers_qs.values_list(
-                "id", flat=True)) if sellers_qs is not None else []
+            panel_ids = company_form.cleaned_data.get("control_panels") or []
+            seller_ids = company_form.cleaned_data.get("sellers") or []
 
             # Obtener el item base de la empresa (sin sucursal)
             base_item = None
@@ -315,12 +273,13 @@ class WizardStep5ScopedView(WizardBaseView):
                         for sid in seller_ids
                     ]
                 )
+            refresh_global_fingerprints([base_ss])
 
             # Borrar items con sucursal existentes y recrearlos con sucursales elegidas
-            old_branch_items = list(
-                req.items.filter(selection_set__company_id=company.id,
-                                 selection_set__branch_id__isnull=False)
-            )
+            old_branch_items = [
+                it for it in items
+                if it.selection_set.company_id == company.id and it.selection_set.branch_id
+            ]
             old_ss_ids = [it.selection_set_id for it in old_branch_items]
 
             # Borrar items y sus selection_sets si no están en uso
@@ -333,9 +292,7 @@ class WizardStep5ScopedView(WizardBaseView):
                     ss.delete()
 
             # Crear nuevos items para sucursales elegidas en Step 2
-            selected_branches = company.branches.filter(
-                is_active=True, id__in=selected_branch_ids
-            ).order_by("name")
+            selected_branches = [bb["branch"] for bb in block["branches_blocks"]]
 
             next_order = max([it.order for it in items], default=-1) + 1
 
@@ -357,13 +314,8 @@ class WizardStep5ScopedView(WizardBaseView):
                         continue
 
                     bf: BranchScopedForm = bb["form"]
-                    warehouses_qs = bf.cleaned_data.get("warehouses")
-                    cash_qs = bf.cleaned_data.get("cash_registers")
-
-                    wh_ids = list(warehouses_qs.values_list(
-                        "id", flat=True)) if warehouses_qs is not None else []
-                    cr_ids = list(cash_qs.values_list("id", flat=True)
-                                  ) if cash_qs is not None else []
+                    wh_ids = bf.cleaned_data.get("warehouses") or []
+                    cr_ids = bf.cleaned_data.get("cash_registers") or []
 
                     if wh_ids:
                         SelectionSetWarehouse.objects.bulk_create(
@@ -382,5 +334,49 @@ class WizardStep5ScopedView(WizardBaseView):
                             ]
                         )
 
+        refresh_request_summary(req)
+
+        trace("step5.saved", lambda: {
+            "request_id": req.id,
+            "companies": len(companies_blocks),
+            "branches": sum(len(b["branches_blocks"]) for b in companies_blocks),
+        })
         messages.success(request, "Accesos por empresa y sucursal guardados.")
         return self.redirect_to("catalog:wizard_step_6_review")
+
+
+class WizardStep5OptionsView(WizardBaseView):
+    """
+    Opciones de un campo scoped del Step 5 en JSON, para los widgets que las
+    cargan a demanda.
+    GET /wizard/scoped/options/<campo>/<empresa|sucursal id>/?q=<prefijo>&page=<n>
+
+    Respuesta: {"results": [{"id", "name"}], "page": n, "has_more": bool}.
+    ETag = versión del catálogo scoped + parámetros: un If-None-Match vigente
+    responde 304 sin consultar las opciones (la versión sale de CatalogVersion,
+    releída de la DB solo cuando vence CATALOG_VERSION_TTL).
+    """
+    http_method_names = ["get"]
+
+    def get(self, request, kind: str, owner_id: int):
+        if kind not in SCOPED_SOURCES:
+            raise Http404
+        q = request.GET.get("q", "").strip()
+        try:
+            page = int(request.GET.get("page", 1))
+            page_size = int(request.GET.get("page_size", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise Http404
+        if page < 1 or page_size < 1:
+            raise Http404
+
+        etag = options_etag(kind, owner_id, q=q, page=page, page_size=page_size)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            if not owner_is_active(kind, owner_id):
+                raise Http404
+            options = list_scoped_options(kind, owner_id, q=q, page=page, page_size=page_size)
+            response = JsonResponse(options.as_json())
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, max_age=OPTIONS_MAX_AGE)
+        return response
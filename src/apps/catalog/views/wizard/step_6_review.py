@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
 import base64
 import logging
 from email.mime.text import MIMEText
@@ -11,18 +11,11 @@ from django.db import transaction
 from django.shortcuts import render, redirect
 
 from apps.catalog.models.requests import AccessRequest, RequestStatus
-from apps.catalog.models.selections import (
-    SelectionSetWarehouse,
-    SelectionSetCashRegister,
-    SelectionSetControlPanel,
-    SelectionSetSeller,
-    SelectionSetActionValue,
-    SelectionSetMatrixPermission,
-    SelectionSetPaymentMethod,
-    SelectionSetLevel,
-    SelectionSetSubLevel,
-)
 from apps.catalog.forms.start import StartMode
+from apps.catalog.services.fingerprints import ensure_global_fingerprints
+from apps.catalog.services.request_snapshots import snapshot_request
+from apps.catalog.services.request_summary import refresh_request_summary
+from apps.catalog.services.selection_bundles import build_company_payload, load_selection_bundles
 
 from .base import WizardBaseView
 
@@ -113,6 +106,12 @@ def _notify_it(request_obj: AccessRequest) -> None:
         f"DNI: {request_obj.person_data.dni}\n"
         f"Email: {request_obj.person_data.email}\n"
     )
+    for c in (request_obj.snapshot or {}).get("companies", []):
+        branch_names = [b["branch"]["name"] for b in c["payload"]["branches"] if b["branch"]]
+        body += f"Empresa: {c['company']['name']}"
+        if branch_names:
+            body += f" — Sucursales: {', '.join(branch_names)}"
+        body += "\n"
 
     recipients = list(getattr(settings, "CATALOG_IT_NOTIFY_EMAILS", []) or [])
     logger.info(f"[EMAIL] _notify_it called. Recipients found in settings: {recipients}")
@@ -135,22 +134,7 @@ class WizardStep6ReviewView(WizardBaseView):
     step = 6
     progress_percent = 100
     template_name = "catalog/wizard/step_6_review_document.html"
-
-    def _get_request(self, request) -> AccessRequest:
-        wizard = self.get_wizard(request)
-        req_id = wizard.get("request_id")
-        if not req_id:
-            raise AccessRequest.DoesNotExist
-
-        return (
-            AccessRequest.objects.select_related("person_data")
-            .prefetch_related(
-                "items__selection_set__company",
-                "items__selection_set__branch",
-                "items__selection_set__modules",
-            )
-            .get(pk=req_id)
-        )
+    request_profile = "review"
 
     @staticmethod
     def _extract_model_user_reference(raw_note: str) -> str:
@@ -162,237 +146,6 @@ class WizardStep6ReviewView(WizardBaseView):
             return note[len(prefix):].strip()
         return note
 
-    # -----------------------------
-    # Tree: Módulo -> Nivel -> Subnivel
-    # -----------------------------
-    def _build_levels_tree(self, ss) -> list[dict]:
-        """
-        Devuelve una estructura:
-        [
-          {"module": <ErpModule>, "levels": [
-              {"level": <ErpModuleLevel>, "sublevels":[<ErpModuleSubLevel>, ...]},
-              ...
-          ]},
-          ...
-        ]
-        """
-        selected_levels = (
-            SelectionSetLevel.objects.filter(selection_set=ss)
-            .select_related("level__module")
-            .order_by("level__module__name", "level__name")
-        )
-        selected_sublevels = (
-            SelectionSetSubLevel.objects.filter(selection_set=ss)
-            .select_related("sublevel__level__module", "sublevel__level")
-            .order_by("sublevel__level__module__name", "sublevel__level__name", "sublevel__name")
-        )
-
-        # module_id -> {"module": module, "levels": OrderedDict(level_id -> {...})}
-        mod_map: dict[int, dict] = {}
-
-        for r in selected_levels:
-            m = r.level.module
-            mod_bucket = mod_map.setdefault(
-                m.id, {"module": m, "levels": OrderedDict()})
-            mod_bucket["levels"].setdefault(
-                r.level.id, {"level": r.level, "sublevels": []}
-            )
-
-        for r in selected_sublevels:
-            sub = r.sublevel
-            lvl = sub.level
-            mod = lvl.module
-
-            mod_bucket = mod_map.setdefault(
-                mod.id, {"module": mod, "levels": OrderedDict()})
-            lvl_bucket = mod_bucket["levels"].setdefault(
-                lvl.id, {"level": lvl, "sublevels": []}
-            )
-            lvl_bucket["sublevels"].append(sub)
-
-        out: list[dict] = []
-        for m_id, bucket in sorted(mod_map.items(), key=lambda kv: kv[1]["module"].name):
-            levels_list = list(bucket["levels"].values())
-            out.append({"module": bucket["module"], "levels": levels_list})
-
-        return out
-
-    # -----------------------------
-    # Payloads
-    # -----------------------------
-    def _build_global_payload(self, ss) -> dict:
-        modules = list(ss.modules.filter(is_active=True).order_by("name"))
-        levels_tree = self._build_levels_tree(ss)
-
-        control_panels = list(
-            SelectionSetControlPanel.objects.filter(selection_set=ss)
-            .select_related("control_panel")
-            .order_by("control_panel__name")
-        )
-        sellers = list(
-            SelectionSetSeller.objects.filter(selection_set=ss)
-            .select_related("seller")
-            .order_by("seller__name")
-        )
-
-        actions = list(
-            SelectionSetActionValue.objects.filter(
-                selection_set=ss, is_active=True)
-            .select_related("action_permission")
-            .order_by("action_permission__group", "action_permission__action")
-        )
-        actions_by_group = defaultdict(list)
-        for r in actions:
-            ap = r.action_permission
-            if ap.value_type == "BOOL":
-                val = "Sí" if bool(r.value_bool) else "No"
-                if val != "Sí":
-                    continue
-            elif ap.value_type == "INT":
-                val = "" if r.value_int is None else str(r.value_int)
-                if not val:
-                    continue
-            elif ap.value_type in ("DECIMAL", "PERCENT"):
-                val = "" if r.value_decimal is None else str(r.value_decimal)
-                if not val:
-                    continue
-            else:
-                val = (r.value_text or "").strip()
-                if not val:
-                    continue
-
-            actions_by_group[ap.group].append((ap.action, val))
-
-        matrix = list(
-            SelectionSetMatrixPermission.objects.filter(selection_set=ss)
-            .select_related("permission")
-            .order_by("permission__name")
-        )
-        matrix = [
-            r
-            for r in matrix
-            if any(
-                [
-                    r.can_create,
-                    r.can_update,
-                    r.can_authorize,
-                    r.can_close,
-                    r.can_cancel,
-                    r.can_update_validity,
-                ]
-            )
-        ]
-
-        payment_methods = list(
-            SelectionSetPaymentMethod.objects.filter(
-                selection_set=ss, enabled=True, is_active=True)
-            .select_related("payment_method")
-            .order_by("payment_method__name")
-        )
-
-        return {
-            "modules": modules,
-            "levels_tree": levels_tree,
-            "control_panels": [x.control_panel for x in control_panels],
-            "sellers": [x.seller for x in sellers],
-            "actions_by_group": dict(actions_by_group),
-            "matrix": matrix,
-            "payment_methods": [x.payment_method for x in payment_methods],
-        }
-
-    def _build_scoped_payload(self, ss) -> dict:
-        warehouses = list(
-            SelectionSetWarehouse.objects.filter(selection_set=ss)
-            .select_related("warehouse")
-            .order_by("warehouse__name")
-        )
-        cash_registers = list(
-            SelectionSetCashRegister.objects.filter(selection_set=ss)
-            .select_related("cash_register")
-            .order_by("cash_register__name")
-        )
-
-        return {
-            "warehouses": [x.warehouse for x in warehouses],
-            "cash_registers": [x.cash_register for x in cash_registers],
-        }
-
-    def _global_signature(self, ss) -> tuple:
-        """
-        Firma para detectar diferencias inesperadas entre sucursales de una misma empresa.
-        (No es “seguridad”, es control de consistencia para UX.)
-        """
-        modules = tuple(ss.modules.filter(is_active=True).order_by(
-            "id").values_list("id", flat=True))
-
-        levels = tuple(
-            SelectionSetLevel.objects.filter(selection_set=ss)
-            .order_by("level_id")
-            .values_list("level_id", flat=True)
-        )
-        sublevels = tuple(
-            SelectionSetSubLevel.objects.filter(selection_set=ss)
-            .order_by("sublevel_id")
-            .values_list("sublevel_id", flat=True)
-        )
-
-        control_panels = tuple(
-            SelectionSetControlPanel.objects.filter(selection_set=ss)
-            .order_by("control_panel_id")
-            .values_list("control_panel_id", flat=True)
-        )
-        sellers = tuple(
-            SelectionSetSeller.objects.filter(selection_set=ss)
-            .order_by("seller_id")
-            .values_list("seller_id", flat=True)
-        )
-
-        action_rows = tuple(
-            SelectionSetActionValue.objects.filter(
-                selection_set=ss, is_active=True)
-            .select_related("action_permission")
-            .order_by("action_permission_id")
-            .values_list(
-                "action_permission_id",
-                "value_bool",
-                "value_int",
-                "value_decimal",
-                "value_text",
-            )
-        )
-
-        matrix_rows = tuple(
-            SelectionSetMatrixPermission.objects.filter(selection_set=ss)
-            .order_by("permission_id")
-            .values_list(
-                "permission_id",
-                "can_create",
-                "can_update",
-                "can_authorize",
-                "can_close",
-                "can_cancel",
-                "can_update_validity",
-            )
-        )
-
-        pay_rows = tuple(
-            SelectionSetPaymentMethod.objects.filter(
-                selection_set=ss, is_active=True)
-            .order_by("payment_method_id")
-            .values_list("payment_method_id", "enabled")
-        )
-
-        return (
-            modules,
-            levels,
-            sublevels,
-            control_panels,
-            sellers,
-            action_rows,
-            matrix_rows,
-            pay_rows,
-        )
-
     # -----------------------------
     # GET
     # -----------------------------
@@ -402,29 +155,33 @@ class WizardStep6ReviewView(WizardBaseView):
         except AccessRequest.DoesNotExist:
             return self.redirect_to("catalog:wizard_step_1_person")
 
-        items = list(req.items.all().order_by("order", "id"))
+        items = sorted(req.items.all(), key=lambda it: (it.order, it.id))
         if not items:
             messages.warning(request, "Primero definí empresas y sucursales.")
             return self.redirect_to("catalog:wizard_step_2_companies")
 
+        bundles = load_selection_bundles(it.selection_set_id for it in items)
+
         # Agrupar por empresa, respetando el orden de aparición en items
         companies_map: "OrderedDict[int, dict]" = OrderedDict()
 
         for it in items:
-            ss = it.selection_set
-            company = ss.company
-            bucket = companies_map.get(company.id)
+            bundle = bundles[it.selection_set_id]
+            bucket = companies_map.get(bundle.company.id)
             if bucket is None:
                 bucket = {
-                    "company": company,
+                    "company": bundle.company,
                     "items": [],
                 }
-                companies_map[company.id] = bucket
-            bucket["items"].append(it)
+                companies_map[bundle.company.id] = bucket
+            bucket["items"].append((it, bundle))
 
         companies: list[dict] = []
         copy_rows: list[dict] = []
 
+        # Huellas de la parte global (columna persistida; se completan si faltan)
+        fingerprints = ensure_global_fingerprints(bundles.values())
+
         wizard = self.get_wizard(request)
         is_model_user_mode = wizard.get("start_mode") == StartMode.MODEL_USER
 
@@ -432,24 +189,25 @@ class WizardStep6ReviewView(WizardBaseView):
             its = bucket["items"]
 
             # Base SS: el primero (define globales para la empresa)
-            base_ss = its[0].selection_set
-            base_sig = self._global_signature(base_ss)
+            base = its[0][1]
+            base_sig = fingerprints.get(base.id)
 
             # Scopes por sucursal: solo depósitos/cajas
             branches = []
             inconsistent = False
 
-            for it in its:
-                ss = it.selection_set
-
-                if self._global_signature(ss) != base_sig:
+            for it, bundle in its:
+                if fingerprints.get(bundle.id) != base_sig:
                     inconsistent = True
 
                 branches.append(
                     {
                         "item": it,
-                        "branch": ss.branch,  # puede ser None
-                        "scoped": self._build_scoped_payload(ss),
+                        "branch": bundle.branch,  # puede ser None
+                        "scoped": {
+                            "warehouses": bundle.warehouses,
+                            "cash_registers": bundle.cash_registers,
+                        },
                     }
                 )
 
@@ -463,13 +221,13 @@ class WizardStep6ReviewView(WizardBaseView):
             companies.append(
                 {
                     "company": bucket["company"],
-                    "globals": self._build_global_payload(base_ss),
+                    "globals": build_company_payload(base),
                     "branches": branches,
-                    "model_user_reference": self._extract_model_user_reference(base_ss.notes),
+                    "model_user_reference": self._extract_model_user_reference(base.notes),
                 }
             )
 
-            model_ref = self._extract_model_user_reference(base_ss.notes)
+            model_ref = self._extract_model_user_reference(base.notes)
             if model_ref:
                 copy_rows.append({
                     "company": bucket["company"],
@@ -504,6 +262,9 @@ class WizardStep6ReviewView(WizardBaseView):
 
         req.status = RequestStatus.SUBMITTED
         req.save(update_fields=["status", "updated_at"])
+        # A partir de acá el contenido no cambia: detalle y notificación leen este snapshot
+        snapshot_request(req)
+        refresh_request_summary(req)
 
         def _on_commit_send():
             logger.info(f"[EMAIL] Transaction committed. Starting _on_commit_send for req {req.id}")
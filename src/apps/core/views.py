@@ -1,10 +1,9 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from django.db.models import Count, Q
 from django.utils.safestring import mark_safe
 import json
 from apps.catalog.models.requests import AccessRequest, RequestStatus
-from apps.catalog.models.permissions.scoped import Company
+from apps.catalog.services.request_stats import request_stats_summary
 
 
 class HomeDashboardView(LoginRequiredMixin, TemplateView):
@@ -25,56 +24,37 @@ class HomeDashboardView(LoginRequiredMixin, TemplateView):
 
     def _get_admin_stats(self):
         """Estadísticas para staff/admin."""
-        # Total y por estado (excluyendo DRAFT)
-        active_requests = AccessRequest.objects.exclude(status=RequestStatus.DRAFT)
+        # Totales, estados y top empresas: una query a los contadores (services/request_stats.py)
+        summary = request_stats_summary()
         stats = {
-            "total_requests": active_requests.count(),
-            "submitted_count": active_requests.filter(status=RequestStatus.SUBMITTED).count(),
-            "approved_count": active_requests.filter(status=RequestStatus.APPROVED).count(),
-            "rejected_count": active_requests.filter(status=RequestStatus.REJECTED).count(),
+            "total_requests": summary.total,
+            "submitted_count": summary.count(RequestStatus.SUBMITTED),
+            "approved_count": summary.count(RequestStatus.APPROVED),
+            "rejected_count": summary.count(RequestStatus.REJECTED),
         }
 
         # Gráfico: distribución por estado
-        status_data = (
-            active_requests
-            .values("status")
-            .annotate(count=Count("id"))
-            .order_by("status")
-        )
+        status_names = dict(RequestStatus.choices)
         status_labels = []
         status_counts = []
-        for s in status_data:
-            status_labels.append(dict(RequestStatus.choices).get(s["status"], s["status"]))
-            status_counts.append(s["count"])
-        
+        for status, count in summary.by_status.items():
+            status_labels.append(status_names.get(status, status))
+            status_counts.append(count)
+
         stats["status_chart"] = {
             "labels": mark_safe(json.dumps(status_labels)),
             "data": mark_safe(json.dumps(status_counts)),
         }
 
         # Gráfico: top 10 empresas con más solicitudes
-        company_data = (
-            active_requests
-            .prefetch_related("items__selection_set__company")
-            .values("items__selection_set__company__name")
-            .annotate(count=Count("id"))
-            .order_by("-count")[:10]
-        )
-        company_labels = []
-        company_counts = []
-        for c in company_data:
-            if c["items__selection_set__company__name"]:
-                company_labels.append(c["items__selection_set__company__name"])
-                company_counts.append(c["count"])
-        
         stats["company_chart"] = {
-            "labels": mark_safe(json.dumps(company_labels)),
-            "data": mark_safe(json.dumps(company_counts)),
+            "labels": mark_safe(json.dumps([name for name, _ in summary.top_companies])),
+            "data": mark_safe(json.dumps([count for _, count in summary.top_companies])),
         }
 
         # Últimas 5 solicitudes enviadas
         stats["recent_requests"] = (
-            active_requests
+            AccessRequest.objects.exclude(status=RequestStatus.DRAFT)
             .select_related("person_data", "owner")
             .order_by("-created_at")[:5]
         )
@@ -84,10 +64,11 @@ class HomeDashboardView(LoginRequiredMixin, TemplateView):
     def _get_user_stats(self, user):
         """Estadísticas para usuarios no-admin."""
         user_requests = AccessRequest.objects.filter(owner=user).exclude(status=RequestStatus.DRAFT)
+        summary = request_stats_summary(owner=user)
         return {
             "user_requests": user_requests.select_related("person_data").order_by("-created_at")[:10],
-            "user_total": user_requests.count(),
-            "user_submitted": user_requests.filter(status=RequestStatus.SUBMITTED).count(),
-            "user_approved": user_requests.filter(status=RequestStatus.APPROVED).count(),
-            "user_rejected": user_requests.filter(status=RequestStatus.REJECTED).count(),
+            "user_total": summary.total,
+            "user_submitted": summary.count(RequestStatus.SUBMITTED),
+            "user_approved": summary.count(RequestStatus.APPROVED),
+            "user_rejected": summary.count(RequestStatus.REJECTED),
         }
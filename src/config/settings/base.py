@@ -23,6 +23,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "apps.catalog.middleware.TraceIdMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
 
@@ -73,6 +74,20 @@ LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "home"
 LOGOUT_REDIRECT_URL = "login"
 
+# Instrumentación del catálogo (logger "apps.catalog.trace"): fracción de
+# requests cuyos eventos se loguean cuando el nivel DEBUG está habilitado.
+CATALOG_TRACE_SAMPLE_RATE = float(os.getenv("CATALOG_TRACE_SAMPLE_RATE", "1.0"))
+
+# Versión de los snapshots del catálogo (services/catalog_cache.py, tabla
+# CatalogVersion): segundos que un worker reusa la versión leída de la DB.
+CATALOG_VERSION_TTL = float(os.getenv("CATALOG_VERSION_TTL", "2"))
+
+# Estado de los wizards (services/wizard_state.py): "session" (default) o
+# "cache". "cache" requiere definir CACHES["default"] con un backend
+# compartido entre workers (p.ej. django.core.cache.backends.redis.RedisCache):
+# con el default (LocMemCache, un cache por proceso) la app no arranca.
+CATALOG_WIZARD_STATE_STORE = os.getenv("CATALOG_WIZARD_STATE_STORE", "session")
+
 # Correo (Gmail OAuth) - NO lo toco
 USE_GMAIL_OAUTH = True
 GMAIL_OAUTH_CLIENT_ID = os.getenv("GMAIL_OAUTH_CLIENT_ID", "")